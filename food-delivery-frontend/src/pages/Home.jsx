@@ -102,7 +102,7 @@ function Home() {
                     flexShrink: 0 
                 }}>
                   <div style={{ height: '120px', background: '#eee', overflow: 'hidden' }}>
-                      <img src={item.image_url || "https://placehold.co/300x200?text=Yum"} alt={item.name} style={{width:'100%', height:'100%', objectFit:'cover'}} />
+                      <img src={item.thumbnail_url || item.image_url || "https://placehold.co/300x200?text=Yum"} alt={item.name} style={{width:'100%', height:'100%', objectFit:'cover'}} />
                   </div>
                   <div style={{ padding: '15px' }}>
                       <h4 style={{ margin: '0 0 5px 0' }}>{item.name}</h4>
@@ -115,7 +115,8 @@ function OrderTracking() {
   useEffect(() => {
     fetchOrderData()
     
-    const socket = new WebSocket("ws://127.0.0.1:8000/ws/tracking");
+    const token = localStorage.getItem('token')
+    const socket = new WebSocket(`ws://127.0.0.1:8000/ws/tracking?token=${encodeURIComponent(token || '')}`);
     ws.current = socket;
 
     socket.onopen = () => console.log("✅ WebSocket Connected");
@@ -124,7 +125,7 @@ function OrderTracking() {
         try {
             const d = JSON.parse(e.data); 
             if (d.status) setStatus(d.status); 
-            if (d.event === "DRIVER_UPDATE") {
+            if (d.event === "DRIVER_UPDATE" || d.event === "SNAPSHOT") {
                 if (d.lat && d.lng) setDriverPos([d.lat, d.lng]) 
                 if (d.time) setEta(d.time)                       
                 if (d.message) setDriverMsg(d.message)           
@@ -141,6 +142,15 @@ function OrderTracking() {
     }
   }, [])
 
+  // Subscribe to this order's live updates once we know its id
+  useEffect(() => {
+    const socket = ws.current
+    if (!orderId || !socket) return
+    const subscribe = () => socket.send(JSON.stringify({ action: "subscribe", topic: `order:${orderId}` }))
+    if (socket.readyState === 1) subscribe()
+    else socket.addEventListener('open', subscribe, { once: true })
+  }, [orderId])
+
   // Trigger Route Fetch
   useEffect(() => {
       if (restaurantPos && customerPos) fetchRoadRoute(restaurantPos, customerPos)
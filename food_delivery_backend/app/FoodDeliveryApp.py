@@ -1,14 +1,30 @@
-from fastapi import FastAPI, WebSocket
+from fastapi import Depends, FastAPI, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import text
 import os
+import json
 
 # Internal Imports
-from . import models, database
-from app.socket_manager import manager
+from . import models, database, utils, uploads
+from app.socket_manager import manager, is_valid_topic
+from app.auth import get_user_from_token, can_watch_topic, get_current_admin
+from app.broker import broker
+from app.snapshots import deliver_event, send_snapshot
+from app.payments import gateway
+from app.notifications import notifier
+from app.location_buffer import location_buffer
+from app.location_history import location_history
+from app.otp_store import otp_store
+from app.geo_index import restaurant_index
+from app.response_cache import response_cache
+from app.recommender import tfidf_index
+from app.cooccurrence import cooccurrence
+from app.user_recommendations import user_recommendations
+from app.popularity import popularity
 
 # Import Routers
-from .routers import auth, orders, restaurants, users, menu, analytics
+from .routers import auth, orders, restaurants, users, menu, analytics, driver_stream
 
 app = FastAPI(title="Food Delivery API")
 
@@ -25,12 +41,16 @@ app.mount("/static", StaticFiles(directory="app/uploads"), name="static")
 # ---------------------------------------------------------
 # 2. CORS (Allow Frontend Access)
 # ---------------------------------------------------------
+# Refuse oversized image uploads from the headers (added first so CORS wraps it)
+app.add_middleware(uploads.UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
     allow_credentials=True,
     allow_methods=["*"],  
     allow_headers=["*"],  
+    expose_headers=["X-Next-Cursor", "ETag"],  # Pagination cursor & conditional GET
 )
 
 
@@ -46,6 +66,7 @@ app.include_router(restaurants.router)
 app.include_router(menu.router)
 app.include_router(orders.router)
 app.include_router(analytics.router)
+app.include_router(driver_stream.router)
 
 
 # ---------------------------------------------------------
@@ -57,6 +78,45 @@ async def startup():
     async with database.engine.begin() as conn:
         await conn.run_sync(models.Base.metadata.create_all)
 
+    # ...and the indexes / constraints added since those tables were created
+    for statement in models.SCHEMA_UPGRADES:
+        try:
+            async with database.engine.begin() as conn:
+                await conn.execute(text(statement))
+        except Exception as e:
+            print(f"⚠️ Schema upgrade failed ({statement}): {e}")
+
+    # Tracking events: every worker feeds its own sockets from the broker
+    await broker.start(deliver_event)
+
+    # Background SMS workers & driver location ticker
+    notifier.start()
+    location_buffer.start()
+    location_history.start()
+    otp_store.start()
+    restaurant_index.start()
+    tfidf_index.start()
+    cooccurrence.start()
+    user_recommendations.start()
+    popularity.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Flush queued SMS & close the pooled payment gateway connections
+    await location_buffer.stop()
+    await location_history.stop()
+    await otp_store.stop()
+    await restaurant_index.stop()
+    await popularity.stop()
+    await user_recommendations.stop()
+    await cooccurrence.stop()
+    await tfidf_index.stop()
+    await broker.stop()
+    await notifier.stop()
+    await gateway.close()
+    uploads.shutdown_image_pool()
+
 
 # ---------------------------------------------------------
 # 5. ROOT ENDPOINT
@@ -69,13 +129,71 @@ def read_root():
 # ---------------------------------------------------------
 # 6. ⚡ WEBSOCKET ENDPOINT (Live Tracking)
 # ---------------------------------------------------------
+# Connect with ?token=<jwt>. Subscribe with ?topics=order:12,restaurant:3 or by
+# sending {"action": "subscribe", "topic": "order:12"} (or "unsubscribe").
+# Only the order's customer / restaurant owner, the restaurant's owner and the
+# driver themselves may subscribe to order:, restaurant: and driver: topics.
 @app.websocket("/ws/tracking")
 async def websocket_endpoint(websocket: WebSocket):
+    async with database.SessionLocal() as db:
+        user = await get_user_from_token(websocket.query_params.get("token", ""), db)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    async def subscribe(topic: str) -> str:
+        if not is_valid_topic(topic):
+            return "INVALID_TOPIC"
+        async with database.SessionLocal() as db:
+            allowed = await can_watch_topic(user, topic, db)
+        if not allowed:
+            return "FORBIDDEN"
+        return "SUBSCRIBED" if manager.subscribe(websocket, topic) else "INVALID_TOPIC"
+
     # Connects the user to the shared manager
     await manager.connect(websocket)
     try:
+        for topic in websocket.query_params.get("topics", "").split(","):
+            topic = topic.strip()
+            if topic and await subscribe(topic) == "SUBSCRIBED":
+                await send_snapshot(websocket, topic)
+
         while True:
-            # Keep connection open to listen for messages
-            await websocket.receive_text()
+            # Listen for subscribe / unsubscribe requests
+            text = await websocket.receive_text()
+            try:
+                request = json.loads(text)
+                action, topic = request.get("action"), str(request.get("topic", ""))
+            except (ValueError, AttributeError):
+                continue
+
+            if action == "subscribe":
+                result = await subscribe(topic)
+                await manager.send_to(websocket, {"event": result, "topic": topic})
+                if result == "SUBSCRIBED":
+                    # Catch the client up straight away (last status, driver position, ETA)
+                    await send_snapshot(websocket, topic)
+            elif action == "unsubscribe":
+                manager.unsubscribe(websocket, topic)
+                await manager.send_to(websocket, {"event": "UNSUBSCRIBED", "topic": topic})
     except Exception:
-        manager.disconnect(websocket)
\ No newline at end of file
+        manager.disconnect(websocket)
+
+
+# Operational metrics: admins only (ADMIN_USER_IDS)
+# Queue depth / slow-consumer counters for the tracking sockets
+@app.get("/ws/metrics", dependencies=[Depends(get_current_admin)])
+def websocket_metrics():
+    return {**manager.metrics(), "driver_locations": location_buffer.stats}
+
+
+# Password hashing pool (queue length / timings)
+@app.get("/metrics/hashing", dependencies=[Depends(get_current_admin)])
+def hashing_metrics():
+    return utils.hash_stats
+
+
+# Catalog response cache (hits / misses / size)
+@app.get("/metrics/response-cache", dependencies=[Depends(get_current_admin)])
+def response_cache_metrics():
+    return response_cache.metrics()
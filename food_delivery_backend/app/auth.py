@@ -2,14 +2,17 @@ from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 # --- FASTAPI & DB IMPORTS ---
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, update
 from sqlalchemy.future import select
 from . import database, models
+from .principal_cache import Principal, principal_cache, TRUST_TOKEN_ROLE
 
 # 1. LOAD ENVIRONMENT VARIABLES
 load_dotenv()
@@ -39,7 +42,13 @@ def create_access_token(data: dict):
 # 3. AUTHENTICATION DEPENDENCY
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)) -> Principal:
+    """
+    Returns a cached Principal (id, role, email, phone_number, is_active)
+    instead of the ORM User, so most requests skip the users lookup.
+    Deactivated users are refused; see principal_cache for how long a
+    cached principal can lag behind the users table.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -69,7 +78,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         print(f"   (Hint: Check if SECRET_KEY matches in main.py and auth.py)")
         raise credentials_exception
     
-    # C. Find User in Database
+    # C. Cached principal (or trusted token claims) -> no DB round trip
+    if user_id:
+        principal = principal_cache.get(int(user_id))
+        if principal is not None:
+            return _require_active(principal)
+
+        role_claim = payload.get("role")
+        if TRUST_TOKEN_ROLE and role_claim in models.UserRole.__members__:
+            # Tokens are only issued to active users; a later deactivation
+            # takes effect when the token expires
+            principal = Principal(id=int(user_id), role=models.UserRole(role_claim))
+            principal_cache.put(principal)
+            return principal
+
+    # D. Find User in Database
     if user_id:
         # Priority: Look up by ID (Faster & matches your current token)
         print(f"🔎 AUTH DEBUG: Looking for User ID: {user_id}")
@@ -86,4 +109,106 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         raise credentials_exception
         
     print(f" AUTH DEBUG: Access Granted for {user.email} (Role: {user.role})")
-    return user
\ No newline at end of file
+    principal = Principal.from_user(user)
+    principal_cache.put(principal)
+    return _require_active(principal)
+
+
+def _require_active(principal: Principal) -> Principal:
+    if not principal.is_active:
+        print(f"❌ AUTH DEBUG: User {principal.id} is deactivated")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    return principal
+
+
+# 4. WEBSOCKET AUTHENTICATION (no Depends available, decode once at connect)
+async def get_user_from_token(token: str, db: AsyncSession) -> Optional[models.User]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+    user_id = payload.get("user_id")
+    if user_id is None:
+        return None
+
+    result = await db.execute(select(models.User).filter(models.User.id == int(user_id)))
+    user = result.scalars().first()
+    if user is None or user.is_active is False:
+        return None
+    return user
+
+
+# 5. TRACKING TOPIC ACCESS (who may subscribe to which live feed)
+async def can_watch_topic(user: models.User, topic: str, db: AsyncSession) -> bool:
+    prefix, _, ident = topic.partition(":")
+    try:
+        ident = int(ident)
+    except ValueError:
+        return False
+
+    if prefix == "driver":
+        # Drivers only watch their own feed
+        return ident == user.id
+
+    if prefix == "restaurant":
+        result = await db.execute(select(models.Restaurant.owner_id).filter(models.Restaurant.id == ident))
+        return result.scalar() == user.id
+
+    if prefix == "order":
+        # The customer who placed it, or the owner of the restaurant it was placed at
+        result = await db.execute(
+            select(models.Order.customer_id, models.Restaurant.owner_id)
+            .outerjoin(models.Restaurant, models.Order.restaurant_id == models.Restaurant.id)
+            .filter(models.Order.id == ident)
+        )
+        row = result.first()
+        return row is not None and user.id in (row.customer_id, row.owner_id)
+
+    return False
+
+
+# 6. DELIVERY ACCESS (who may share an order's driver location)
+FINISHED_STATUSES = (models.OrderStatus.DELIVERED, models.OrderStatus.CANCELLED)
+
+async def claim_delivery(user: Principal, order_id: int, db: AsyncSession) -> bool:
+    """
+    True if `user` may share locations for this (active) order: the owner of
+    its restaurant, or its driver. The first driver to share a location for
+    an order without one becomes its driver (one atomic UPDATE, so two
+    drivers can't both claim it).
+    """
+    if user.role == models.UserRole.OWNER:
+        result = await db.execute(
+            select(models.Restaurant.owner_id)
+            .join(models.Order, models.Order.restaurant_id == models.Restaurant.id)
+            .filter(models.Order.id == order_id, models.Order.status.notin_(FINISHED_STATUSES))
+        )
+        return result.scalar() == user.id
+
+    if user.role == models.UserRole.DRIVER:
+        result = await db.execute(
+            update(models.Order)
+            .where(
+                models.Order.id == order_id,
+                models.Order.status.notin_(FINISHED_STATUSES),
+                or_(models.Order.driver_id.is_(None), models.Order.driver_id == user.id),
+            )
+            .values(driver_id=user.id)
+            .returning(models.Order.id)
+        )
+        claimed = result.scalar() is not None
+        await db.commit()
+        return claimed
+
+    return False
+
+
+# 7. ADMIN ACCESS (operational endpoints such as /metrics)
+# Comma-separated user ids; empty means nobody
+ADMIN_USER_IDS = {int(i) for i in os.getenv("ADMIN_USER_IDS", "").split(",") if i.strip().isdigit()}
+
+async def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if current_user.id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only")
+    return current_user
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple, Union
+
+from . import database
+
+# --- CONFIGURATION ---
+# "memory" (single process, default) or "postgres" (LISTEN/NOTIFY across workers)
+TRACKING_BROKER = os.getenv("TRACKING_BROKER", "memory")
+TRACKING_CHANNEL = os.getenv("TRACKING_CHANNEL", "tracking_events")
+# How often the listener connection is pinged, and how long a ping may take
+BROKER_HEALTH_SECONDS = float(os.getenv("BROKER_HEALTH_SECONDS", "10"))
+BROKER_HEALTH_TIMEOUT = float(os.getenv("BROKER_HEALTH_TIMEOUT", "5"))
+BROKER_MAX_BACKOFF = float(os.getenv("BROKER_MAX_BACKOFF", "30"))
+
+Handler = Callable[[list, dict], Awaitable[None]]
+
+
+# --- 1. BROKER INTERFACE ---
+class Broker(ABC):
+    """
+    Carries tracking & status events between workers. Every worker
+    subscribes its local ConnectionManager; publishers never deliver
+    locally themselves, so each event reaches each socket exactly once.
+    """
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, topics: Union[str, Iterable[str]], message: dict):
+        ...
+
+    async def _deliver(self, topics: list, message: dict):
+        if self._handler is not None:
+            await self._handler(topics, message)
+
+
+# --- 2. IN-MEMORY (Single Process & Tests) ---
+class InMemoryBroker(Broker):
+    async def publish(self, topics: Union[str, Iterable[str]], message: dict):
+        topics = [topics] if isinstance(topics, str) else list(topics)
+        await self._deliver(topics, message)
+
+
+# --- 3. POSTGRES LISTEN/NOTIFY (Multiple Workers / Nodes) ---
+def parse_event(payload: str) -> Tuple[List[str], dict]:
+    """Raises ValueError unless the payload is {"topics": [str, ...], "message": {...}}."""
+    event = json.loads(payload)
+    if not isinstance(event, dict):
+        raise ValueError("event is not an object")
+    topics, message = event.get("topics"), event.get("message")
+    if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+        raise ValueError("topics must be a list of strings")
+    if not isinstance(message, dict):
+        raise ValueError("message must be an object")
+    return topics, message
+
+
+class PostgresBroker(Broker):
+    """
+    One connection LISTENs, another NOTIFYs. A supervisor task pings the
+    listener and reconnects (with backoff) when it dies; events sent while
+    it was down are lost, like any other NOTIFY nobody listened to.
+    """
+
+    def __init__(self, dsn: str, channel: str = TRACKING_CHANNEL):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._listen_conn = None
+        self._notify_conn = None
+        self._notify_lock = asyncio.Lock()
+        self._supervisor: Optional[asyncio.Task] = None
+        # Deliveries started by _on_notify, referenced so they aren't garbage collected
+        self._deliveries: Set[asyncio.Task] = set()
+        self.stats = {"received": 0, "invalid": 0, "reconnects": 0}
+
+    async def _connect(self):
+        import asyncpg  # Only needed when this broker is selected
+        return await asyncpg.connect(self.dsn)
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        try:
+            await self._listen()
+        except Exception as e:
+            # Don't block startup; the supervisor keeps retrying
+            print(f"⚠️ Tracking broker could not connect: {e}")
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+            self._supervisor = None
+        for task in list(self._deliveries):
+            task.cancel()
+        await self._close_listener()
+        if self._notify_conn is not None:
+            await self._notify_conn.close()
+            self._notify_conn = None
+
+    # --- Listener health ---
+    async def _listen(self):
+        conn = await self._connect()
+        try:
+            await conn.add_listener(self.channel, self._on_notify)
+        except BaseException:
+            await conn.close()
+            raise
+        self._listen_conn = conn
+        print(f"📡 Listening for tracking events on '{self.channel}'")
+
+    async def _close_listener(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        try:
+            if not conn.is_closed():
+                await conn.remove_listener(self.channel, self._on_notify)
+            await conn.close()
+        except Exception:
+            conn.terminate()
+
+    async def _healthy(self) -> bool:
+        if self._listen_conn is None or self._listen_conn.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(self._listen_conn.execute("SELECT 1"), BROKER_HEALTH_TIMEOUT)
+            return True
+        except Exception as e:
+            print(f"⚠️ Tracking broker listener failed its health check: {e}")
+            return False
+
+    async def _supervise(self):
+        backoff = 1.0
+        while True:
+            await asyncio.sleep(BROKER_HEALTH_SECONDS if self._listen_conn is not None else backoff)
+            if await self._healthy():
+                backoff = 1.0
+                continue
+            await self._close_listener()
+            try:
+                await self._listen()
+                self.stats["reconnects"] += 1
+                backoff = 1.0
+            except Exception as e:
+                backoff = min(backoff * 2, BROKER_MAX_BACKOFF)
+                print(f"⚠️ Tracking broker reconnect failed, retrying in {backoff:.0f}s: {e}")
+
+    # --- Receiving ---
+    def _on_notify(self, connection, pid, channel, payload: str):
+        try:
+            topics, message = parse_event(payload)
+        except ValueError as e:
+            self.stats["invalid"] += 1
+            print(f"⚠️ Bad tracking event payload ({e}): {payload[:80]}")
+            return
+        self.stats["received"] += 1
+        task = asyncio.create_task(self._safe_deliver(topics, message))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _safe_deliver(self, topics: list, message: dict):
+        try:
+            await self._deliver(topics, message)
+        except Exception as e:
+            print(f"⚠️ Tracking event delivery failed: {e}")
+
+    # --- Sending ---
+    async def publish(self, topics: Union[str, Iterable[str]], message: dict):
+        topics = [topics] if isinstance(topics, str) else list(topics)
+        payload = json.dumps({"topics": topics, "message": message})
+        # One asyncpg connection can't run queries concurrently
+        async with self._notify_lock:
+            if self._notify_conn is None or self._notify_conn.is_closed():
+                self._notify_conn = await self._connect()
+            try:
+                await self._notify_conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except Exception:
+                # Reconnect on the next publish instead of reusing a broken connection
+                self._notify_conn.terminate()
+                self._notify_conn = None
+                raise
+
+
+def create_broker() -> Broker:
+    if TRACKING_BROKER == "postgres":
+        # asyncpg wants a plain postgresql:// DSN, not the SQLAlchemy dialect URL
+        return PostgresBroker(database.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
+    return InMemoryBroker()
+
+
+# Global Instance
+broker = create_broker()
+
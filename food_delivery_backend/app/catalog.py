@@ -0,0 +1,69 @@
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import models
+
+RESTAURANTS_KEY = "restaurants"
+DEFAULT_PAGE_LIMIT = 100
+
+
+def menu_key(restaurant_id: int) -> str:
+    return f"menu:{restaurant_id}"
+
+
+# --- VERSION COUNTERS ---
+async def get_version(db: AsyncSession, key: str) -> int:
+    result = await db.execute(select(models.CatalogVersion.version).filter(models.CatalogVersion.key == key))
+    return result.scalar() or 0
+
+
+async def bump_version(db: AsyncSession, key: str):
+    """Call inside the write's transaction (before commit)."""
+    stmt = pg_insert(models.CatalogVersion).values(key=key, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.CatalogVersion.key],
+        set_={"version": models.CatalogVersion.version + 1},
+    )
+    await db.execute(stmt)
+
+
+# --- PAGINATION ---
+def page_limit(limit: Optional[int], cursor: Optional[int]) -> Optional[int]:
+    """
+    Page size for a listing. Clients that send neither `limit` nor `cursor`
+    (the existing Home/Menu pages) still get the whole list (None).
+    """
+    if limit is None and cursor is None:
+        return None
+    return limit or DEFAULT_PAGE_LIMIT
+
+
+# --- CONDITIONAL GET ---
+def make_etag(key: str, version: int, *parts) -> str:
+    # Weak ETag: changes whenever the listing (or the requested page) changes,
+    # and is shared by the gzip & identity bodies, which are not byte-identical
+    suffix = "-".join(str(p) for p in parts if p is not None)
+    return f'W/"{key}-v{version}{"-" + suffix if suffix else ""}"'
+
+
+def cache_headers(etag: str) -> dict:
+    # Always revalidate, which is usually a cheap 304
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Returns a 304 response if the client already has this version (weak comparison)."""
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {_opaque(tag) for tag in if_none_match.split(",")}
+    if "*" in tags or _opaque(etag) in tags:
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
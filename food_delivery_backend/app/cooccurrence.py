@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.future import select
+
+from . import database, models
+
+# --- CONFIGURATION ---
+COOC_NEIGHBORS = int(os.getenv("COOC_NEIGHBORS", "20"))
+COOC_REBUILD_SECONDS = float(os.getenv("COOC_REBUILD_SECONDS", "3600"))
+# Final score = CF_BLEND_WEIGHT * co-occurrence + (1 - CF_BLEND_WEIGHT) * TF-IDF
+CF_BLEND_WEIGHT = float(os.getenv("CF_BLEND_WEIGHT", "0.6"))
+
+
+class CooccurrenceModel:
+    """
+    Item-item collaborative filtering from order_items: two items are
+    similar when they're bought in the same order (cosine over the
+    order x item matrix). Every item keeps a precomputed neighbor list,
+    so serving is just merging a few short lists.
+    """
+
+    def __init__(self, neighbors: int = COOC_NEIGHBORS):
+        self.neighbors = neighbors
+        # item -> {other_item: number of orders containing both}
+        self.pair_counts: Dict[int, Dict[int, int]] = {}
+        # item -> number of orders containing it
+        self.item_counts: Dict[int, int] = {}
+        # item -> [(other_item, similarity), ...] best first
+        self.neighbor_lists: Dict[int, List[Tuple[int, float]]] = {}
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Building ---
+    @staticmethod
+    def count_pairs(order_ids: np.ndarray, item_ids: np.ndarray):
+        """Order x item binary matrix X -> co-occurrence counts X.T @ X."""
+        orders, order_rows = np.unique(order_ids, return_inverse=True)
+        items, item_cols = np.unique(item_ids, return_inverse=True)
+        x = sp.csr_matrix(
+            (np.ones(len(order_rows), dtype=np.int32), (order_rows, item_cols)),
+            shape=(len(orders), len(items)),
+        )
+        x.data[:] = 1  # Same item twice in one order still counts once
+        cooc = (x.T @ x).tocoo()
+        return items, cooc
+
+    def compute_lists(self, items: np.ndarray, cooc: sp.coo_matrix):
+        """Pure Python over every non-zero pair: run it in a thread (see build)."""
+        pair_counts: Dict[int, Dict[int, int]] = {}
+        item_counts: Dict[int, int] = {}
+        for row, col, count in zip(cooc.row.tolist(), cooc.col.tolist(), cooc.data.tolist()):
+            a, b = int(items[row]), int(items[col])
+            if a == b:
+                item_counts[a] = count
+            else:
+                pair_counts.setdefault(a, {})[b] = count
+        neighbor_lists = {item: self._neighbors_of(item, pair_counts, item_counts) for item in item_counts}
+        return pair_counts, item_counts, neighbor_lists
+
+    def load_counts(self, items: np.ndarray, cooc: sp.coo_matrix):
+        self.pair_counts, self.item_counts, self.neighbor_lists = self.compute_lists(items, cooc)
+        self.ready = True
+
+    def _neighbors_of(self, item: int, pair_counts=None, item_counts=None) -> List[Tuple[int, float]]:
+        pair_counts = self.pair_counts if pair_counts is None else pair_counts
+        item_counts = self.item_counts if item_counts is None else item_counts
+        n_item = item_counts.get(item, 0)
+        if not n_item:
+            return []
+        scored = (
+            (other, count / math.sqrt(n_item * item_counts[other]))
+            for other, count in pair_counts.get(item, {}).items()
+        )
+        return heapq.nlargest(self.neighbors, scored, key=lambda pair: pair[1])
+
+    async def build(self):
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                select(models.OrderItem.order_id, models.OrderItem.menu_item_id)
+                .filter(models.OrderItem.menu_item_id.isnot(None))
+            )
+            rows = result.all()
+        if rows:
+            order_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            item_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+            items, cooc = await asyncio.to_thread(self.count_pairs, order_ids, item_ids)
+            lists = await asyncio.to_thread(self.compute_lists, items, cooc)
+            self.pair_counts, self.item_counts, self.neighbor_lists = lists
+        self.ready = True
+        print(f"🛒 Co-occurrence model ready ({len(self.item_counts)} items)")
+
+    # --- Incremental Updates ---
+    def add_order(self, menu_item_ids: Iterable[int]):
+        """
+        Called after verify_payment commits, on the event loop, so it stays
+        small: the ordered items get a fresh top-k (heapq.nlargest), and
+        lists of items bought with them only get that item's entry rescored
+        (O(k) each, no re-sort of all their pairs). An item the lower score
+        would let back into such a list waits for the periodic rebuild.
+        """
+        items = sorted({int(i) for i in menu_item_ids if i})
+        if not items:
+            return
+        for a in items:
+            self.item_counts[a] = self.item_counts.get(a, 0) + 1
+            pairs = self.pair_counts.setdefault(a, {})
+            for b in items:
+                if a != b:
+                    pairs[b] = pairs.get(b, 0) + 1
+
+        ordered = set(items)
+        for a in items:
+            self.neighbor_lists[a] = self._neighbors_of(a)
+        # Other items' similarity to an ordered item only drops (its count grew)
+        for a in items:
+            n_a = self.item_counts[a]
+            for b in self.pair_counts[a]:
+                if b in ordered:
+                    continue
+                neighbors = self.neighbor_lists.get(b)
+                if not neighbors:
+                    continue
+                for i, (other, _) in enumerate(neighbors):
+                    if other == a:
+                        score = self.pair_counts[b][a] / math.sqrt(self.item_counts[b] * n_a)
+                        neighbors[i] = (a, score)
+                        neighbors.sort(key=lambda pair: -pair[1])
+                        break
+
+    # --- Serving ---
+    def recommend_scored(self, liked_ids: Iterable[int], k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        excluded = set(exclude)
+        scores: Dict[int, float] = {}
+        for item in liked_ids:
+            for other, similarity in self.neighbor_lists.get(item, ()):
+                if other not in excluded:
+                    scores[other] = scores.get(other, 0.0) + similarity
+        return sorted(scores.items(), key=lambda pair: -pair[1])[:k]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self):
+        # Periodic rebuild picks up orders verified on other workers
+        while True:
+            try:
+                await self.build()
+            except Exception as e:
+                print(f"⚠️ Co-occurrence model build failed: {e}")
+            await asyncio.sleep(COOC_REBUILD_SECONDS)
+
+
+def blend(cf_scored: List[Tuple[int, float]], tfidf_scored: List[Tuple[int, float]],
+          k: int, cf_weight: float = CF_BLEND_WEIGHT) -> List[int]:
+    """Max-normalises both score lists and mixes them; returns the top-k item ids."""
+    combined: Dict[int, float] = {}
+    for scored, weight in ((cf_scored, cf_weight), (tfidf_scored, 1.0 - cf_weight)):
+        top = max((score for _, score in scored), default=0.0)
+        if top <= 0:
+            continue
+        for item_id, score in scored:
+            combined[item_id] = combined.get(item_id, 0.0) + weight * score / top
+    return [item_id for item_id, _ in sorted(combined.items(), key=lambda pair: -pair[1])[:k]]
+
+
+# Global Instance
+cooccurrence = CooccurrenceModel()
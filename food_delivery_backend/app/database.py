@@ -1,7 +1,8 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+import os
 
-DATABASE_URL = "use_your_database_url_here"
+DATABASE_URL = os.getenv("DATABASE_URL", "use_your_database_url_here")
 
 engine = create_async_engine(DATABASE_URL, echo=True)
 
@@ -0,0 +1,198 @@
+import asyncio
+import math
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.future import select
+
+from . import database, models
+
+# --- CONFIGURATION ---
+# Grid cell size in degrees (~5.5 km of latitude at 0.05)
+GEO_INDEX_CELL_DEG = float(os.getenv("GEO_INDEX_CELL_DEG", "0.05"))
+# Full rebuild interval, so restaurants created on other workers show up too
+GEO_INDEX_REFRESH_SECONDS = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "300"))
+# Above this many cells a query just checks every restaurant instead
+GEO_INDEX_MAX_CELLS = int(os.getenv("GEO_INDEX_MAX_CELLS", "400"))
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEG_LAT = 111_320
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def restaurant_row(restaurant: models.Restaurant) -> dict:
+    # Same fields as schemas.RestaurantOut, kept ready to serve
+    return {
+        "id": restaurant.id,
+        "name": restaurant.name,
+        "address": restaurant.address,
+        "is_open": restaurant.is_open,
+        "image_url": restaurant.image_url,
+        "latitude": restaurant.latitude,
+        "longitude": restaurant.longitude,
+    }
+
+
+# --- KEYSET CURSORS for /restaurants/nearby: "<distance_m>_<id>" of the last row ---
+def make_cursor(distance_m: float, restaurant_id: int) -> str:
+    return f"{distance_m!r}_{restaurant_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[float, int]:
+    """Raises ValueError for anything that isn't a cursor we issued."""
+    distance, _, restaurant_id = cursor.rpartition("_")
+    distance = float(distance)
+    if not math.isfinite(distance):
+        raise ValueError("Invalid cursor")
+    return distance, int(restaurant_id)
+
+
+def page_after(hits: List[Tuple[float, int]], limit: int,
+               after: Optional[Tuple[float, int]] = None) -> Tuple[List[Tuple[float, int]], Optional[str]]:
+    """
+    One page of (distance_m, id) hits sorted by (distance, id), strictly
+    after the cursor position, plus the cursor for the next page (or None).
+    """
+    if after is not None:
+        hits = [hit for hit in hits if hit > after]
+    page = hits[:limit]
+    next_cursor = make_cursor(*page[-1]) if len(hits) > limit else None
+    return page, next_cursor
+
+
+class RestaurantGeoIndex:
+    """
+    In-memory grid index of restaurants for /restaurants/nearby (closed
+    ones included, with is_open, like the PostGIS query). Each cell holds
+    the ids whose location falls inside it; a radius query only looks at
+    the cells overlapping the search circle.
+    """
+
+    def __init__(self, cell_deg: float = GEO_INDEX_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.rows: Dict[int, dict] = {}
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        # Upserts / removes made while a rebuild is loading, replayed onto the new index
+        self._journal: Optional[List[Tuple[str, object]]] = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg))
+
+    # --- Updates ---
+    def upsert(self, row: dict):
+        """Adds / moves / updates a restaurant."""
+        self.remove(row["id"])
+        if self._journal is not None:
+            self._journal.append(("upsert", row))
+        self.rows[row["id"]] = row
+        self.cells.setdefault(self._cell(row["latitude"], row["longitude"]), set()).add(row["id"])
+
+    def remove(self, restaurant_id: int):
+        if self._journal is not None:
+            self._journal.append(("remove", restaurant_id))
+        row = self.rows.pop(restaurant_id, None)
+        if row is None:
+            return
+        cell = self._cell(row["latitude"], row["longitude"])
+        ids = self.cells.get(cell)
+        if ids is not None:
+            ids.discard(restaurant_id)
+            if not ids:
+                del self.cells[cell]
+
+    # --- Queries ---
+    def _candidates(self, latitude: float, longitude: float, radius_m: float):
+        """Ids that may lie within `radius_m`; never more than GEO_INDEX_MAX_CELLS cells scanned."""
+        lat_span = radius_m / METERS_PER_DEG_LAT
+        min_lat, max_lat = latitude - lat_span, latitude + lat_span
+        cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        # Touching a pole or crossing the antimeridian breaks the lat/lng box: check everything
+        if min_lat <= -90 or max_lat >= 90 or cos_lat <= 0:
+            return self.rows.keys()
+        lng_span = radius_m / (METERS_PER_DEG_LAT * cos_lat)
+        if longitude - lng_span < -180 or longitude + lng_span > 180:
+            return self.rows.keys()
+
+        min_cell = self._cell(min_lat, longitude - lng_span)
+        max_cell = self._cell(max_lat, longitude + lng_span)
+        cell_count = (max_cell[0] - min_cell[0] + 1) * (max_cell[1] - min_cell[1] + 1)
+        if cell_count > GEO_INDEX_MAX_CELLS:
+            return self.rows.keys()
+
+        ids = []
+        for cell_lat in range(min_cell[0], max_cell[0] + 1):
+            for cell_lng in range(min_cell[1], max_cell[1] + 1):
+                ids.extend(self.cells.get((cell_lat, cell_lng), ()))
+        return ids
+
+    def nearby(self, latitude: float, longitude: float, radius_m: float) -> List[Tuple[float, int]]:
+        """Returns (distance_m, restaurant_id) pairs within `radius_m`, nearest first."""
+        latitude = min(max(latitude, -90.0), 90.0)
+        longitude = min(max(longitude, -180.0), 180.0)
+        radius_m = max(radius_m, 0.0)
+
+        hits = []
+        for restaurant_id in self._candidates(latitude, longitude, radius_m):
+            row = self.rows[restaurant_id]
+            distance = haversine_m(latitude, longitude, row["latitude"], row["longitude"])
+            if distance <= radius_m:
+                hits.append((distance, restaurant_id))
+        hits.sort()
+        return hits
+
+    # --- Loading ---
+    async def rebuild(self):
+        self._journal = []
+        try:
+            async with database.SessionLocal() as db:
+                result = await db.execute(select(models.Restaurant))
+                restaurants = result.scalars().all()
+
+            fresh = RestaurantGeoIndex(self.cell_deg)
+            for restaurant in restaurants:
+                if restaurant.latitude is not None and restaurant.longitude is not None:
+                    fresh.upsert(restaurant_row(restaurant))
+            # Changes made on this worker while the snapshot was loading
+            for action, arg in self._journal:
+                getattr(fresh, action)(arg)
+
+            # Swap in one go so queries never see a half-built index
+            self.rows, self.cells = fresh.rows, fresh.cells
+        finally:
+            self._journal = None
+        self.ready = True
+        print(f"🗺️ Restaurant geo index built ({len(self.rows)} restaurants)")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                print(f"⚠️ Restaurant geo index rebuild failed: {e}")
+            await asyncio.sleep(GEO_INDEX_REFRESH_SECONDS)
+
+
+# Global Instance
+restaurant_index = RestaurantGeoIndex()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from .broker import broker
+from .geo_index import haversine_m
+
+# --- CONFIGURATION ---
+LOCATION_TICK_HZ = float(os.getenv("LOCATION_TICK_HZ", "2"))
+LOCATION_MIN_MOVE_METERS = float(os.getenv("LOCATION_MIN_MOVE_METERS", "5"))
+# Orders with no driver update for this long (cancelled on another worker,
+# abandoned by the driver...) are dropped from the buffer
+LOCATION_STATE_TTL_SECONDS = float(os.getenv("LOCATION_STATE_TTL_SECONDS", "1800"))
+
+class LocationBuffer:
+    """
+    Latest-value-wins buffer of DRIVER_UPDATE messages per order.
+    GPS points arriving within one tick are merged, and the flush skips
+    movements below `min_move_m` unless the ETA/message text changed.
+    State is dropped when the order finishes, or after `state_ttl`
+    seconds without an update.
+    """
+
+    def __init__(
+        self,
+        tick_hz: float = LOCATION_TICK_HZ,
+        min_move_m: float = LOCATION_MIN_MOVE_METERS,
+        state_ttl: float = LOCATION_STATE_TTL_SECONDS,
+    ):
+        self.interval = 1.0 / tick_hz if tick_hz > 0 else 0.0
+        self.min_move_m = min_move_m
+        self.state_ttl = state_ttl
+        # order_id -> (topics, message) waiting for the next tick
+        self._pending: Dict[int, Tuple[Tuple[str, ...], dict]] = {}
+        # order_id -> (last message actually published, when it last got an update)
+        self._last_sent: Dict[int, Tuple[dict, float]] = {}
+        self._next_sweep = time.monotonic() + state_ttl
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"received": 0, "merged": 0, "suppressed": 0, "published": 0, "expired": 0}
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._tick_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def push(self, order_id: int, topics: Tuple[str, ...], message: dict):
+        self.stats["received"] += 1
+        if self.interval <= 0:
+            # Coalescing disabled: publish straight away
+            await self._publish(order_id, topics, message)
+            self._sweep(time.monotonic())
+            return
+        if order_id in self._pending:
+            self.stats["merged"] += 1
+        self._pending[order_id] = (topics, message)
+
+    def forget(self, order_id: int):
+        """Drops state for a finished order."""
+        self._pending.pop(order_id, None)
+        self._last_sent.pop(order_id, None)
+
+    def _sweep(self, now: float):
+        # At most a few times per TTL, so the scan stays off the hot path
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.state_ttl / 4
+        cutoff = now - self.state_ttl
+        stale = [order_id for order_id, (_, seen) in self._last_sent.items() if seen < cutoff]
+        for order_id in stale:
+            del self._last_sent[order_id]
+        self.stats["expired"] += len(stale)
+
+    def _should_publish(self, order_id: int, message: dict) -> bool:
+        entry = self._last_sent.get(order_id)
+        if entry is None:
+            return True
+        last = entry[0]
+        for field in ("distance", "time", "message"):
+            if last.get(field) != message.get(field):
+                return True
+        moved = haversine_m(last["lat"], last["lng"], message["lat"], message["lng"])
+        return moved >= self.min_move_m
+
+    async def _publish(self, order_id: int, topics: Tuple[str, ...], message: dict):
+        now = time.monotonic()
+        if not self._should_publish(order_id, message):
+            self.stats["suppressed"] += 1
+            # Still alive: keep the entry from expiring
+            self._last_sent[order_id] = (self._last_sent[order_id][0], now)
+            return
+        self._last_sent[order_id] = (message, now)
+        self.stats["published"] += 1
+        await broker.publish(topics, message)
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for order_id, (topics, message) in pending.items():
+            await self._publish(order_id, topics, message)
+        self._sweep(time.monotonic())
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Location flush failed: {e}")
+
+
+# Global Instance
+location_buffer = LocationBuffer()
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+
+from . import database, models
+
+# --- CONFIGURATION ---
+HISTORY_FLUSH_POINTS = int(os.getenv("HISTORY_FLUSH_POINTS", "500"))
+HISTORY_FLUSH_SECONDS = float(os.getenv("HISTORY_FLUSH_SECONDS", "5"))
+# While the database is unreachable failed batches are kept, up to this many points (oldest dropped first)
+HISTORY_MAX_BUFFERED_POINTS = int(os.getenv("HISTORY_MAX_BUFFERED_POINTS", "50000"))
+
+
+class LocationHistoryBuffer:
+    """
+    Buffers raw driver GPS points in flat arrays (no per-point objects) and
+    writes them to `driver_location_points` with one multi-row INSERT when
+    `flush_points` are pending or every `flush_seconds`. A failed batch goes
+    back into the buffer; points for orders that no longer exist are dropped
+    on their own instead of taking the rest of the batch with them.
+    """
+
+    def __init__(self, flush_points: int = HISTORY_FLUSH_POINTS, flush_seconds: float = HISTORY_FLUSH_SECONDS,
+                 max_buffered: int = HISTORY_MAX_BUFFERED_POINTS):
+        self.flush_points = flush_points
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self._reset()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self.stats = {"buffered": 0, "written": 0, "flushes": 0, "failed": 0, "requeued": 0}
+
+    def _reset(self):
+        self.order_ids = array("q")
+        self.driver_ids = array("q")
+        self.lats = array("d")
+        self.lngs = array("d")
+        self.timestamps = array("d")
+
+    def _columns(self):
+        return self.order_ids, self.driver_ids, self.lats, self.lngs, self.timestamps
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def append(self, order_id: int, driver_id: int, lat: float, lng: float, timestamp: Optional[float] = None):
+        """Callers check the order (auth.claim_delivery) first; `timestamp` is epoch seconds."""
+        self.order_ids.append(order_id)
+        self.driver_ids.append(driver_id)
+        self.lats.append(lat)
+        self.lngs.append(lng)
+        self.timestamps.append(timestamp if timestamp is not None else time.time())
+        self.stats["buffered"] += 1
+        if len(self) >= self.flush_points and not self._lock.locked():
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    def pending(self, order_id: int) -> List[Tuple[float, float, datetime]]:
+        """Not-yet-written (lng, lat, recorded_at) points of one order, oldest first."""
+        points = [
+            (self.lngs[i], self.lats[i], datetime.utcfromtimestamp(self.timestamps[i]))
+            for i in range(len(self))
+            if self.order_ids[i] == order_id
+        ]
+        points.sort(key=lambda point: point[2])
+        return points
+
+    def _requeue(self, batch):
+        """Puts a failed batch back in front of the points buffered meanwhile."""
+        merged = [old + new for old, new in zip(batch, self._columns())]
+        overflow = len(merged[0]) - self.max_buffered
+        if overflow > 0:
+            merged = [column[overflow:] for column in merged]
+            self.stats["failed"] += overflow
+        self.order_ids, self.driver_ids, self.lats, self.lngs, self.timestamps = merged
+        self.stats["requeued"] += len(batch[0])
+
+    @staticmethod
+    def _rows(batch, keep: Optional[Set[int]] = None) -> List[dict]:
+        order_ids, driver_ids, lats, lngs, timestamps = batch
+        return [
+            {
+                "order_id": order_ids[i],
+                "driver_id": driver_ids[i],
+                "location": f"POINT({lngs[i]} {lats[i]})",
+                "recorded_at": datetime.utcfromtimestamp(timestamps[i]),
+            }
+            for i in range(len(order_ids))
+            if keep is None or order_ids[i] in keep
+        ]
+
+    async def _write(self, rows: List[dict]):
+        async with database.SessionLocal() as db:
+            # executemany -> multi-row INSERT on asyncpg
+            await db.execute(insert(models.DriverLocationPoint), rows)
+            await db.commit()
+
+    async def flush(self):
+        async with self._lock:
+            if not len(self):
+                return
+            # Swap the arrays out first so new points keep buffering meanwhile
+            batch = self._columns()
+            self._reset()
+
+            rows = self._rows(batch)
+            try:
+                try:
+                    await self._write(rows)
+                except IntegrityError:
+                    # An order was deleted after its points were accepted: write the others
+                    async with database.SessionLocal() as db:
+                        result = await db.execute(
+                            select(models.Order.id).filter(models.Order.id.in_(set(batch[0])))
+                        )
+                        existing = set(result.scalars().all())
+                    kept = self._rows(batch, existing)
+                    self.stats["failed"] += len(rows) - len(kept)
+                    print(f"⚠️ Location history: dropped {len(rows) - len(kept)} points for missing orders")
+                    rows = kept
+                    if rows:
+                        await self._write(rows)
+            except Exception as e:
+                # Database unreachable etc.: keep the points for the next flush
+                self._requeue(batch)
+                print(f"❌ Location history flush failed ({len(rows)} points kept for retry): {e}")
+                return
+            self.stats["written"] += len(rows)
+            self.stats["flushes"] += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+
+# Global Instance
+location_history = LocationHistoryBuffer()
@@ -1,10 +1,10 @@
-from sqlalchemy import Column, Integer, String, Boolean, Enum, ForeignKey, Float, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, Enum, ForeignKey, Float, DateTime, Index, func
+from sqlalchemy.orm import relationship, column_property
+from sqlalchemy.dialects.postgresql import ARRAY
 from geoalchemy2 import Geometry
 from .database import Base
 import enum
 from datetime import datetime
-from geoalchemy2.shape import to_shape
 
 # --- ENUMS ---
 class UserRole(str, enum.Enum):
@@ -32,7 +32,7 @@ class User(Base):
     is_active = Column(Boolean, default=True)
 
     restaurant = relationship("Restaurant", back_populates="owner", uselist=False)
-    orders = relationship("Order", back_populates="customer")
+    orders = relationship("Order", back_populates="customer", foreign_keys="Order.customer_id")
 
 # --- RESTAURANTS ---
 class Restaurant(Base):
@@ -48,18 +48,23 @@ class Restaurant(Base):
     is_open = Column(Boolean, default=True)
     image_url = Column(String, nullable=True)
 
-    @property
-    def latitude(self):
-        return to_shape(self.location).y
-
-    @property
-    def longitude(self):
-        return to_shape(self.location).x
+    # Coordinates come back as plain floats in the same SELECT (ST_Y / ST_X),
+    # so serializing a restaurant never parses WKB into shapely objects
+    latitude = column_property(func.ST_Y(location, type_=Float))
+    longitude = column_property(func.ST_X(location, type_=Float))
 
     owner = relationship("User", back_populates="restaurant")
     menu_items = relationship("MenuItem", back_populates="restaurant")
     orders = relationship("Order", back_populates="restaurant")
 
+# GiST index on location::geography so metre-based ST_DWithin and KNN (<->)
+# ordering in /restaurants/nearby can use an index
+Index(
+    "ix_restaurants_location_geography",
+    func.geography(Restaurant.location),
+    postgresql_using="gist",
+)
+
 
 # --- MENU ITEMS (Updated) ---
 class MenuItem(Base):
@@ -74,6 +79,7 @@ class MenuItem(Base):
     
     # 👇 FIXED: Added these columns
     image_url = Column(String, nullable=True)
+    thumbnail_url = Column(String, nullable=True) # Small variant for cards / lists
     category = Column(String, default="Fast Food") 
 
     restaurant = relationship("Restaurant", back_populates="menu_items")
@@ -88,7 +94,7 @@ class Order(Base):
     restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
 
-    stripe_payment_id = Column(String, nullable=True)
+    stripe_payment_id = Column(String, nullable=True, unique=True) # One order per payment
     total_amount = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -102,11 +108,15 @@ class Order(Base):
     delivery_otp = Column(String, nullable=True)
     visible_to_customer = Column(Boolean, default=True)
     visible_to_owner = Column(Boolean, default=True)
+    driver_id = Column(Integer, ForeignKey("users.id"), nullable=True) # First driver to share a location
 
-    customer = relationship("User", back_populates="orders")
+    customer = relationship("User", back_populates="orders", foreign_keys=[customer_id])
     restaurant = relationship("Restaurant", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
 
+# Per-restaurant time-range scans (analytics)
+Index("ix_orders_restaurant_created_at", Order.restaurant_id, Order.created_at)
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
@@ -117,4 +127,69 @@ class OrderItem(Base):
     price_at_time_of_order = Column(Integer)
 
     order = relationship("Order", back_populates="items")
-    menu_item = relationship("MenuItem")
\ No newline at end of file
+    menu_item = relationship("MenuItem")
+
+
+# --- DRIVER LOCATION HISTORY (Append-only) ---
+class DriverLocationPoint(Base):
+    __tablename__ = "driver_location_points"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    driver_id = Column(Integer, ForeignKey("users.id"), index=True)
+    location = Column(Geometry("POINT", srid=4326))
+    recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# --- SIGNUP OTPs (Shared across workers) ---
+class SignupOtp(Base):
+    __tablename__ = "signup_otps"
+
+    phone_number = Column(String, primary_key=True)
+    code = Column(String, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# --- CATALOG VERSIONS (ETags for restaurant / menu listings) ---
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    key = Column(String, primary_key=True) # "restaurants" or "menu:{restaurant_id}"
+    version = Column(Integer, default=1, nullable=False)
+
+
+# --- PRECOMPUTED RECOMMENDATIONS (One row per customer) ---
+class UserRecommendation(Base):
+    __tablename__ = "user_recommendations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    item_ids = Column(ARRAY(Integer), nullable=False) # Best first
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --- ITEM POPULARITY (Decayed order counters, upserted with each verified order) ---
+class ItemPopularity(Base):
+    __tablename__ = "item_popularity"
+
+    restaurant_id = Column(Integer, primary_key=True) # 0 = all restaurants
+    hour = Column(Integer, primary_key=True)          # 0-23 UTC, -1 = any time of day
+    menu_item_id = Column(Integer, ForeignKey("menu_items.id"), primary_key=True)
+    score = Column(Float, nullable=False)             # Decayed up to updated_at
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# --- SCHEMA UPGRADES (Run at every startup) ---
+# create_all only creates missing tables; it never adds indexes, constraints
+# or columns to tables that already exist. Each statement is idempotent.
+SCHEMA_UPGRADES = [
+    "CREATE INDEX IF NOT EXISTS ix_restaurants_location_geography "
+    "ON restaurants USING gist (geography(location))",
+    # Same name create_all gives the unique constraint, so fresh installs skip it.
+    # Fails (and is logged) while duplicate payment ids exist.
+    "CREATE UNIQUE INDEX IF NOT EXISTS orders_stripe_payment_id_key ON orders (stripe_payment_id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_restaurant_created_at ON orders (restaurant_id, created_at)",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS driver_id INTEGER REFERENCES users (id)",
+    "ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS thumbnail_url VARCHAR",
+]
@@ -0,0 +1,263 @@
+import asyncio
+import enum
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import utils
+
+# --- CONFIGURATION ---
+# "twilio" (default), "file" (appends to SMS_OUTBOX_FILE) or "memory"
+SMS_TRANSPORT = os.getenv("SMS_TRANSPORT", "twilio")
+SMS_OUTBOX_FILE = os.getenv("SMS_OUTBOX_FILE", "sms_outbox.log")
+
+
+class Enqueued(str, enum.Enum):
+    QUEUED = "QUEUED"
+    DUPLICATE = "DUPLICATE"     # same text to the same number was queued moments ago
+    QUEUE_FULL = "QUEUE_FULL"   # dropped, nothing will be sent
+
+
+@dataclass
+class SmsMessage:
+    to: str
+    body: str
+    attempts: int = 0
+
+
+# --- 1. TRANSPORTS ---
+class SmsTransport(ABC):
+    async def send_batch(self, messages: List[SmsMessage]) -> List[SmsMessage]:
+        """Sends each message and returns the ones that failed."""
+        failed = []
+        for message in messages:
+            message.attempts += 1
+            try:
+                await self.send(message)
+            except Exception as e:
+                print(f"❌ SMS to {message.to} failed: {e}")
+                failed.append(message)
+        return failed
+
+    @abstractmethod
+    async def send(self, message: SmsMessage):
+        ...
+
+    @property
+    def available(self) -> bool:
+        """False when retrying can't help (e.g. no credentials configured)."""
+        return True
+
+
+class TwilioTransport(SmsTransport):
+    @property
+    def available(self) -> bool:
+        return utils.sms_client is not None
+
+    async def send(self, message: SmsMessage):
+        if utils.sms_client is None:
+            raise RuntimeError("Twilio Client not initialized (Check keys in utils.py)")
+        # The Twilio SDK is blocking, keep it off the event loop
+        result = await asyncio.to_thread(
+            utils.sms_client.messages.create,
+            body=message.body,
+            from_=utils.TWILIO_PHONE_NUMBER,
+            to=message.to
+        )
+        print(f"✅ SMS Sent to {message.to}: {result.sid}")
+
+
+class MemoryTransport(SmsTransport):
+    def __init__(self):
+        self.sent: List[SmsMessage] = []
+
+    async def send(self, message: SmsMessage):
+        self.sent.append(message)
+
+
+class FileTransport(SmsTransport):
+    def __init__(self, path: str):
+        self.path = path
+
+    async def send_batch(self, messages: List[SmsMessage]) -> List[SmsMessage]:
+        # One write for the whole batch
+        for message in messages:
+            message.attempts += 1
+        lines = "".join(f"{time.time():.3f}\t{m.to}\t{m.body}\n" for m in messages)
+        try:
+            await asyncio.to_thread(self._append, lines)
+        except OSError as e:
+            print(f"❌ SMS outbox write failed: {e}")
+            return list(messages)
+        return []
+
+    async def send(self, message: SmsMessage):
+        await asyncio.to_thread(self._append, f"{time.time():.3f}\t{message.to}\t{message.body}\n")
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def create_transport() -> SmsTransport:
+    if SMS_TRANSPORT == "memory":
+        return MemoryTransport()
+    if SMS_TRANSPORT == "file":
+        return FileTransport(SMS_OUTBOX_FILE)
+    return TwilioTransport()
+
+
+# --- 2. DISPATCHER ---
+class NotificationDispatcher:
+    """
+    In-process SMS queue. Request handlers call `enqueue_sms` and return
+    immediately; a small pool of workers drains the queue in batches.
+    Failed messages are put back on the queue after an exponential backoff
+    (a separate waiting task, not a sleeping worker).
+    """
+
+    def __init__(
+        self,
+        transport: SmsTransport,
+        workers: int = 4,
+        batch_size: int = 10,
+        max_attempts: int = 4,
+        base_backoff: float = 1.0,
+        dedupe_seconds: float = 30.0,
+        max_queue: int = 10_000,
+    ):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.dedupe_seconds = dedupe_seconds
+        self.max_queue = max_queue
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        # (recipient, body) -> last time it was accepted
+        self._recent: Dict[Tuple[str, str], float] = {}
+
+        self.stats = {"enqueued": 0, "deduplicated": 0, "dropped": 0, "sent": 0, "retried": 0, "failed": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._tasks and not any(task.done() for task in self._tasks):
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        # Replaces any worker that has stopped
+        alive = [task for task in self._tasks if not task.done()]
+        self._tasks = alive + [asyncio.create_task(self._worker()) for _ in range(self.workers - len(alive))]
+
+    async def stop(self, timeout: float = 5.0):
+        if not self._tasks:
+            return
+        # Give pending messages a chance to go out before shutting down
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Dropping {self._queue.qsize()} unsent SMS on shutdown")
+        for retry in list(self._retries):
+            retry.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- Producer side ---
+    def _is_duplicate(self, key: Tuple[str, str], now: float) -> bool:
+        if len(self._recent) > self.max_queue:
+            cutoff = now - self.dedupe_seconds
+            self._recent = {k: t for k, t in self._recent.items() if t > cutoff}
+        last = self._recent.get(key)
+        return last is not None and now - last < self.dedupe_seconds
+
+    def enqueue_sms(self, phone_number: str, message_body: str) -> Enqueued:
+        """Queues an SMS. Only QUEUE_FULL means the recipient won't get it."""
+        self.start()
+        to = utils.normalize_phone(phone_number)
+        key = (to, message_body)
+        now = time.monotonic()
+
+        if self._is_duplicate(key, now):
+            self.stats["deduplicated"] += 1
+            return Enqueued.DUPLICATE
+
+        try:
+            self._queue.put_nowait(SmsMessage(to=to, body=message_body))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            print(f"⚠️ SMS queue full, dropping message to {to}")
+            return Enqueued.QUEUE_FULL
+
+        self._recent[key] = now
+        self.stats["enqueued"] += 1
+        return Enqueued.QUEUED
+
+    # --- Consumer side ---
+    def _take_batch(self, first: SmsMessage) -> List[SmsMessage]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = self._take_batch(await self._queue.get())
+            attempts = [message.attempts for message in batch]
+            try:
+                await self._deliver(batch)
+            except Exception as e:
+                # A transport bug must not kill the worker: retry the batch like a failed send
+                print(f"❌ SMS batch of {len(batch)} failed: {e}")
+                for message, before in zip(batch, attempts):
+                    message.attempts = max(message.attempts, before + 1)
+                    self._schedule_retry(message)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _deliver(self, batch: List[SmsMessage]):
+        failed = await self.transport.send_batch(batch)
+        self.stats["sent"] += len(batch) - len(failed)
+        for message in failed:
+            self._schedule_retry(message)
+
+    def _schedule_retry(self, message: SmsMessage):
+        if message.attempts >= self.max_attempts or not self.transport.available:
+            self._give_up(message)
+            return
+        self.stats["retried"] += 1
+        delay = self.base_backoff * (2 ** (message.attempts - 1))
+        retry = asyncio.create_task(self._requeue_later(message, delay))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _requeue_later(self, message: SmsMessage, delay: float):
+        # Waits on its own, so the workers keep draining the queue meanwhile
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            self._give_up(message)
+
+    def _give_up(self, message: SmsMessage):
+        self.stats["failed"] += 1
+        print(f"❌ Giving up on SMS to {message.to} after {message.attempts} attempts")
+        print(f"========================================")
+        print(f"📨 SIMULATED SMS TO {message.to}:")
+        print(f"📄 {message.body}")
+        print(f"========================================")
+
+
+# Global Instance
+notifier = NotificationDispatcher(create_transport())
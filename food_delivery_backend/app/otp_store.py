@@ -0,0 +1,202 @@
+import asyncio
+import enum
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from . import database, models
+
+# --- CONFIGURATION ---
+# "memory" (single process) or "database" (shared by every worker)
+OTP_STORE = os.getenv("OTP_STORE", "memory")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_MAX_ENTRIES = int(os.getenv("OTP_MAX_ENTRIES", "100000"))
+OTP_SWEEP_SECONDS = float(os.getenv("OTP_SWEEP_SECONDS", "60"))
+
+
+class OtpCheck(str, enum.Enum):
+    OK = "OK"
+    MISSING = "MISSING"   # never requested, already used, or expired
+    INVALID = "INVALID"
+    LOCKED = "LOCKED"     # too many wrong attempts
+
+
+# --- 1. STORE INTERFACE ---
+class OtpStore(ABC):
+    def __init__(self, ttl_seconds: int = OTP_TTL_SECONDS, max_attempts: int = OTP_MAX_ATTEMPTS,
+                 max_entries: int = OTP_MAX_ENTRIES, sweep_seconds: float = OTP_SWEEP_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self.sweep_seconds = sweep_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def put(self, phone_number: str, code: str):
+        ...
+
+    @abstractmethod
+    async def check(self, phone_number: str, code: str) -> OtpCheck:
+        """Compares `code`; wrong guesses count towards `max_attempts`."""
+        ...
+
+    @abstractmethod
+    async def discard(self, phone_number: str):
+        ...
+
+    @abstractmethod
+    async def evict_expired(self) -> int:
+        ...
+
+    # --- Background eviction ---
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.evict_expired()
+            except Exception as e:
+                print(f"⚠️ OTP sweep failed: {e}")
+
+
+# --- 2. IN-MEMORY (Single Process) ---
+class MemoryOtpStore(OtpStore):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # phone -> [code, attempts, expires_at]; oldest request first
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+
+    async def put(self, phone_number: str, code: str):
+        self._entries.pop(phone_number, None)
+        self._entries[phone_number] = [code, 0, time.monotonic() + self.ttl_seconds]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def check(self, phone_number: str, code: str) -> OtpCheck:
+        entry = self._entries.get(phone_number)
+        if entry is None:
+            return OtpCheck.MISSING
+        if time.monotonic() > entry[2]:
+            del self._entries[phone_number]
+            return OtpCheck.MISSING
+        if entry[1] >= self.max_attempts:
+            return OtpCheck.LOCKED
+        if entry[0] != code:
+            entry[1] += 1
+            return OtpCheck.INVALID
+        return OtpCheck.OK
+
+    async def discard(self, phone_number: str):
+        self._entries.pop(phone_number, None)
+
+    async def evict_expired(self) -> int:
+        now = time.monotonic()
+        expired = [phone for phone, entry in self._entries.items() if now > entry[2]]
+        for phone in expired:
+            del self._entries[phone]
+        return len(expired)
+
+
+# --- 3. DATABASE (Shared Across Workers) ---
+class DatabaseOtpStore(OtpStore):
+    async def put(self, phone_number: str, code: str):
+        now = datetime.utcnow()
+        values = {
+            "phone_number": phone_number,
+            "code": code,
+            "attempts": 0,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds),
+        }
+        stmt = pg_insert(models.SignupOtp).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.SignupOtp.phone_number],
+            set_={k: v for k, v in values.items() if k != "phone_number"},
+        )
+        async with database.SessionLocal() as db:
+            await db.execute(stmt)
+            await db.commit()
+
+    def check_statement(self, phone_number: str, code: str, now: datetime):
+        # Check and count in one UPDATE: the row lock serialises concurrent
+        # guesses from all workers, so at most max_attempts wrong ones get through
+        matched = models.SignupOtp.code == code
+        return (
+            update(models.SignupOtp)
+            .where(models.SignupOtp.phone_number == phone_number)
+            .where(models.SignupOtp.expires_at > now)
+            .where(models.SignupOtp.attempts < self.max_attempts)
+            .values(attempts=models.SignupOtp.attempts + case((matched, 0), else_=1))
+            .returning(matched.label("matched"))
+        )
+
+    async def check(self, phone_number: str, code: str) -> OtpCheck:
+        now = datetime.utcnow()
+        async with database.SessionLocal() as db:
+            result = await db.execute(self.check_statement(phone_number, code, now))
+            row = result.first()
+            await db.commit()
+            if row is not None:
+                return OtpCheck.OK if row.matched else OtpCheck.INVALID
+
+            # Nothing updated: either no live code or it is locked (read-only, no race)
+            locked = await db.execute(
+                select(models.SignupOtp.phone_number)
+                .filter(models.SignupOtp.phone_number == phone_number)
+                .filter(models.SignupOtp.expires_at > now)
+            )
+            return OtpCheck.LOCKED if locked.first() is not None else OtpCheck.MISSING
+
+    async def discard(self, phone_number: str):
+        async with database.SessionLocal() as db:
+            await db.execute(delete(models.SignupOtp).where(models.SignupOtp.phone_number == phone_number))
+            await db.commit()
+
+    async def evict_expired(self) -> int:
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                delete(models.SignupOtp).where(models.SignupOtp.expires_at <= datetime.utcnow())
+            )
+            removed = result.rowcount or 0
+
+            # Size cap: drop the oldest requests beyond max_entries
+            count = (await db.execute(select(func.count()).select_from(models.SignupOtp))).scalar() or 0
+            if count > self.max_entries:
+                oldest = (
+                    select(models.SignupOtp.phone_number)
+                    .order_by(models.SignupOtp.created_at)
+                    .limit(count - self.max_entries)
+                )
+                result = await db.execute(
+                    delete(models.SignupOtp).where(models.SignupOtp.phone_number.in_(oldest))
+                )
+                removed += result.rowcount or 0
+            await db.commit()
+        return removed
+
+
+def create_otp_store() -> OtpStore:
+    if OTP_STORE == "database":
+        return DatabaseOtpStore()
+    return MemoryOtpStore()
+
+
+# Global Instance
+otp_store = create_otp_store()
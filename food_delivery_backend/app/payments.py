@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import httpx
+
+# --- CONFIGURATION ---
+RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID", "use_your_razorpay_key_id")
+RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET", "your_razorpay_key_secret")
+RAZORPAY_API_URL = "https://api.razorpay.com/v1"
+
+# "razorpay" (default) or "fake" for local load tests with no network
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "razorpay")
+PAYMENT_MAX_CONCURRENCY = int(os.getenv("PAYMENT_MAX_CONCURRENCY", "20"))
+
+
+class PaymentError(Exception):
+    pass
+
+
+def sign_payment(order_id: str, payment_id: str, secret: str) -> str:
+    # Same scheme Razorpay uses: HMAC_SHA256(order_id|payment_id, key_secret)
+    message = f"{order_id}|{payment_id}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def order_matches(gateway_order: dict, amount: int, customer_id: int) -> bool:
+    """
+    True if the gateway order was created for this customer (notes set in
+    /orders/initiate) and for exactly `amount` (in paise).
+    """
+    notes = gateway_order.get("notes") or {}
+    return (
+        int(gateway_order.get("amount") or -1) == amount
+        and str(notes.get("customer_id")) == str(customer_id)
+    )
+
+
+# --- 1. GATEWAY INTERFACE ---
+class PaymentGateway(ABC):
+    """
+    Async interface used by routers/orders.py. Signature checks are always
+    done locally (HMAC), only order creation and refunds hit the network.
+    """
+
+    def __init__(self, key_id: str, key_secret: str):
+        self.key_id = key_id
+        self.key_secret = key_secret
+
+    @abstractmethod
+    async def create_order(self, amount: int, currency: str = "INR", receipt: str = "order_receipt",
+                           notes: Optional[dict] = None) -> dict:
+        ...
+
+    @abstractmethod
+    async def fetch_order(self, order_id: str) -> dict:
+        """Gateway-side order (authoritative `amount` and `notes`)."""
+        ...
+
+    @abstractmethod
+    async def refund(self, payment_id: str, amount: int) -> dict:
+        ...
+
+    def verify_signature(self, order_id: str, payment_id: str, signature: str):
+        expected = sign_payment(order_id, payment_id, self.key_secret)
+        if not hmac.compare_digest(expected, signature or ""):
+            raise PaymentError("Invalid payment signature")
+
+    async def close(self):
+        pass
+
+
+# --- 2. RAZORPAY (Pooled, Non-Blocking) ---
+class RazorpayGateway(PaymentGateway):
+    def __init__(self, key_id: str, key_secret: str, max_concurrency: int = PAYMENT_MAX_CONCURRENCY):
+        super().__init__(key_id, key_secret)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._max_concurrency = max_concurrency
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=RAZORPAY_API_URL,
+                auth=(self.key_id, self.key_secret),
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=self._max_concurrency,
+                ),
+            )
+        return self._client
+
+    async def _request(self, method: str, path: str, data: Optional[dict] = None) -> dict:
+        async with self._semaphore:
+            try:
+                response = await self._get_client().request(method, path, json=data)
+            except httpx.HTTPError as e:
+                raise PaymentError(str(e)) from e
+        if response.status_code >= 400:
+            raise PaymentError(f"Razorpay {response.status_code}: {response.text}")
+        return response.json()
+
+    async def create_order(self, amount: int, currency: str = "INR", receipt: str = "order_receipt",
+                           notes: Optional[dict] = None) -> dict:
+        data = {"amount": amount, "currency": currency, "receipt": receipt}
+        if notes:
+            data["notes"] = notes
+        return await self._request("POST", "/orders", data)
+
+    async def fetch_order(self, order_id: str) -> dict:
+        return await self._request("GET", f"/orders/{order_id}")
+
+    async def refund(self, payment_id: str, amount: int) -> dict:
+        return await self._request("POST", f"/payments/{payment_id}/refund", {"amount": amount})
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# --- 3. FAKE GATEWAY (Local Load Tests) ---
+class FakeGateway(PaymentGateway):
+    """
+    No network at all. Orders get random ids and refunds are only recorded,
+    so checkout can be load-tested at hundreds of requests per second.
+    Use `sign_payment(order_id, payment_id, key_secret)` to build valid signatures.
+    """
+
+    def __init__(self, key_id: str = "rzp_test_fake", key_secret: str = "fake_secret"):
+        super().__init__(key_id, key_secret)
+        self.orders: Dict[str, dict] = {}
+        self.refunds: List[dict] = []
+
+    async def create_order(self, amount: int, currency: str = "INR", receipt: str = "order_receipt",
+                           notes: Optional[dict] = None) -> dict:
+        order = {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "notes": dict(notes or {}),
+        }
+        self.orders[order["id"]] = order
+        return order
+
+    async def fetch_order(self, order_id: str) -> dict:
+        order = self.orders.get(order_id)
+        if order is None:
+            raise PaymentError(f"Unknown order {order_id}")
+        return order
+
+    async def refund(self, payment_id: str, amount: int) -> dict:
+        refund = {"id": f"rfnd_{uuid.uuid4().hex[:14]}", "payment_id": payment_id, "amount": amount}
+        self.refunds.append(refund)
+        return refund
+
+
+def create_gateway() -> PaymentGateway:
+    if PAYMENT_GATEWAY == "fake":
+        print("⚠️ Using FakeGateway (no real payments)")
+        return FakeGateway()
+    return RazorpayGateway(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)
+
+
+# Global Instance
+gateway = create_gateway()
@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, extract, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from . import database, models
+
+# --- CONFIGURATION ---
+# Exponential time decay; 0 disables it (plain all-time counts)
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "14"))
+POPULARITY_TOP_K = int(os.getenv("POPULARITY_TOP_K", "20"))
+# Reload of the item_popularity counters, so orders verified on other workers are counted too
+POPULARITY_REBUILD_SECONDS = float(os.getenv("POPULARITY_REBUILD_SECONDS", "300"))
+
+GLOBAL = 0      # Scope for "all restaurants"
+ALL_HOURS = -1  # Hour bucket for "any time of day"
+
+Key = Tuple[int, int]  # (restaurant_id or GLOBAL, hour 0-23 UTC or ALL_HOURS)
+
+
+def order_keys(restaurant_id: Optional[int], hour: int) -> Tuple[Key, ...]:
+    if not restaurant_id:
+        return (GLOBAL, hour), (GLOBAL, ALL_HOURS)
+    return (restaurant_id, hour), (restaurant_id, ALL_HOURS), (GLOBAL, hour), (GLOBAL, ALL_HOURS)
+
+
+class PopularityRanking:
+    """
+    Quantity-weighted item popularity per restaurant and globally, each
+    also split by hour of day (UTC, like Order.created_at). Decay uses a
+    growing weight instead of shrinking every score: an order at time t
+    adds quantity * 2^((t - origin) / half_life), which ranks the same as
+    decaying everything else. Top lists are cached per key, so a lookup is
+    a dict hit unless that key changed since the last read.
+
+    The counters are persisted in `item_popularity`, upserted in the same
+    transaction as each verified order (`record_order`); workers reload
+    that small table instead of rescanning orders. Only an empty table is
+    backfilled from order history, once.
+    """
+
+    def __init__(self, half_life_days: float = POPULARITY_HALF_LIFE_DAYS, top_k: int = POPULARITY_TOP_K):
+        self.half_life_seconds = half_life_days * 86400
+        self.top_k = top_k
+        self.origin = time.time()
+        self.scores: Dict[Key, Dict[int, float]] = {}
+        self._top: Dict[Key, List[int]] = {}
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    def weight(self, timestamp: float) -> float:
+        if self.half_life_seconds <= 0:
+            return 1.0
+        return 2.0 ** ((timestamp - self.origin) / self.half_life_seconds)
+
+    def _rebase(self, timestamp: float):
+        """Moves the origin forward before weights grow large enough to lose precision."""
+        factor = 1.0 / self.weight(timestamp)
+        for scores in self.scores.values():
+            for item_id in scores:
+                scores[item_id] *= factor
+        self.origin = timestamp
+
+    def _add(self, key: Key, item_id: int, amount: float):
+        scores = self.scores.setdefault(key, {})
+        scores[item_id] = scores.get(item_id, 0.0) + amount
+        self._top.pop(key, None)
+
+    # --- Incremental Updates ---
+    def add_order(self, restaurant_id: int, lines: Iterable[Tuple[int, int]], created_at: Optional[datetime] = None):
+        """`lines` are (menu_item_id, quantity); called after verify_payment commits."""
+        # created_at is naive UTC (datetime.utcnow)
+        timestamp = created_at.replace(tzinfo=timezone.utc).timestamp() if created_at else time.time()
+        if self.weight(timestamp) > 1e6:
+            self._rebase(timestamp)
+        weight = self.weight(timestamp)
+        hour = (created_at or datetime.utcnow()).hour
+        for menu_item_id, quantity in lines:
+            if not menu_item_id:
+                continue
+            amount = (quantity or 1) * weight
+            for key in order_keys(restaurant_id, hour):
+                self._add(key, menu_item_id, amount)
+
+    # --- Persisted Counters ---
+    def _decay(self, since, until):
+        """SQL factor taking a score decayed up to `since` on to `until`."""
+        if self.half_life_seconds <= 0:
+            return literal(1.0)
+        return func.power(2.0, -extract("epoch", until - since) / self.half_life_seconds)
+
+    def upsert_statement(self, restaurant_id: Optional[int], lines: Iterable[Tuple[int, int]], created_at: datetime):
+        """One multi-row INSERT .. ON CONFLICT that adds this order to the decayed counters."""
+        amounts: Dict[Tuple[int, int, int], float] = {}
+        for menu_item_id, quantity in lines:
+            if not menu_item_id:
+                continue
+            for scope, hour in order_keys(restaurant_id, created_at.hour):
+                key = (scope, hour, menu_item_id)
+                amounts[key] = amounts.get(key, 0.0) + (quantity or 1)
+        if not amounts:
+            return None
+
+        stmt = pg_insert(models.ItemPopularity).values([
+            {"restaurant_id": scope, "hour": hour, "menu_item_id": item_id, "score": amount, "updated_at": created_at}
+            for (scope, hour, item_id), amount in amounts.items()
+        ])
+        stored, new = models.ItemPopularity.__table__.c, stmt.excluded
+        latest = func.greatest(stored.updated_at, new.updated_at)
+        return stmt.on_conflict_do_update(
+            index_elements=[stored.restaurant_id, stored.hour, stored.menu_item_id],
+            set_={
+                "score": stored.score * self._decay(stored.updated_at, latest)
+                         + new.score * self._decay(new.updated_at, latest),
+                "updated_at": latest,
+            },
+        )
+
+    async def record_order(self, db, restaurant_id: Optional[int], lines: Iterable[Tuple[int, int]],
+                           created_at: datetime):
+        """Called inside verify_payment's transaction, before the commit."""
+        stmt = self.upsert_statement(restaurant_id, lines, created_at)
+        if stmt is not None:
+            await db.execute(stmt)
+
+    # --- Lookups ---
+    def top(self, restaurant_id: Optional[int] = None, hour: Optional[int] = None) -> List[int]:
+        key = (restaurant_id or GLOBAL, ALL_HOURS if hour is None else hour)
+        cached = self._top.get(key)
+        if cached is None:
+            scores = self.scores.get(key, {})
+            cached = heapq.nlargest(self.top_k, scores, key=scores.__getitem__)
+            self._top[key] = cached
+        return cached
+
+    def recommend(self, k: int, restaurant_id: Optional[int] = None, hour: Optional[int] = None,
+                  exclude: Iterable[int] = ()) -> List[int]:
+        """Hour-of-day list first, topped up from the all-day list when the hour is thin."""
+        excluded = set(exclude)
+        picked: List[int] = []
+        for candidates in (self.top(restaurant_id, hour), self.top(restaurant_id)):
+            for item_id in candidates:
+                if item_id not in excluded and item_id not in picked:
+                    picked.append(item_id)
+                    if len(picked) == k:
+                        return picked
+        return picked
+
+    # --- Loading ---
+    async def backfill(self, db, now: datetime):
+        """
+        First start on an existing database: one grouped scan of the order
+        history into item_popularity. Concurrent workers insert the same
+        rows, so DO NOTHING keeps them from double counting.
+        """
+        quantity = func.coalesce(models.OrderItem.quantity, 1)
+        amount = quantity * self._decay(models.Order.created_at, literal(now))
+        hour = cast(extract("hour", models.Order.created_at), Integer)
+        history = (
+            select(models.Order.restaurant_id, models.OrderItem.menu_item_id, hour.label("hour"), func.sum(amount).label("score"))
+            .join(models.Order)
+            .filter(models.OrderItem.menu_item_id.isnot(None))
+            .filter(models.Order.created_at.isnot(None))
+            .filter(models.Order.status != models.OrderStatus.CANCELLED)
+            .group_by(models.Order.restaurant_id, models.OrderItem.menu_item_id, hour)
+        ).subquery()
+
+        rows = (await db.execute(select(history))).all()
+        totals: Dict[Tuple[int, int, int], float] = {}
+        for restaurant_id, menu_item_id, order_hour, score in rows:
+            for key in order_keys(restaurant_id, int(order_hour)):
+                totals[key + (menu_item_id,)] = totals.get(key + (menu_item_id,), 0.0) + float(score)
+        if totals:
+            await db.execute(
+                pg_insert(models.ItemPopularity)
+                .values([
+                    {"restaurant_id": scope, "hour": hour, "menu_item_id": item_id, "score": score, "updated_at": now}
+                    for (scope, hour, item_id), score in totals.items()
+                ])
+                .on_conflict_do_nothing()
+            )
+        await db.commit()
+        print(f"🔥 Popularity counters backfilled from {len(rows)} order groups")
+
+    async def build(self):
+        """Loads item_popularity, decayed to now in SQL (backfills an empty table first)."""
+        origin = time.time()
+        now = datetime.utcfromtimestamp(origin)
+        counter = models.ItemPopularity
+
+        async with database.SessionLocal() as db:
+            if (await db.execute(select(counter.menu_item_id).limit(1))).first() is None:
+                await self.backfill(db, now)
+            result = await db.execute(
+                select(
+                    counter.restaurant_id, counter.hour, counter.menu_item_id,
+                    counter.score * self._decay(counter.updated_at, literal(now)),
+                )
+            )
+            rows = result.all()
+
+        fresh = PopularityRanking(self.half_life_seconds / 86400, self.top_k)
+        fresh.origin = origin
+        for scope, hour, menu_item_id, score in rows:
+            fresh._add((scope, hour), menu_item_id, float(score))
+
+        # Swap in one go so lookups never see a half-built ranking
+        self.origin, self.scores, self._top = fresh.origin, fresh.scores, {}
+        self.ready = True
+        print(f"🔥 Popularity ranking built ({len(self.scores.get((GLOBAL, ALL_HOURS), {}))} items)")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.build()
+            except Exception as e:
+                print(f"⚠️ Popularity ranking build failed: {e}")
+            await asyncio.sleep(POPULARITY_REBUILD_SECONDS)
+
+
+# Global Instance
+popularity = PopularityRanking()
@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import models
+
+
+# --- PRICED CART ---
+@dataclass
+class PricedLine:
+    menu_item_id: int
+    quantity: int
+    unit_price: int
+    is_available: bool
+    restaurant_id: Optional[int] = None
+
+    @property
+    def line_total(self) -> int:
+        return self.unit_price * self.quantity
+
+
+@dataclass
+class PricedCart:
+    lines: List[PricedLine] = field(default_factory=list)
+    unknown_ids: List[int] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        # Only lines that can actually be served count towards the bill
+        return sum(line.line_total for line in self.lines if line.is_available)
+
+    @property
+    def unavailable_ids(self) -> List[int]:
+        return [line.menu_item_id for line in self.lines if not line.is_available]
+
+    @property
+    def available_lines(self) -> List[PricedLine]:
+        return [line for line in self.lines if line.is_available]
+
+    def problems(self, restaurant_id: int) -> List[str]:
+        """Reasons this cart can't be ordered from `restaurant_id` as-is (empty if fine)."""
+        problems = []
+        if self.unknown_ids:
+            problems.append(f"Unknown items: {self.unknown_ids}")
+        if self.unavailable_ids:
+            problems.append(f"Items no longer available: {self.unavailable_ids}")
+        bad_quantities = [l.menu_item_id for l in self.lines if l.quantity <= 0]
+        if bad_quantities:
+            problems.append(f"Invalid quantity for items: {bad_quantities}")
+        foreign = [l.menu_item_id for l in self.lines if l.restaurant_id != restaurant_id]
+        if foreign:
+            problems.append(f"Items from another restaurant: {foreign}")
+        if self.total <= 0:
+            problems.append("Order total cannot be zero")
+        return problems
+
+
+def _cart_pairs(items: Iterable) -> List[Tuple[int, int]]:
+    """
+    Accepts either pydantic OrderItemSchema objects (initiate) or the raw
+    dicts posted to /orders/verify and returns (menu_item_id, quantity) pairs.
+    """
+    pairs = []
+    for item in items:
+        if isinstance(item, dict):
+            pairs.append((int(item['menu_item_id']), int(item['quantity'])))
+        else:
+            pairs.append((int(item.menu_item_id), int(item.quantity)))
+    return pairs
+
+
+async def price_cart(db: AsyncSession, items: Iterable) -> PricedCart:
+    """
+    Resolves a whole cart with a single `IN (...)` query instead of one
+    SELECT per cart line.
+    """
+    pairs = _cart_pairs(items)
+    cart = PricedCart()
+    if not pairs:
+        return cart
+
+    wanted_ids = {menu_item_id for menu_item_id, _ in pairs}
+    result = await db.execute(
+        select(
+            models.MenuItem.id,
+            models.MenuItem.price,
+            models.MenuItem.is_available,
+            models.MenuItem.restaurant_id,
+        ).filter(models.MenuItem.id.in_(wanted_ids))
+    )
+    rows: Dict[int, tuple] = {row.id: row for row in result.all()}
+
+    for menu_item_id, quantity in pairs:
+        row = rows.get(menu_item_id)
+        if row is None:
+            if menu_item_id not in cart.unknown_ids:
+                cart.unknown_ids.append(menu_item_id)
+            continue
+        cart.lines.append(PricedLine(
+            menu_item_id=menu_item_id,
+            quantity=quantity,
+            unit_price=row.price,
+            is_available=bool(row.is_available) if row.is_available is not None else True,
+            restaurant_id=row.restaurant_id,
+        ))
+
+    return cart
@@ -0,0 +1,94 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+
+from . import models
+
+# --- CONFIGURATION ---
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# Build the principal straight from the token's user_id + role claims (no DB at all)
+TRUST_TOKEN_ROLE = os.getenv("TRUST_TOKEN_ROLE", "false").lower() in ("1", "true", "yes")
+
+
+# --- PRINCIPAL ---
+# What handlers actually use from `current_user`
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    role: models.UserRole
+    email: Optional[str] = None
+    phone_number: Optional[str] = None
+    is_active: bool = True
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(
+            id=user.id,
+            role=models.UserRole(user.role),
+            email=user.email,
+            phone_number=user.phone_number,
+            is_active=bool(user.is_active) if user.is_active is not None else True,
+        )
+
+
+# --- TTL + LRU CACHE ---
+class PrincipalCache:
+    """
+    Per-process cache of principals by user id. Invalidation is local:
+    the listeners below only see ORM flushes in *this* worker. Changes
+    made by another worker, or by Core / bulk UPDATEs that bypass the
+    ORM, show up once the entry expires, so a role change or a
+    deactivation can take up to PRINCIPAL_CACHE_TTL seconds (60 by
+    default) to apply everywhere. Lower the TTL if that is too long;
+    code that changes users with Core statements should call
+    `principal_cache.invalidate(user_id)` itself.
+    """
+
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        principal, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._entries[user_id]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return principal
+
+    def put(self, principal: Principal):
+        self._entries[principal.id] = (principal, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        if self._entries.pop(user_id, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Global Instance
+principal_cache = PrincipalCache()
+
+
+# Drop cached principals whenever a user row is updated or deleted through the ORM
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    principal_cache.invalidate(target.id)
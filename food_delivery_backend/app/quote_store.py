@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .pricing import PricedCart
+
+
+# --- CART QUOTE ---
+# A compact snapshot of what was priced in /orders/initiate.
+# lines = ((menu_item_id, quantity, unit_price), ...)
+@dataclass(frozen=True)
+class CartQuote:
+    customer_id: int
+    restaurant_id: int
+    lines: Tuple[Tuple[int, int, int], ...]
+    total: int
+    delivery_address: Optional[str] = None
+    delivery_latitude: Optional[float] = None
+    delivery_longitude: Optional[float] = None
+    created_at: float = 0.0
+
+    @classmethod
+    def from_cart(cls, cart: PricedCart, customer_id: int, order_data) -> "CartQuote":
+        return cls(
+            customer_id=customer_id,
+            restaurant_id=int(order_data.restaurant_id),
+            lines=tuple(
+                (line.menu_item_id, line.quantity, line.unit_price)
+                for line in cart.available_lines
+            ),
+            total=cart.total,
+            delivery_address=order_data.delivery_address,
+            delivery_latitude=order_data.delivery_latitude,
+            delivery_longitude=order_data.delivery_longitude,
+            created_at=time.monotonic(),
+        )
+
+
+# --- QUOTE STORE ---
+class QuoteStore:
+    """
+    Keeps quotes keyed by Razorpay order id between /orders/initiate and
+    /orders/verify. Entries expire after `ttl_seconds` and the oldest entry
+    is evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, ttl_seconds: float = 30 * 60, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._quotes: "OrderedDict[str, CartQuote]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._quotes)
+
+    def _is_expired(self, quote: CartQuote, now: float) -> bool:
+        return now - quote.created_at > self.ttl_seconds
+
+    def _evict(self, now: float):
+        # Insertion order == creation order, so expired quotes sit at the front
+        while self._quotes:
+            oldest_key, oldest = next(iter(self._quotes.items()))
+            if not self._is_expired(oldest, now):
+                break
+            del self._quotes[oldest_key]
+        while len(self._quotes) >= self.max_entries:
+            self._quotes.popitem(last=False)
+
+    def put(self, razorpay_order_id: str, quote: CartQuote):
+        self._evict(time.monotonic())
+        self._quotes.pop(razorpay_order_id, None)
+        self._quotes[razorpay_order_id] = quote
+
+    def get(self, razorpay_order_id: str) -> Optional[CartQuote]:
+        quote = self._quotes.get(razorpay_order_id)
+        if quote is None:
+            return None
+        if self._is_expired(quote, time.monotonic()):
+            del self._quotes[razorpay_order_id]
+            return None
+        return quote
+
+    def pop(self, razorpay_order_id: str) -> Optional[CartQuote]:
+        quote = self.get(razorpay_order_id)
+        if quote is not None:
+            del self._quotes[razorpay_order_id]
+        return quote
+
+
+# Global Instance
+quote_store = QuoteStore()
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import shutil
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlalchemy.future import select
+
+from . import database, models
+
+# --- CONFIGURATION ---
+RECOMMENDER_DIR = os.getenv("RECOMMENDER_DIR", "app/model_cache")
+# Re-fit the vocabulary/IDF once this share of items was added incrementally
+RECOMMENDER_REFIT_RATIO = float(os.getenv("RECOMMENDER_REFIT_RATIO", "0.2"))
+# How often to pick up items added through other workers
+RECOMMENDER_SYNC_SECONDS = float(os.getenv("RECOMMENDER_SYNC_SECONDS", "60"))
+
+# Each save writes a fresh snapshot directory of .npy arrays (memory-mapped
+# on load, no pickle) and then swaps this pointer file to name it, so a
+# reader can never pair pieces written by different workers / versions
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_ARRAYS = ("data", "indices", "indptr", "shape", "item_ids", "fitted_rows", "terms", "idf")
+# Older snapshots kept around for readers that already resolved the pointer
+KEEP_SNAPSHOTS = 2
+
+
+def item_text(name: Optional[str], description: Optional[str]) -> str:
+    return f"{name or ''} {description or ''}"
+
+
+class TfidfIndex:
+    """
+    TF-IDF vectors of every menu item, fitted once and kept in memory
+    (and on disk for fast restarts). New items are transformed with
+    the existing vocabulary and appended; a request only does a sparse
+    dot product plus an argpartition top-k.
+    """
+
+    def __init__(self, directory: str = RECOMMENDER_DIR):
+        self.directory = directory
+        self.vectorizer: Optional[TfidfVectorizer] = None
+        self.matrix: Optional[sp.csr_matrix] = None
+        self.item_ids = np.zeros(0, dtype=np.int64)
+        self.row_of: Dict[int, int] = {}
+        self.fitted_rows = 0
+        self.synced_up_to = 0  # highest MenuItem.id pulled from the DB by build/sync
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.matrix is not None and self.matrix.shape[0] > 0
+
+    def _set(self, vectorizer, matrix, item_ids, fitted_rows: int):
+        self.vectorizer = vectorizer
+        self.matrix = sp.csr_matrix(matrix)
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.row_of = {int(item_id): row for row, item_id in enumerate(self.item_ids)}
+        self.fitted_rows = fitted_rows
+
+    # --- Fitting & Persistence ---
+    # fit_matrix / read_files are pure (safe in a thread); _set always runs
+    # on the event loop so requests never see a half-swapped index.
+    @staticmethod
+    def fit_matrix(texts: List[str]):
+        vectorizer = TfidfVectorizer(stop_words='english')
+        try:
+            return vectorizer, vectorizer.fit_transform(texts)
+        except ValueError:
+            # Empty catalog / only stop words
+            return None, sp.csr_matrix((0, 0))
+
+    def fit(self, item_ids: List[int], texts: List[str]):
+        vectorizer, matrix = self.fit_matrix(texts)
+        self._set(vectorizer, matrix, item_ids if vectorizer else [], len(item_ids) if vectorizer else 0)
+
+    @staticmethod
+    def _vectorizer_from(terms: np.ndarray, idf: np.ndarray) -> TfidfVectorizer:
+        vectorizer = TfidfVectorizer(stop_words='english', vocabulary={str(t): i for i, t in enumerate(terms)})
+        vectorizer.idf_ = np.asarray(idf)
+        return vectorizer
+
+    def save(self):
+        if not self.ready:
+            return
+        # Take one consistent snapshot; _set may swap attributes meanwhile
+        vectorizer, matrix, item_ids, fitted_rows = self.vectorizer, self.matrix, self.item_ids, self.fitted_rows
+        arrays = {
+            "data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr,
+            "shape": np.array(matrix.shape, dtype=np.int64),
+            "item_ids": item_ids,
+            "fitted_rows": np.array([fitted_rows], dtype=np.int64),
+            "terms": vectorizer.get_feature_names_out().astype(str),
+            "idf": vectorizer.idf_,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"snapshot-{os.getpid()}-{uuid.uuid4().hex}"
+        snapshot_dir = os.path.join(self.directory, name)
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        temp_pointer = f"{pointer}.{name}.tmp"
+        try:
+            os.makedirs(snapshot_dir)
+            for key, array in arrays.items():
+                np.save(os.path.join(snapshot_dir, f"{key}.npy"), array, allow_pickle=False)
+            # Rename is atomic: readers see the old or the new snapshot, never half
+            with open(temp_pointer, "w") as f:
+                f.write(name)
+            os.replace(temp_pointer, pointer)
+        except BaseException:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            raise
+        finally:
+            if os.path.exists(temp_pointer):
+                os.remove(temp_pointer)
+        self._prune_snapshots(keep=name)
+
+    def _prune_snapshots(self, keep: str):
+        snapshots = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_dir() and entry.name.startswith("snapshot-")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in [e for e in snapshots if e.name != keep][KEEP_SNAPSHOTS - 1:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def read_files(self):
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                snapshot_dir = os.path.join(self.directory, f.read().strip())
+            # Memory-mapped: workers share the page cache instead of each holding a copy
+            arrays = {
+                key: np.load(os.path.join(snapshot_dir, f"{key}.npy"), mmap_mode="r", allow_pickle=False)
+                for key in SNAPSHOT_ARRAYS
+            }
+            matrix = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                   shape=tuple(int(n) for n in arrays["shape"]), copy=False)
+            vectorizer = self._vectorizer_from(arrays["terms"], arrays["idf"])
+        except FileNotFoundError:
+            return None  # Nothing saved yet
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read saved recommendation index: {e}")
+            return None
+        item_ids = arrays["item_ids"]
+        if matrix.shape[0] != len(item_ids) or matrix.shape[1] != len(arrays["terms"]):
+            print(f"⚠️ Saved recommendation index is inconsistent ({matrix.shape[0]} rows, {len(item_ids)} ids), refitting")
+            return None
+        return vectorizer, matrix, item_ids, int(arrays["fitted_rows"][0])
+
+    # --- Incremental Updates ---
+    def add_items(self, item_ids: List[int], texts: List[str]):
+        new = [(i, t) for i, t in zip(item_ids, texts) if i not in self.row_of]
+        if not new:
+            return
+        if self.vectorizer is None:
+            self.fit([i for i, _ in new], [t for _, t in new])
+            return
+        rows = self.vectorizer.transform([t for _, t in new])
+        self._set(
+            self.vectorizer,
+            sp.vstack([self.matrix, rows], format="csr"),
+            np.concatenate([self.item_ids, np.array([i for i, _ in new], dtype=np.int64)]),
+            self.fitted_rows,
+        )
+
+    def needs_refit(self) -> bool:
+        added = len(self.item_ids) - self.fitted_rows
+        return added > max(1, self.fitted_rows * RECOMMENDER_REFIT_RATIO)
+
+    # --- Queries ---
+    def scores_for(self, liked_ids: Iterable[int]) -> Optional[np.ndarray]:
+        """Summed cosine similarity of every item to the liked items (None if none are known)."""
+        rows = [self.row_of[i] for i in liked_ids if i in self.row_of]
+        if not rows or not self.ready:
+            return None
+        # Rows are L2-normalised, so a dot product is the cosine similarity
+        profile = self.matrix[rows].sum(axis=0).A1
+        return self.matrix @ profile
+
+    def top_k(self, scores: np.ndarray, k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """(item_id, score) pairs, best first."""
+        exclude_rows = [self.row_of[i] for i in exclude if i in self.row_of]
+        scores = scores.astype(np.float64, copy=True)
+        scores[exclude_rows] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.item_ids[row]), float(scores[row])) for row in top]
+
+    def recommend_scored(self, liked_ids: Iterable[int], k: int = 3, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        scores = self.scores_for(liked_ids)
+        if scores is None:
+            return []
+        return self.top_k(scores, k, exclude)
+
+    def recommend(self, liked_ids: Iterable[int], k: int = 3, exclude: Iterable[int] = ()) -> List[int]:
+        return [item_id for item_id, _ in self.recommend_scored(liked_ids, k, exclude)]
+
+    # --- Loading from the DB ---
+    async def _fetch_items(self, after_id: int = 0):
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                select(models.MenuItem.id, models.MenuItem.name, models.MenuItem.description)
+                .filter(models.MenuItem.id > after_id)
+                .order_by(models.MenuItem.id)
+            )
+            rows = result.all()
+        return [r.id for r in rows], [item_text(r.name, r.description) for r in rows]
+
+    async def _refit(self):
+        item_ids, texts = await self._fetch_items()
+        vectorizer, matrix = await asyncio.to_thread(self.fit_matrix, texts)
+        if vectorizer is None:
+            item_ids = []
+        self._set(vectorizer, matrix, item_ids, len(item_ids))
+        self.synced_up_to = max(item_ids, default=0)
+        await asyncio.to_thread(self.save)
+
+    async def build(self):
+        """Startup: load the saved index (or fit from scratch), then catch up."""
+        async with self._lock:
+            saved = await asyncio.to_thread(self.read_files)
+            if saved is None:
+                await self._refit()
+            else:
+                self._set(*saved)
+                self.synced_up_to = int(self.item_ids.max()) if len(self.item_ids) else 0
+        await self.sync()
+        print(f"🧠 Recommendation index ready ({len(self.item_ids)} items)")
+
+    async def sync(self):
+        """Appends items added since the last sync (including other workers' items)."""
+        async with self._lock:
+            item_ids, texts = await self._fetch_items(after_id=self.synced_up_to)
+            if not item_ids:
+                return
+            self.add_items(item_ids, texts)
+            self.synced_up_to = max(item_ids)
+
+            if self.needs_refit():
+                await self._refit()
+            else:
+                await asyncio.to_thread(self.save)
+
+    def add_menu_item(self, item: models.MenuItem):
+        """Called right after add_menu_item commits."""
+        self.add_items([item.id], [item_text(item.name, item.description)])
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.build()
+        except Exception as e:
+            print(f"⚠️ Recommendation index build failed: {e}")
+        while True:
+            await asyncio.sleep(RECOMMENDER_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"⚠️ Recommendation index sync failed: {e}")
+
+
+# Global Instance
+tfidf_index = TfidfIndex()
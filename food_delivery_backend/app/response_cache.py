@@ -0,0 +1,119 @@
+import gzip
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+# --- CONFIGURATION ---
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Bodies at least this big are also stored gzip-compressed
+RESPONSE_CACHE_GZIP_MIN = int(os.getenv("RESPONSE_CACHE_GZIP_MIN", "1024"))
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    gzipped: Optional[bytes] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    expires_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+    def to_response(self, request: Request) -> Response:
+        headers = dict(self.headers)
+        body = self.body
+        if self.gzipped is not None:
+            # Both representations vary, or a shared cache could hand gzip to a client that can't read it
+            headers["Vary"] = "Accept-Encoding"
+            if "gzip" in request.headers.get("accept-encoding", ""):
+                body = self.gzipped
+                headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU of pre-serialized (optionally pre-gzipped) JSON bodies
+    for the public catalog endpoints. Writers call `invalidate(prefix)`.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl_seconds: float = RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.current_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() > entry.expires_at:
+            if entry is not None:
+                self._drop(key)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        gzipped = gzip.compress(body, compresslevel=6) if len(body) >= RESPONSE_CACHE_GZIP_MIN else None
+        entry = CachedResponse(
+            body=body,
+            gzipped=gzipped,
+            headers=headers or {},
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        if entry.size > self.max_bytes:
+            return entry # Too big to keep, just serve it
+
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._drop(oldest_key)
+            self.stats["evictions"] += 1
+        return entry
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+    def invalidate(self, prefix: str):
+        """Drops every key starting with `prefix`."""
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            self._drop(key)
+            self.stats["invalidations"] += 1
+
+    def metrics(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "bytes": self.current_bytes}
+
+
+def serialize(adapter: TypeAdapter, objects) -> bytes:
+    """ORM objects -> response_model JSON bytes (validated once, dumped once)."""
+    return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+
+# Global Instance
+response_cache = ResponseCache()
+
+
+# --- INVALIDATION HOOKS ---
+def invalidate_menu(restaurant_id: int):
+    response_cache.invalidate(f"menu:{restaurant_id}|")
+
+
+def invalidate_restaurants():
+    response_cache.invalidate("restaurants|")
+    response_cache.invalidate("nearby|")
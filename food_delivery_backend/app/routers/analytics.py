@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, func, desc, extract
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from .. import database, models, auth
-import pandas as pd
+import numpy as np
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
@@ -10,7 +13,7 @@ router = APIRouter(prefix="/analytics", tags=["Analytics"])
 @router.get("/dashboard")
 async def get_dashboard_stats(
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     if current_user.role != models.UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Unauthorized")
@@ -57,40 +60,85 @@ async def get_dashboard_stats(
 
 
 # ✅ 2. EXISTING ENDPOINT: Peak Hours (Chart)
+def _utc_bounds(start: Optional[date], end: Optional[date], tz: ZoneInfo):
+    # Local calendar days -> naive UTC datetimes (Order.created_at is utcnow), end inclusive
+    def to_utc(day: date) -> datetime:
+        return datetime.combine(day, time.min, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+    return (to_utc(start) if start else None), (to_utc(end + timedelta(days=1)) if end else None)
+
+
+def hour_buckets(epoch_seconds: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """Order counts per local hour (24 buckets) for the in-memory path."""
+    if not len(epoch_seconds):
+        return np.zeros(24, dtype=np.int64)
+    # UTC offsets only change on DST switches: look them up once per distinct UTC hour
+    utc_hours, inverse = np.unique(epoch_seconds // 3600, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds() for h in utc_hours
+    ], dtype=np.int64)
+    local_hours = ((epoch_seconds + offsets[inverse]) // 3600) % 24
+    return np.bincount(local_hours.astype(np.int64), minlength=24)
+
+
+# mode="sql" groups in Postgres and only 24 rows come back;
+# mode="memory" fetches two columns and buckets them with NumPy.
 @router.get("/peak-hours")
 async def get_peak_hours(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    tz: str = "UTC",
+    mode: str = Query("sql", pattern="^(sql|memory)$"),
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     if current_user.role != models.UserRole.OWNER:
         raise HTTPException(status_code=403, detail="Unauthorized")
 
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+
     res_query = await db.execute(select(models.Restaurant).filter(models.Restaurant.owner_id == current_user.id))
     restaurant = res_query.scalars().first()
     
     if not restaurant:
          return {"message": "No restaurant found", "total_revenue": 0, "peak_hours": {}}
 
-    # Get all orders
-    orders_query = await db.execute(select(models.Order).filter(models.Order.restaurant_id == restaurant.id))
-    orders = orders_query.scalars().all()
-
-    if not orders:
-        return {"restaurant": restaurant.name, "total_revenue": 0, "peak_hours": {}}
-
-    # Pandas Analysis
-    data = [{"created_at": o.created_at, "total": o.total_amount} for o in orders]
-    df = pd.DataFrame(data)
-
-    df['created_at'] = pd.to_datetime(df['created_at'])
-    df['hour'] = df['created_at'].dt.hour
-
-    raw_peak_times = df.groupby('hour').size().to_dict()
-    peak_times = {int(k): int(v) for k, v in raw_peak_times.items()}
-    total_revenue = float(df['total'].sum())
+    # Range filter stays on the raw column so (restaurant_id, created_at) is indexable
+    filters = [models.Order.restaurant_id == restaurant.id]
+    start_utc, end_utc = _utc_bounds(start, end, zone)
+    if start_utc:
+        filters.append(models.Order.created_at >= start_utc)
+    if end_utc:
+        filters.append(models.Order.created_at < end_utc)
+
+    counts = np.zeros(24, dtype=np.int64)
+    if mode == "sql":
+        local_time = func.timezone(tz, func.timezone("UTC", models.Order.created_at))
+        # Grouped by label: the bound tz parameter would make a repeated expression "different"
+        hour = extract("hour", local_time).label("hour")
+        buckets = await db.execute(
+            select(hour, func.count(models.Order.id)).filter(*filters).group_by("hour")
+        )
+        for order_hour, count in buckets.all():
+            counts[int(order_hour)] = count
+
+        revenue_query = await db.execute(select(func.sum(models.Order.total_amount)).filter(*filters))
+        total_revenue = float(revenue_query.scalar() or 0)
+    else:
+        rows = await db.execute(
+            select(extract("epoch", models.Order.created_at), models.Order.total_amount).filter(*filters)
+        )
+        rows = rows.all()
+        epochs = np.fromiter((r[0] for r in rows), dtype=np.float64, count=len(rows)).astype(np.int64)
+        totals = np.fromiter((r[1] or 0 for r in rows), dtype=np.float64, count=len(rows))
+        counts = hour_buckets(epochs, zone)
+        total_revenue = float(totals.sum())
 
     return {
         "restaurant": restaurant.name,
+        "timezone": tz,
         "total_revenue": total_revenue, 
-        "peak_hours": peak_times        
-    }
\ No newline at end of file
+        "peak_hours": {hour: int(count) for hour, count in enumerate(counts)}
+    }
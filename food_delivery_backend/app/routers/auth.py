@@ -18,10 +18,19 @@ async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Asy
     if not user:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
 
-    # 3. Check password
-    if not utils.verify(user_credentials.password, user.hashed_password):
+    # 3. Check password (bcrypt runs off the event loop)
+    is_valid, new_hash = await utils.verify_and_update_async(user_credentials.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
 
+    if user.is_active is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+
+    # Cost factor changed since this hash was made -> store the upgraded hash
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     # 4. Generate Token (Includes Role)
     # This ensures the token is signed with the SAME key that orders.py uses to verify it!
     access_token = auth.create_access_token(data={"user_id": str(user.id), "role": user.role})
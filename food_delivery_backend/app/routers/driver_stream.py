@@ -0,0 +1,128 @@
+import json
+import math
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
+from .. import database, models
+from app import auth
+from app.location_buffer import location_buffer
+from app.location_history import location_history
+
+router = APIRouter(
+    tags=["Tracking"]
+)
+
+# Binary frame: one or more packed records of (order_id: uint32, lat: float64, lng: float64)
+BINARY_RECORD = struct.Struct("<Idd")
+
+# A parsed frame: (order_id, lat, lng, distance_text, time_text)
+LocationFrame = Tuple[int, float, float, Optional[str], Optional[str]]
+
+
+def check_point(order_id: int, lat: float, lng: float) -> Tuple[int, float, float]:
+    if not (math.isfinite(lat) and math.isfinite(lng)) or abs(lat) > 90 or abs(lng) > 180:
+        raise ValueError(f"Invalid coordinates for order {order_id}")
+    return order_id, lat, lng
+
+
+def parse_json_frame(text: str) -> List[LocationFrame]:
+    """
+    Accepts [order_id, lat, lng], [order_id, lat, lng, distance, time]
+    or a list of those for batched points. Anything else is a ValueError.
+    """
+    data = json.loads(text)
+    if not isinstance(data, list):
+        raise ValueError("Frame must be a JSON array")
+    if data and not isinstance(data[0], list):
+        data = [data]
+    frames = []
+    for row in data:
+        if not isinstance(row, list) or not 3 <= len(row) <= 5:
+            raise ValueError("Each point must be [order_id, lat, lng, distance?, time?]")
+        distance = row[3] if len(row) > 3 else None
+        time_text = row[4] if len(row) > 4 else None
+        if not all(text is None or isinstance(text, str) for text in (distance, time_text)):
+            raise ValueError("distance / time must be strings")
+        order_id, lat, lng = check_point(int(row[0]), float(row[1]), float(row[2]))
+        frames.append((order_id, lat, lng, distance, time_text))
+    return frames
+
+
+def parse_binary_frame(payload: bytes) -> List[LocationFrame]:
+    if len(payload) % BINARY_RECORD.size:
+        raise ValueError(f"Binary frame must be a multiple of {BINARY_RECORD.size} bytes")
+    return [
+        (*check_point(order_id, lat, lng), None, None)
+        for order_id, lat, lng in BINARY_RECORD.iter_unpack(payload)
+    ]
+
+
+# -----------------------------------------------------------------------------
+# DRIVER: STREAM LOCATION 🚀
+# URL: ws://127.0.0.1:8000/ws/driver?token=<jwt>
+# Authenticates once at connect time, then every frame goes straight into
+# the same tracking pipeline as POST /orders/{order_id}/driver-location.
+# Like that endpoint, each order must belong to the owner's restaurant or
+# be claimed by this driver; checked on its first frame, then cached.
+# Free-text driver messages (and their SMS) still go through the HTTP endpoint.
+# -----------------------------------------------------------------------------
+@router.websocket("/ws/driver")
+async def driver_location_stream(websocket: WebSocket, token: str = ""):
+    async with database.SessionLocal() as db:
+        user = await auth.get_user_from_token(token, db)
+
+    if user is None or user.role not in (models.UserRole.DRIVER, models.UserRole.OWNER):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    principal = auth.Principal.from_user(user)
+    driver_topic = f"driver:{user.id}"
+    # Last ETA text per order, so compact frames don't blank it out
+    last_text: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+    # order_id -> may this user share its location (checked once per connection)
+    allowed: Dict[int, bool] = {}
+
+    async def may_share(order_id: int) -> bool:
+        if order_id not in allowed:
+            async with database.SessionLocal() as db:
+                allowed[order_id] = await auth.claim_delivery(principal, order_id, db)
+        return allowed[order_id]
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                if message.get("bytes") is not None:
+                    frames = parse_binary_frame(message["bytes"])
+                else:
+                    frames = parse_json_frame(message.get("text") or "[]")
+            except (ValueError, TypeError, IndexError, struct.error) as e:
+                await websocket.send_json({"event": "INVALID_FRAME", "detail": str(e)})
+                continue
+
+            for order_id, lat, lng, distance, time_text in frames:
+                if not await may_share(order_id):
+                    await websocket.send_json({"event": "FORBIDDEN", "order_id": order_id})
+                    continue
+                prev_distance, prev_time = last_text.get(order_id, (None, None))
+                distance = distance if distance is not None else prev_distance
+                time_text = time_text if time_text is not None else prev_time
+                last_text[order_id] = (distance, time_text)
+
+                await location_buffer.push(order_id, (f"order:{order_id}", driver_topic), {
+                    "event": "DRIVER_UPDATE",
+                    "order_id": order_id,
+                    "lat": lat,
+                    "lng": lng,
+                    "distance": distance,
+                    "time": time_text,
+                    "message": None
+                })
+                location_history.append(order_id, user.id, lat, lng)
+    except WebSocketDisconnect:
+        pass
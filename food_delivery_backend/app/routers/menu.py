@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
-import shutil
-import os
-import uuid
+from typing import List, Optional
 
 # Internal Imports
-from .. import models, schemas, database, auth
+from .. import models, schemas, database, auth, catalog
+from ..response_cache import response_cache, invalidate_menu, serialize
+from ..uploads import save_upload
+from ..recommender import tfidf_index
+from pydantic import TypeAdapter
 
 router = APIRouter(
     prefix="/menu",
     tags=["Menu"]
 )
 
+menu_adapter = TypeAdapter(List[schemas.MenuItemOut])
+
 # -----------------------------------------------------------------------------
 # 1. ADD MENU ITEM (Owner Only + Image Upload 📸)
 # -----------------------------------------------------------------------------
@@ -24,7 +27,7 @@ async def add_menu_item(
     description: str = Form(...),
     category: str = Form("Fast Food"), # Default value
     image: UploadFile = File(...),     # 👈 Handles the Image File
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     # 1. Check Permissions
@@ -40,22 +43,14 @@ async def add_menu_item(
         raise HTTPException(status_code=404, detail="You must create a restaurant first")
 
     # 3. SAVE IMAGE TO DISK 💾
-    # Create unique filename to avoid overwriting (e.g., "burger_uuid123.jpg")
-    file_extension = image.filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_location = f"app/uploads/{unique_filename}"
-    
-    # Ensure directory exists
-    if not os.path.exists("app/uploads"):
-        os.makedirs("app/uploads")
-
-    # Write file
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+    # Size-checked before the body is read, stored once per content hash,
+    # plus thumb & medium variants resized in a worker process
+    files = await save_upload(image)
 
-    # 4. Generate Public URL
-    # This URL is what you save in the database
-    image_url = f"http://127.0.0.1:8000/static/{unique_filename}"
+    # 4. Generate Public URLs
+    # Menu pages load the medium variant, small cards the thumbnail, never the full-size photo
+    image_url = f"http://127.0.0.1:8000/static/{files['medium']}"
+    thumbnail_url = f"http://127.0.0.1:8000/static/{files['thumb']}"
 
     # 5. Save to Database
     new_item = models.MenuItem(
@@ -65,21 +60,66 @@ async def add_menu_item(
         price=price,
         category=category,
         image_url=image_url, # 👈 Saving the link
+        thumbnail_url=thumbnail_url,
         is_available=True
     )
 
     db.add(new_item)
+    await catalog.bump_version(db, catalog.menu_key(restaurant.id))
     await db.commit()
     await db.refresh(new_item)
+    invalidate_menu(restaurant.id)
+    try:
+        tfidf_index.add_menu_item(new_item) # Incremental, no re-fit
+    except Exception as e:
+        # The item is saved; the periodic sync will pick it up
+        print(f"⚠️ Recommendation index update failed: {e}")
     
     return {"status": "success", "item": new_item}
 
 
 # -----------------------------------------------------------------------------
-# 2. GET MENU (Public)
+# 2. GET MENU (Public, Paginated + ETag)
 # -----------------------------------------------------------------------------
 @router.get("/{restaurant_id}", response_model=List[schemas.MenuItemOut])
-async def get_menu(restaurant_id: int, db: AsyncSession = Depends(database.get_db)):
-    result = await db.execute(select(models.MenuItem).filter(models.MenuItem.restaurant_id == restaurant_id))
+async def get_menu(
+    restaurant_id: int,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_db)
+):
+    # Unchanged menu -> 304 Not Modified, no item query at all
+    key = catalog.menu_key(restaurant_id)
+    limit = catalog.page_limit(limit, cursor)
+    version = await catalog.get_version(db, key)
+    etag = catalog.make_etag(key, version, cursor, limit or "all")
+    cached = catalog.not_modified(request, etag)
+    if cached:
+        return cached
+
+    # Same version already serialized on this worker -> serve the bytes
+    cache_key = f"{key}|{version}|{cursor}|{limit}"
+    hit = response_cache.get(cache_key)
+    if hit:
+        return hit.to_response(request)
+
+    query = (
+        select(models.MenuItem)
+        .filter(models.MenuItem.restaurant_id == restaurant_id)
+        .order_by(models.MenuItem.id)
+    )
+    if limit is not None:
+        query = query.limit(limit + 1)
+    if cursor is not None:
+        query = query.filter(models.MenuItem.id > cursor)
+    result = await db.execute(query)
     items = result.scalars().all()
-    return items
\ No newline at end of file
+
+    headers = catalog.cache_headers(etag)
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        headers["X-Next-Cursor"] = str(items[-1].id)
+
+    entry = response_cache.put(cache_key, serialize(menu_adapter, items), headers)
+    return entry.to_response(request)
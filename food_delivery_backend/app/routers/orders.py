@@ -1,27 +1,29 @@
-
 import random
-import razorpay
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
+from sqlalchemy import DateTime, Float, column, func, union_all, values
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from typing import List, Optional, Tuple
+from geoalchemy2 import Geometry
+from datetime import datetime
 from pydantic import BaseModel  # 👈 Added for Driver Update
 
 # Internal Imports
 from .. import models, schemas, database
 from app import auth  
-from app.socket_manager import manager
-from app.utils import send_sms  
-
-# --- CONFIGURATION ---
-RAZORPAY_KEY_ID = "use_your_razorpay_key_id"
-RAZORPAY_KEY_SECRET = "your_razorpay_key_secret"
-
-client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+from app.broker import broker
+from app.notifications import notifier
+from app.location_buffer import location_buffer
+from app.location_history import location_history
+from app.cooccurrence import cooccurrence
+from app.user_recommendations import user_recommendations
+from app.popularity import popularity
+from app.pricing import price_cart
+from app.quote_store import CartQuote, quote_store
+from app.payments import PaymentError, gateway, order_matches
 
 router = APIRouter(
     prefix="/orders",
@@ -42,87 +44,173 @@ class DriverUpdate(BaseModel):
 @router.post("/initiate")
 async def initiate_payment(
     order_data: schemas.OrderCreate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
-    # Calculate Total Amount
-    total_amount = 0
-    for item in order_data.items:
-        result = await db.execute(select(models.MenuItem).filter(models.MenuItem.id == item.menu_item_id))
-        menu_item = result.scalars().first()
-        if menu_item:
-            total_amount += menu_item.price * item.quantity
-
-    if total_amount == 0:
-        raise HTTPException(status_code=400, detail="Order total cannot be zero")
-
-    # Create Razorpay Order ID
-    data = { "amount": int(total_amount * 100), "currency": "INR", "receipt": "order_receipt" }
+    # Calculate Total Amount (one query for the whole cart)
+    cart = await price_cart(db, order_data.items)
+    problems = cart.problems(order_data.restaurant_id)
+    if problems:
+        raise HTTPException(status_code=400, detail="; ".join(problems))
+
+    total_amount = cart.total
+
+    # Create Razorpay Order ID (customer in the notes, so /verify can check who it was for)
     try:
-        payment = client.order.create(data=data)
+        payment = await gateway.create_order(
+            amount=int(total_amount * 100),
+            currency="INR",
+            receipt="order_receipt",
+            notes={"customer_id": str(current_user.id)},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Razorpay Error: {str(e)}")
+
+    # Remember exactly what was priced, so /verify doesn't re-query the menu
+    quote_store.put(payment['id'], CartQuote.from_cart(cart, current_user.id, order_data))
     
     return {
         "order_id": payment['id'], 
         "amount": payment['amount'], 
         "currency": "INR",
-        "key_id": RAZORPAY_KEY_ID
+        "key_id": gateway.key_id
     }
 
 # -----------------------------------------------------------------------------
 # 2. VERIFY & SAVE
 # -----------------------------------------------------------------------------
+async def _refund_rejected(db: AsyncSession, payment_id: str, amount: int, customer_id: int, reason: str):
+    """
+    The payment is captured but can't become an order. Claim the payment id
+    first with a hidden CANCELLED order (so it can't be verified again, and a
+    concurrent request that already saved it keeps it), then refund it.
+    """
+    db.add(models.Order(
+        customer_id=customer_id,
+        status=models.OrderStatus.CANCELLED,
+        stripe_payment_id=payment_id,
+        total_amount=amount // 100,
+        visible_to_customer=False,
+        visible_to_owner=False
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Payment already used")
+
+    print(f"❌ Payment {payment_id} rejected ({reason}). Refund Initiated...")
+    try:
+        await gateway.refund(payment_id, amount)
+        print("↩️ Refund Successful")
+    except Exception as e:
+        print(f"CRITICAL: Manual Refund Required for {payment_id}: {e}")
+    raise HTTPException(status_code=400, detail=f"{reason}. Payment refunded.")
+
+
+async def _requote(db: AsyncSession, razorpay_order_id: str, payment_id: str, order_data: dict,
+                   customer_id: int) -> CartQuote:
+    """
+    No stored quote (expired, restarted, other worker): re-price the posted
+    cart and only accept it if the gateway order was created for this
+    customer and for exactly that amount. The payment is already captured,
+    so anything else refunds it.
+    """
+    try:
+        gateway_order = await gateway.fetch_order(razorpay_order_id)
+    except PaymentError as e:
+        raise HTTPException(status_code=502, detail=f"Razorpay Error: {str(e)}")
+
+    # Someone else's payment: not ours to refund
+    notes = gateway_order.get("notes") or {}
+    if str(notes.get("customer_id")) != str(customer_id):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    paid = int(gateway_order.get("amount") or 0)
+
+    try:
+        restaurant_id = int(order_data['restaurant_id'])
+        cart = await price_cart(db, order_data['items'])
+    except (KeyError, TypeError, ValueError):
+        await _refund_rejected(db, payment_id, paid, customer_id, "Order details missing")
+
+    problems = cart.problems(restaurant_id)
+    if problems:
+        await _refund_rejected(db, payment_id, paid, customer_id, "; ".join(problems))
+
+    if not order_matches(gateway_order, int(cart.total * 100), customer_id):
+        await _refund_rejected(db, payment_id, paid, customer_id, "Cart total changed since payment")
+
+    return CartQuote(
+        customer_id=customer_id,
+        restaurant_id=restaurant_id,
+        lines=tuple((l.menu_item_id, l.quantity, l.unit_price) for l in cart.available_lines),
+        total=cart.total,
+        delivery_address=order_data.get('delivery_address'),
+        delivery_latitude=order_data.get('delivery_latitude'),
+        delivery_longitude=order_data.get('delivery_longitude'),
+    )
+
+
 @router.post("/verify")
 async def verify_payment(
     payload: dict, 
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     payment_data = payload['payment']
-    order_data = payload['order']
+    order_data = payload.get('order') or {}
+    razorpay_order_id = payment_data['razorpay_order_id']
+    payment_id = payment_data['razorpay_payment_id']
 
+    # A. Verify Signature (local HMAC, no network). Nothing to refund if it's forged.
     try:
-        # A. Verify Signature
-        client.utility.verify_payment_signature({
-            'razorpay_order_id': payment_data['razorpay_order_id'],
-            'razorpay_payment_id': payment_data['razorpay_payment_id'],
-            'razorpay_signature': payment_data['razorpay_signature']
-        })
-        print("✅ Signature Verified!")
-
-        # B. Calculate Total & Prepare Items
-        total_amount = 0
-        order_items_objects = []
-        
-        for item in order_data['items']:
-            result = await db.execute(select(models.MenuItem).filter(models.MenuItem.id == item['menu_item_id']))
-            menu_item = result.scalars().first()
-            if menu_item:
-                total_amount += menu_item.price * item['quantity']
-                new_order_item = models.OrderItem(
-                    menu_item_id=menu_item.id,
-                    quantity=item['quantity'],
-                    price_at_time_of_order=menu_item.price
-                )
-                order_items_objects.append(new_order_item)
-
-        # C. HANDLE LOCATION
-        lat = order_data.get('delivery_latitude')
-        lon = order_data.get('delivery_longitude')
-        address = order_data.get('delivery_address')
+        gateway.verify_signature(razorpay_order_id, payment_id, payment_data['razorpay_signature'])
+    except PaymentError:
+        raise HTTPException(status_code=400, detail="Invalid payment signature")
+    print("✅ Signature Verified!")
+
+    # B. One order per payment: replays / double submits are refused (and never refunded)
+    used = await db.execute(select(models.Order.id).filter(models.Order.stripe_payment_id == payment_id))
+    if used.scalars().first() is not None:
+        raise HTTPException(status_code=409, detail="Payment already used")
+
+    # C. Use the quoted items & prices, or a re-priced cart checked against the gateway
+    quote = quote_store.get(razorpay_order_id)
+    if quote is None:
+        print(f"⚠️ No quote for {razorpay_order_id}, re-pricing cart and checking the gateway amount")
+        quote = await _requote(db, razorpay_order_id, payment_id, order_data, current_user.id)
+    elif quote.customer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    line_items = quote.lines
+    total_amount = quote.total
+    restaurant_id = quote.restaurant_id
+    lat = quote.delivery_latitude
+    lon = quote.delivery_longitude
+    address = quote.delivery_address
 
+    try:
+        order_items_objects = [
+            models.OrderItem(
+                menu_item_id=menu_item_id,
+                quantity=quantity,
+                price_at_time_of_order=unit_price
+            )
+            for menu_item_id, quantity, unit_price in line_items
+        ]
+
+        # D. HANDLE LOCATION
         delivery_geom = None
         if lat and lon:
             delivery_geom = f"POINT({lon} {lat})"
 
-        # D. Create Order Object
+        # E. Create Order Object
         new_order = models.Order(
             customer_id=current_user.id,
-            restaurant_id=int(order_data['restaurant_id']),
+            restaurant_id=restaurant_id,
             total_amount=total_amount,
             status=models.OrderStatus.PENDING,
-            stripe_payment_id=payment_data['razorpay_payment_id'],
+            stripe_payment_id=payment_id,
             
             delivery_address=address,
             delivery_location=delivery_geom,
@@ -141,23 +229,41 @@ async def verify_payment(
             obj.order_id = new_order.id
             db.add(obj)
 
-        await db.commit()
-        await db.refresh(new_order)
-        return {"status": "success", "order_id": new_order.id}
+        # Decayed popularity counters move with the order (same transaction)
+        await popularity.record_order(
+            db, restaurant_id, [(menu_item_id, quantity) for menu_item_id, quantity, _ in line_items], new_order.created_at
+        )
+
+        await db.commit() # Nothing after this may trigger the refund below
+
+    except IntegrityError:
+        # Lost a race with a concurrent request for the same payment: that one owns it
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Payment already used")
 
     except Exception as e:
         print(f"❌ DB Save Failed: {e}. Refund Initiated...")
         await db.rollback()
         try:
-            client.payment.refund(payment_data['razorpay_payment_id'], {
-                "amount": int(total_amount * 100)
-            })
+            await gateway.refund(payment_id, int(total_amount * 100))
             print("↩️ Refund Successful")
         except:
             print("CRITICAL: Manual Refund Required")
 
         raise HTTPException(status_code=500, detail="Order Failed. Refund Initiated.")
 
+    # F. Post-commit hooks: the order is saved, so a failure here must never refund it
+    quote_store.pop(razorpay_order_id)
+    try:
+        cooccurrence.add_order(menu_item_id for menu_item_id, _, _ in line_items)
+        popularity.add_order(restaurant_id, [(menu_item_id, quantity) for menu_item_id, quantity, _ in line_items], new_order.created_at)
+        user_recommendations.schedule_refresh(current_user.id)
+    except Exception as e:
+        print(f"⚠️ Recommendation update failed for order {new_order.id}: {e}")
+
+    return {"status": "success", "order_id": new_order.id}
+
+
 # -----------------------------------------------------------------------------
 # 3. OWNER: UPDATE STATUS
 # -----------------------------------------------------------------------------
@@ -165,7 +271,7 @@ async def verify_payment(
 async def update_order_status(
     order_id: int,
     status_update: schemas.OrderStatusUpdate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     result = await db.execute(
@@ -190,8 +296,13 @@ async def update_order_status(
         await db.commit()
         await db.refresh(order)
 
-        # Broadcast
-        await manager.broadcast({"status": str(order.status.value)})
+        # Publish to the people watching this order / restaurant only
+        await broker.publish(
+            [f"order:{order.id}", f"restaurant:{order.restaurant_id}"],
+            {"event": "STATUS_UPDATE", "order_id": order.id, "status": str(order.status.value)}
+        )
+        if new_status in (models.OrderStatus.DELIVERED, models.OrderStatus.CANCELLED):
+            location_buffer.forget(order.id)
 
         # SMS Notification
         customer_phone = order.customer.phone_number 
@@ -207,7 +318,7 @@ async def update_order_status(
                 msg = f"😋 Delivered! Enjoy your meal from {restaurant_name}."
 
             if msg:
-                send_sms(customer_phone, msg)
+                notifier.enqueue_sms(customer_phone, msg)
 
         return order
     
@@ -219,7 +330,7 @@ async def update_order_status(
 # -----------------------------------------------------------------------------
 @router.get("/owner/orders", response_model=List[schemas.OrderOut])
 async def get_owner_orders(
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     if current_user.role != "OWNER":
@@ -246,66 +357,63 @@ async def get_owner_orders(
 # -----------------------------------------------------------------------------
 # 5. AI RECOMMENDATIONS
 # -----------------------------------------------------------------------------
+async def _popular_items(db: AsyncSession, restaurant_id: Optional[int]):
+    # Cold start: maintained popularity ranking for this hour of the day
+    popular_ids = popularity.recommend(k=10, restaurant_id=restaurant_id, hour=datetime.utcnow().hour)
+    if popular_ids:
+        result = await db.execute(
+            select(models.MenuItem)
+            .filter(models.MenuItem.id.in_(popular_ids))
+            .filter(models.MenuItem.is_available == True)
+        )
+        items_by_id = {item.id: item for item in result.scalars().all()}
+        items = [items_by_id[i] for i in popular_ids if i in items_by_id][:3]
+        if items:
+            return items
+
+    # No orders at all yet
+    result = await db.execute(select(models.MenuItem).limit(3))
+    return result.scalars().all()
+
+
 @router.get("/recommend", response_model=List[schemas.MenuItemOut])
 async def get_recommendations(
+    restaurant_id: Optional[int] = None,
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
-    result = await db.execute(select(models.OrderItem).join(models.Order).filter(models.Order.customer_id == current_user.id))
-    past_orders = result.scalars().all()
+    # Precomputed by the batch job / refreshed after each order: one PK lookup
+    recommended_ids = await user_recommendations.get(db, current_user.id)
 
-    if not past_orders:
-        popular = await db.execute(select(models.MenuItem).limit(3))
-        return popular.scalars().all()
+    if recommended_ids is None:
+        result = await db.execute(
+            select(models.OrderItem.menu_item_id)
+            .join(models.Order)
+            .filter(models.Order.customer_id == current_user.id)
+            .distinct()
+        )
+        eaten_ids = {menu_item_id for menu_item_id in result.scalars().all() if menu_item_id}
 
-    all_menu_res = await db.execute(select(models.MenuItem))
-    all_menu = all_menu_res.scalars().all()
+        if not eaten_ids:
+            return await _popular_items(db, restaurant_id)
 
-    data = []
-    for item in all_menu:
-        content = f"{item.name} {item.description}" 
-        data.append({"id": item.id, "content": content, "obj": item})
-    
-    if not data: return [] 
+        # Not computed yet: blend in memory now and store it for next time
+        recommended_ids = user_recommendations.live(eaten_ids, k=3)
+        user_recommendations.schedule_refresh(current_user.id)
 
-    df = pd.DataFrame(data)
-    tfidf = TfidfVectorizer(stop_words='english')
-    try:
-        tfidf_matrix = tfidf.fit_transform(df['content'])
-    except ValueError:
-        return all_menu[:3] 
-
-    liked_indices = []
-    eaten_ids = set()
-    for past_item in past_orders:
-        if past_item.menu_item_id: 
-            eaten_ids.add(past_item.menu_item_id)
-            idx = df.index[df['id'] == past_item.menu_item_id].tolist()
-            if idx: liked_indices.append(idx[0])
-
-    if not liked_indices: return all_menu[:3]
-
-    cosine_sim = linear_kernel(tfidf_matrix[liked_indices], tfidf_matrix)
-    sim_scores = cosine_sim.sum(axis=0)
-    sorted_indices = sim_scores.argsort()[::-1]
-
-    recommendations = []
-    count = 0
-    for idx in sorted_indices:
-        item_id = df.iloc[idx]['id']
-        if item_id not in eaten_ids:
-            recommendations.append(df.iloc[idx]['obj'])
-            count += 1
-        if count >= 3: break
-            
-    return recommendations
+    if not recommended_ids:
+        return await _popular_items(db, restaurant_id)
+
+    items_res = await db.execute(select(models.MenuItem).filter(models.MenuItem.id.in_(recommended_ids)))
+    items_by_id = {item.id: item for item in items_res.scalars().all()}
+    return [items_by_id[i] for i in recommended_ids if i in items_by_id][:3]
 
 # -----------------------------------------------------------------------------
 # 6. CUSTOMER: GET LATEST ORDER
 # -----------------------------------------------------------------------------
 @router.get("/my-latest", response_model=schemas.OrderOut)
 async def get_my_latest_order(
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     result = await db.execute(
@@ -327,7 +435,7 @@ async def get_my_latest_order(
 # -----------------------------------------------------------------------------
 @router.get("/my-orders", response_model=List[schemas.OrderOut])
 async def get_my_orders(
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     result = await db.execute(
@@ -347,7 +455,7 @@ async def get_my_orders(
 async def generate_delivery_otp(
     order_id: int,
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     result = await db.execute(
         select(models.Order)
@@ -366,8 +474,8 @@ async def generate_delivery_otp(
     customer_phone = order.customer.phone_number
     
     if customer_phone:
-        print(f"📤 Sending Real SMS to {customer_phone}...")
-        send_sms(customer_phone, f"Your Food Delivery OTP is: {otp_code}")
+        print(f"📤 Queueing SMS to {customer_phone}...")
+        notifier.enqueue_sms(customer_phone, f"Your Food Delivery OTP is: {otp_code}")
     else:
         print("⚠️ Error: Customer has no phone number in DB")
 
@@ -381,7 +489,7 @@ async def complete_delivery_with_otp(
     order_id: int,
     otp_payload: dict,
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     result = await db.execute(select(models.Order).filter(models.Order.id == order_id))
     order = result.scalars().first()
@@ -398,7 +506,11 @@ async def complete_delivery_with_otp(
     await db.commit()
     await db.refresh(order)
 
-    await manager.broadcast({"status": "DELIVERED"})
+    await broker.publish(
+        [f"order:{order.id}", f"restaurant:{order.restaurant_id}"],
+        {"event": "STATUS_UPDATE", "order_id": order.id, "status": "DELIVERED"}
+    )
+    location_buffer.forget(order.id)
 
     return {"status": "success", "message": "Order Delivered Successfully!"}
 
@@ -412,13 +524,16 @@ async def update_driver_location(
     update: DriverUpdate,
     db: AsyncSession = Depends(database.get_db),
     # 👇 ADDED SECURITY: Must be logged in
-    current_user: models.User = Depends(auth.get_current_user) 
+    current_user: auth.Principal = Depends(auth.get_current_user) 
 ):
     # 👇 ADDED SECURITY: Check Role
     if current_user.role != "DRIVER" and current_user.role != "OWNER":
         raise HTTPException(status_code=403, detail="Not authorized to share location")
+    # Only the restaurant's owner or the order's driver (first driver to share claims it)
+    if not await auth.claim_delivery(current_user, order_id, db):
+        raise HTTPException(status_code=403, detail="Not authorized to share location for this order")
 
-    # 1. BROADCAST TO WEB PAGE (Live Map & Text)
+    # 1. PUBLISH TO WEB PAGE (Live Map & Text) - coalesced & sent on the next tick
     tracking_data = {
         "event": "DRIVER_UPDATE",
         "order_id": order_id,
@@ -428,7 +543,8 @@ async def update_driver_location(
         "time": update.time_text,
         "message": update.message
     }
-    await manager.broadcast(tracking_data)
+    await location_buffer.push(order_id, (f"order:{order_id}", f"driver:{current_user.id}"), tracking_data)
+    location_history.append(order_id, current_user.id, update.latitude, update.longitude)
 
     # 2. SEND SMS (Only if there is a written message)
     if update.message:
@@ -440,8 +556,8 @@ async def update_driver_location(
         order = result.scalars().first()
         
         if order and order.customer.phone_number:
-            print(f"📩 Sending SMS: {update.message}")
-            send_sms(order.customer.phone_number, f"Driver Update: {update.message}")
+            print(f"📩 Queueing SMS: {update.message}")
+            notifier.enqueue_sms(order.customer.phone_number, f"Driver Update: {update.message}")
 
     return {"status": "Location shared"}
 
@@ -453,7 +569,7 @@ async def update_driver_location(
 async def delete_order_customer(
     order_id: int,
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     result = await db.execute(select(models.Order).filter(models.Order.id == order_id))
     order = result.scalars().first()
@@ -480,7 +596,7 @@ async def delete_order_customer(
 async def delete_order_owner(
     order_id: int,
     db: AsyncSession = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     result = await db.execute(
         select(models.Order)
@@ -499,4 +615,69 @@ async def delete_order_owner(
     order.visible_to_owner = False
     
     await db.commit()
-    return {"status": "success", "message": "Order removed from dashboard"}
\ No newline at end of file
+    return {"status": "success", "message": "Order removed from dashboard"}
+
+
+# -----------------------------------------------------------------------------
+# 13. ORDER ROUTE (Simplified Polyline 🗺️)
+# -----------------------------------------------------------------------------
+def route_query(order_id: int, tolerance: float, pending: List[Tuple[float, float, datetime]]):
+    """
+    Stored points plus this worker's not-yet-flushed (lng, lat, recorded_at)
+    points, so polling the route never forces a history flush.
+    """
+    point = models.DriverLocationPoint
+    track = select(point.location.label("location"), point.recorded_at.label("recorded_at")).filter(
+        point.order_id == order_id
+    )
+    if pending:
+        buffered = values(
+            column("lng", Float), column("lat", Float), column("recorded_at", DateTime), name="buffered"
+        ).data(pending)
+        track = union_all(track, select(
+            func.ST_SetSRID(func.ST_MakePoint(buffered.c.lng, buffered.c.lat), 4326, type_=Geometry),
+            buffered.c.recorded_at,
+        ))
+    track = track.subquery()
+
+    line = func.ST_MakeLine(aggregate_order_by(track.c.location, track.c.recorded_at))
+    return select(
+        func.count(),
+        func.ST_AsEncodedPolyline(func.ST_Simplify(line, tolerance)),
+        func.min(track.c.recorded_at),
+        func.max(track.c.recorded_at),
+    ).select_from(track)
+
+@router.get("/{order_id}/route")
+async def get_order_route(
+    order_id: int,
+    tolerance: float = 0.00005, # ~5m, in degrees (Douglas-Peucker)
+    db: AsyncSession = Depends(database.get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    result = await db.execute(
+        select(models.Order)
+        .filter(models.Order.id == order_id)
+        .options(selectinload(models.Order.restaurant))
+    )
+    order = result.scalars().first()
+
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    is_customer = order.customer_id == current_user.id
+    is_owner = order.restaurant and order.restaurant.owner_id == current_user.id
+    is_driver = order.driver_id is not None and order.driver_id == current_user.id
+    if not (is_customer or is_owner or is_driver):
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    result = await db.execute(route_query(order_id, tolerance, location_history.pending(order_id)))
+    total_points, polyline, started_at, ended_at = result.one()
+
+    return {
+        "order_id": order_id,
+        "points": total_points,
+        "polyline": polyline or "",
+        "started_at": started_at,
+        "ended_at": ended_at
+    }
@@ -1,21 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
-from typing import List
-from .. import models, schemas, database, auth
+from sqlalchemy import func, cast, or_, and_, Float
+from geoalchemy2 import Geography
+from typing import List, Optional
+from .. import models, schemas, database, auth, catalog
+from ..response_cache import response_cache, invalidate_restaurants, serialize
+from pydantic import TypeAdapter
+from ..geo_index import restaurant_index, restaurant_row, make_cursor, parse_cursor, page_after
 
 router = APIRouter(
     prefix="/restaurants",
     tags=["Restaurants"]
 )
 
+# Upper bound for the public /nearby search radius
+MAX_NEARBY_RADIUS_KM = 50.0
+# Cached nearby searches snap the user to a ~100 m grid (3 decimals),
+# otherwise every phone position is its own cache entry
+NEARBY_CACHE_DECIMALS = 3
+
+restaurants_adapter = TypeAdapter(List[schemas.RestaurantOut])
+nearby_adapter = TypeAdapter(List[schemas.RestaurantNearbyOut])
+
 # 1. Create a Restaurant (Only for Restaurant Owners)
 # LOCKED: Only logged-in owners can do this
 @router.post("/", response_model=schemas.RestaurantOut)
 async def create_restaurant(
     restaurant: schemas.RestaurantCreate,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db)
 ):
     # Check if user is a restaurant owner
@@ -40,43 +53,133 @@ async def create_restaurant(
     )
 
     db.add(new_restaurant)
+    await catalog.bump_version(db, catalog.RESTAURANTS_KEY)
     await db.commit()
     await db.refresh(new_restaurant)
+
+    # Keep the in-memory geo index & cached listings current
+    restaurant_index.upsert(restaurant_row(new_restaurant))
+    invalidate_restaurants()
     return new_restaurant
 
 
 # 2. Get Nearby Restaurants (Geospatial Query)
 # PUBLIC: Anyone can search nearby
-@router.get("/nearby", response_model=List[schemas.RestaurantOut])
+# Nearest first, `limit` per page. Pass the X-Next-Cursor response header
+# back as `cursor` for the next page.
+# mode="index" answers from the in-memory geo index (no DB);
+# mode="postgres" uses KNN <-> on the geography index, e.g. to cross-check.
+@router.get("/nearby", response_model=List[schemas.RestaurantNearbyOut])
 async def get_nearby_restaurants(
-    latitude: float,
-    longitude: float,
-    radius_km: float = 5.0, # Default search radius 5km
+    request: Request,
+    response: Response,
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=MAX_NEARBY_RADIUS_KM), # Default search radius 5km
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    mode: str = Query("index", pattern="^(index|postgres)$"),
     db: AsyncSession = Depends(database.get_db)
 ):
-    # PostGIS query: ST_DWithin checks if location is within distance
-    # We cast to Geography to use meters/kilometers
-    user_location = func.ST_GeographyFromText(f"POINT({longitude} {latitude})")
-    
-    query = select(models.Restaurant).filter(
-        func.ST_DWithin(
-            models.Restaurant.location, 
-            user_location, 
-            radius_km * 1000 
-        )
+    # Keyset cursor: "<distance_m>_<id>" of the last row on the previous page
+    after = None
+    if cursor:
+        try:
+            after = parse_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if mode == "index" and restaurant_index.ready:
+        # Distances are computed from the snapped point, so a cached page is exact for its key
+        latitude = round(latitude, NEARBY_CACHE_DECIMALS)
+        longitude = round(longitude, NEARBY_CACHE_DECIMALS)
+        radius_km = round(radius_km, 1) or 0.1
+        cache_key = f"nearby|{latitude:.{NEARBY_CACHE_DECIMALS}f}|{longitude:.{NEARBY_CACHE_DECIMALS}f}|{radius_km}|{limit}|{cursor}"
+        hit = response_cache.get(cache_key)
+        if hit:
+            return hit.to_response(request)
+
+        hits, next_cursor = page_after(restaurant_index.nearby(latitude, longitude, radius_km * 1000), limit, after)
+        page = [{**restaurant_index.rows[rid], "distance_m": d} for d, rid in hits]
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+        body = nearby_adapter.dump_json(nearby_adapter.validate_python(page))
+        return response_cache.put(cache_key, body, headers).to_response(request)
+
+    # Both sides as geography -> metres, and matches ix_restaurants_location_geography
+    user_location = cast(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326), Geography)
+    restaurant_location = func.geography(models.Restaurant.location)
+    # One metric for SELECT, ORDER BY and the cursor: the KNN (sphere) distance.
+    # Mixing it with ST_Distance (spheroid) would let pages skip or repeat rows.
+    distance = restaurant_location.op("<->", return_type=Float)(user_location)
+
+    query = (
+        select(models.Restaurant, distance.label("distance_m"))
+        .filter(func.ST_DWithin(restaurant_location, user_location, radius_km * 1000))
+        .order_by(distance, models.Restaurant.id)
+        .limit(limit + 1)
     )
-    
+
+    if after is not None:
+        last_distance, last_id = after
+        query = query.filter(
+            or_(distance > last_distance, and_(distance == last_distance, models.Restaurant.id > last_id))
+        )
+
     result = await db.execute(query)
-    return result.scalars().all()
+    rows = result.all()
+
+    restaurants = []
+    for restaurant, distance_m in rows[:limit]:
+        restaurant.distance_m = distance_m
+        restaurants.append(restaurant)
+
+    if len(rows) > limit:
+        last = restaurants[-1]
+        response.headers["X-Next-Cursor"] = make_cursor(last.distance_m, last.id)
+
+    return restaurants
 
 
 # 3. Get All Restaurants (For the Home Page)
 # PUBLIC: No login required! (Fixed the 401 Error)
+# Whole list by default; with `limit`/`cursor` it pages by id (pass
+# X-Next-Cursor back as `cursor`). Sends an ETag, so
+# repeat visits with If-None-Match get a 304 without running the query.
 @router.get("/", response_model=List[schemas.RestaurantOut])
 async def get_restaurants(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[int] = None,
     db: AsyncSession = Depends(database.get_db)
     # ❌ Removed "current_user" dependency here to allow public access
 ):
-    # Fetch all restaurants from the database
-    result = await db.execute(select(models.Restaurant))
-    return result.scalars().all()
\ No newline at end of file
+    limit = catalog.page_limit(limit, cursor)
+    version = await catalog.get_version(db, catalog.RESTAURANTS_KEY)
+    etag = catalog.make_etag(catalog.RESTAURANTS_KEY, version, cursor, limit or "all")
+    cached = catalog.not_modified(request, etag)
+    if cached:
+        return cached
+
+    # Same version already serialized on this worker -> serve the bytes
+    cache_key = f"{catalog.RESTAURANTS_KEY}|{version}|{cursor}|{limit}"
+    hit = response_cache.get(cache_key)
+    if hit:
+        return hit.to_response(request)
+
+    # Fetch one page of restaurants from the database
+    query = select(models.Restaurant).order_by(models.Restaurant.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    if cursor is not None:
+        query = query.filter(models.Restaurant.id > cursor)
+    result = await db.execute(query)
+    restaurants = result.scalars().all()
+
+    headers = catalog.cache_headers(etag)
+    if limit is not None and len(restaurants) > limit:
+        restaurants = restaurants[:limit]
+        headers["X-Next-Cursor"] = str(restaurants[-1].id)
+
+    entry = response_cache.put(cache_key, serialize(restaurants_adapter, restaurants), headers)
+    return entry.to_response(request)
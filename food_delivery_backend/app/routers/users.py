@@ -2,52 +2,50 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from .. import models, schemas, utils, database
-from typing import Dict
+from ..notifications import Enqueued, notifier
+from ..otp_store import OtpCheck, otp_store
 import random
 
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
-otp_storage: Dict[str, str] = {}
-
 # --- 1. SEND OTP (Simplified) ---
 @router.post("/send-otp")
 async def send_otp(phone_number: str):
     #  AUTO-FIX: Add +91 locally for matching storage key
-    clean_phone = phone_number.strip()
-    if not clean_phone.startswith("+"):
-        clean_phone = "+91" + clean_phone
+    clean_phone = utils.normalize_phone(phone_number)
 
     # 1. Generate 6-digit Code
     otp = str(random.randint(100000, 999999))
     
-    # 2. Store in Memory
-    otp_storage[clean_phone] = otp
+    # 2. Store with TTL (shared across workers when OTP_STORE=database)
+    await otp_store.put(clean_phone, otp)
     
-    # 3.  USE THE SHARED UTILITY TO SEND SMS
+    # 3. QUEUE THE SMS (sent in the background by the notification workers)
     message = f"Your FoodApp Verification Code is: {otp}"
-    success = utils.send_sms(clean_phone, message)
+    if notifier.enqueue_sms(clean_phone, message) == Enqueued.QUEUE_FULL:
+        # Don't claim it was sent, and don't leave an undeliverable code behind
+        await otp_store.discard(clean_phone)
+        raise HTTPException(status_code=503, detail="Could not send OTP right now, please try again shortly")
     
-    if success:
-        return {"message": "OTP sent via SMS!"}
-    else:
-        # Fallback message (The console log happened inside utils.py)
-        return {"message": "OTP sent (Check Backend Terminal for Fallback)"}
+    return {"message": "OTP sent via SMS!"}
 
 
 # --- 2. VERIFY OTP & CREATE USER (Stays the same) ---
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.UserOut)
 async def create_user(user: schemas.UserCreate, otp: str, db: AsyncSession = Depends(database.get_db)):
     
-    clean_phone = user.phone_number.strip()
-    if not clean_phone.startswith("+"):
-        clean_phone = "+91" + clean_phone
+    clean_phone = utils.normalize_phone(user.phone_number)
         
     # A. Verify Phone OTP
-    if clean_phone not in otp_storage:
+    otp_result = await otp_store.check(clean_phone, otp)
+    if otp_result == OtpCheck.MISSING:
         raise HTTPException(status_code=400, detail="Please request OTP first")
-    
-    if otp_storage[clean_phone] != otp:
+
+    if otp_result == OtpCheck.LOCKED:
+        raise HTTPException(status_code=429, detail="Too many attempts. Please request a new OTP")
+
+    if otp_result != OtpCheck.OK:
         raise HTTPException(status_code=400, detail="Invalid or Expired OTP")
 
     # B. Check Email
@@ -58,7 +56,7 @@ async def create_user(user: schemas.UserCreate, otp: str, db: AsyncSession = Dep
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # C. Create User
-    hashed_pwd = utils.hash(user.password) # ✅ Uses the hash function from the same utils.py
+    hashed_pwd = await utils.hash_async(user.password) # ✅ bcrypt off the event loop (utils.py)
     role_value = user.role.upper() if user.role else "CUSTOMER"
 
     new_user = models.User(
@@ -73,6 +71,6 @@ async def create_user(user: schemas.UserCreate, otp: str, db: AsyncSession = Dep
     await db.refresh(new_user)
     
     # Clear OTP after success
-    del otp_storage[clean_phone]
+    await otp_store.discard(clean_phone)
     
     return new_user
\ No newline at end of file
@@ -38,6 +38,7 @@ class RestaurantCreate(BaseModel):
     address: str
     latitude: float
     longitude: float
+    image_url: Optional[str] = None
 
 class RestaurantOut(BaseModel):
     id: int
@@ -52,6 +53,10 @@ class RestaurantOut(BaseModel):
         from_attributes = True
 
 
+class RestaurantNearbyOut(RestaurantOut):
+    distance_m: float
+
+
 # --- MENU SCHEMAS ---
 
 class MenuItemCreate(BaseModel):
@@ -66,6 +71,7 @@ class MenuItemOut(BaseModel):
     price: int
     is_available: bool
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .location_buffer import location_buffer
+from .socket_manager import manager
+
+FINAL_STATUSES = ("DELIVERED", "CANCELLED")
+
+
+class SnapshotStore:
+    """
+    Last-known state per active order (status, driver position, ETA text),
+    sent to a socket as soon as it subscribes to `order:{id}` so reconnecting
+    clients don't have to poll /orders/my-latest.
+    """
+
+    def __init__(self, max_orders: int = 50_000):
+        self.max_orders = max_orders
+        self._orders: "OrderedDict[int, dict]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._orders)
+
+    def record(self, message: dict):
+        order_id = message.get("order_id")
+        event = message.get("event")
+        if order_id is None or event not in ("STATUS_UPDATE", "DRIVER_UPDATE"):
+            return
+        order_id = int(order_id)
+
+        if event == "STATUS_UPDATE" and message.get("status") in FINAL_STATUSES:
+            # Finished orders don't need catching up on
+            self._orders.pop(order_id, None)
+            return
+
+        snapshot = self._orders.pop(order_id, None) or {"event": "SNAPSHOT", "order_id": order_id}
+        if event == "STATUS_UPDATE":
+            snapshot["status"] = message.get("status")
+        else:
+            snapshot["lat"] = message.get("lat")
+            snapshot["lng"] = message.get("lng")
+            snapshot["distance"] = message.get("distance")
+            snapshot["time"] = message.get("time")
+        snapshot["updated_at"] = time.time()
+
+        # Most recently updated last; drop the stalest order when full
+        self._orders[order_id] = snapshot
+        while len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+
+    def get(self, order_id: int) -> Optional[dict]:
+        return self._orders.get(order_id)
+
+
+# Global Instance
+snapshots = SnapshotStore()
+
+
+async def deliver_event(topics: list, message: dict):
+    """Broker handler: remember the latest state, then fan out to local sockets."""
+    snapshots.record(message)
+    if message.get("event") == "STATUS_UPDATE" and message.get("status") in FINAL_STATUSES:
+        # Every worker hears this, not just the one that finished the order
+        location_buffer.forget(int(message["order_id"]))
+    await manager.publish(topics, message)
+
+
+async def send_snapshot(websocket, topic: str):
+    prefix, _, ident = topic.partition(":")
+    if prefix != "order" or not ident.isdigit():
+        return
+    snapshot = snapshots.get(int(ident))
+    if snapshot is not None:
+        await manager.send_to(websocket, snapshot)
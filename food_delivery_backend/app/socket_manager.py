@@ -1,27 +1,202 @@
+import asyncio
+import json
+import os
+from collections import deque
 from fastapi import WebSocket
-from typing import List
+from typing import Deque, Dict, Hashable, Iterable, List, Optional, Set, Tuple, Union
+
+# Valid topic prefixes: order:{id}, restaurant:{id}, driver:{id}
+TOPIC_PREFIXES = ("order", "restaurant", "driver")
+
+# --- OUTBOUND QUEUE CONFIGURATION ---
+# What to do when a slow client's queue is full:
+#   "drop_oldest" - drop the oldest queued message
+#   "coalesce"    - replace a queued message of the same kind (e.g. an older
+#                   DRIVER_UPDATE for the same order), else drop the oldest
+#   "disconnect"  - close the slow connection
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "coalesce")
+
+
+def is_valid_topic(topic: str) -> bool:
+    prefix, _, ident = topic.partition(":")
+    return prefix in TOPIC_PREFIXES and ident.isdigit()
+
+
+def coalesce_key(message: dict) -> Hashable:
+    # Messages with the same key supersede each other
+    return (message.get("event"), message.get("order_id"))
+
+
+# --- PER-CONNECTION OUTBOX ---
+class ClientConnection:
+    """
+    One websocket plus its bounded outbound queue and writer task, so a
+    stalled client only ever delays itself.
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", max_queue: int, policy: str):
+        self.websocket = websocket
+        self.manager = manager
+        self.max_queue = max_queue
+        self.policy = policy
+        self.queue: Deque[Tuple[Hashable, str]] = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def stop(self):
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    def enqueue(self, key: Hashable, text: str) -> bool:
+        """Non-blocking. Returns False if the connection should be evicted."""
+        if self.closed:
+            return True
+        if len(self.queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                return False
+            if self.policy == "coalesce" and self._replace(key, text):
+                self.manager.stats["coalesced"] += 1
+                return True
+            self.queue.popleft()
+            self.manager.stats["dropped"] += 1
+        self.queue.append((key, text))
+        self._ready.set()
+        return True
+
+    def _replace(self, key: Hashable, text: str) -> bool:
+        for i, (queued_key, _) in enumerate(self.queue):
+            if queued_key == key:
+                del self.queue[i]
+                self.queue.append((key, text))
+                return True
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self.queue:
+                    _, text = self.queue.popleft()
+                    await self.websocket.send_text(text)
+                    self.manager.stats["sent"] += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Error sending: {e}")
+            self.manager.disconnect(self.websocket)
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_queue: int = WS_SEND_QUEUE_SIZE, policy: str = WS_OVERFLOW_POLICY):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        # topic -> sockets watching it, and the reverse index for cleanup
+        self.topics: Dict[str, Set[WebSocket]] = {}
+        self.subscriptions: Dict[WebSocket, Set[str]] = {}
+        self.stats = {"published": 0, "sent": 0, "dropped": 0, "coalesced": 0, "evicted": 0}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = ClientConnection(websocket, self, self.max_queue, self.policy)
+        self.connections[websocket] = connection
+        self.subscriptions[websocket] = set()
+        connection.start()
         print("🔌 Client Connected via WebSocket")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.stop()
+        for topic in self.subscriptions.pop(websocket, set()):
+            watchers = self.topics.get(topic)
+            if watchers is not None:
+                watchers.discard(websocket)
+                if not watchers:
+                    del self.topics[topic]
         print("❌ Client Disconnected")
 
+    def _evict(self, websocket: WebSocket):
+        print("🐢 Evicting slow WebSocket consumer")
+        self.stats["evicted"] += 1
+        self.disconnect(websocket)
+        asyncio.create_task(self._close_quietly(websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)  # "Try again later"
+        except Exception:
+            pass
+
+    # --- Topic Subscriptions ---
+    def subscribe(self, websocket: WebSocket, topic: str) -> bool:
+        if not is_valid_topic(topic) or websocket not in self.subscriptions:
+            return False
+        self.topics.setdefault(topic, set()).add(websocket)
+        self.subscriptions[websocket].add(topic)
+        return True
+
+    def unsubscribe(self, websocket: WebSocket, topic: str):
+        self.subscriptions.get(websocket, set()).discard(topic)
+        watchers = self.topics.get(topic)
+        if watchers is not None:
+            watchers.discard(websocket)
+            if not watchers:
+                del self.topics[topic]
+
+    # --- Sending ---
+    def _enqueue(self, websockets: Iterable[WebSocket], message: dict):
+        # Serialize once per publish, not once per socket
+        text = json.dumps(message)
+        key = coalesce_key(message)
+        self.stats["published"] += 1
+        for websocket in list(websockets):
+            connection = self.connections.get(websocket)
+            if connection is not None and not connection.enqueue(key, text):
+                self._evict(websocket)
+
+    async def send_to(self, websocket: WebSocket, message: dict):
+        self._enqueue([websocket], message)
+
+    async def publish(self, topics: Union[str, Iterable[str]], message: dict):
+        """Queues `message` for sockets subscribed to at least one of `topics` (each socket once)."""
+        if isinstance(topics, str):
+            topics = [topics]
+        targets: Set[WebSocket] = set()
+        for topic in topics:
+            targets |= self.topics.get(topic, set())
+        if targets:
+            self._enqueue(targets, message)
+
     async def broadcast(self, message: dict):
         print(f"📣 Broadcasting: {message}")
-        # Iterate over a copy to avoid modification errors during loop
-        for connection in self.active_connections[:]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"⚠️ Error broadcasting: {e}")
-                self.disconnect(connection)
-
-manager = ConnectionManager()
\ No newline at end of file
+        self._enqueue(self.connections, message)
+
+    def metrics(self) -> dict:
+        depths = [len(c.queue) for c in self.connections.values()]
+        return {
+            **self.stats,
+            "connections": len(self.connections),
+            "topics": len(self.topics),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "overflow_policy": self.policy,
+        }
+
+manager = ConnectionManager()
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+# --- CONFIGURATION ---
+UPLOAD_DIR = "app/uploads"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# Room for the other form fields & multipart boundaries around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Longest side in pixels for each derivative
+IMAGE_VARIANTS = {"thumb": 320, "medium": 800}
+ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif"}
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+# --- 1. EARLY SIZE CHECK ---
+class UploadLimitMiddleware:
+    """
+    Starlette reads and spools the whole multipart body before the handler
+    runs, so the limit has to be enforced from the headers: oversized
+    uploads are refused before their body is read, and multipart requests
+    without a Content-Length (chunked) are refused outright.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope.get("headers") or [])
+            if headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+                length = headers.get(b"content-length")
+                response = None
+                if length is None:
+                    response = JSONResponse({"detail": "Content-Length required"}, status_code=411)
+                elif not length.isdigit() or int(length) > self.max_bytes:
+                    response = JSONResponse(
+                        {"detail": f"Image larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"},
+                        status_code=413,
+                    )
+                if response is not None:
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+# --- 2. DERIVATIVES (runs in a worker process) ---
+def make_variants(source_path: str, digest: str, upload_dir: str = UPLOAD_DIR) -> Dict[str, str]:
+    """Writes resized JPEG variants next to the original; returns {variant: filename}."""
+    from PIL import Image  # Only the worker processes need Pillow
+
+    created = {}
+    with Image.open(source_path) as original:
+        image = original.convert("RGB")
+        for name, max_side in IMAGE_VARIANTS.items():
+            filename = f"{digest}_{name}.jpg"
+            path = os.path.join(upload_dir, filename)
+            if not os.path.exists(path):
+                variant = image.copy()
+                variant.thumbnail((max_side, max_side))
+                variant.save(path, "JPEG", quality=82, optimize=True, progressive=True)
+            created[name] = filename
+    return created
+
+
+# --- 3. CONTENT-ADDRESSED SAVE ---
+def _write_chunk(f, chunk: bytes):
+    f.write(chunk)
+
+
+async def save_upload(upload: UploadFile) -> Dict[str, str]:
+    """
+    Copies the (already spooled, size-checked by UploadLimitMiddleware)
+    upload to disk in chunks with file I/O off the event loop, re-checking
+    MAX_UPLOAD_BYTES. The file is stored as <sha256>.<ext>, so the same
+    photo uploaded twice is kept once. Returns filenames for "original",
+    "thumb" and "medium" (variants fall back to the original).
+    """
+    extension = (upload.filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    temp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4()}")
+    digest = hashlib.sha256()
+    size = 0
+
+    f = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Image larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+            digest.update(chunk)
+            await asyncio.to_thread(_write_chunk, f, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.remove, temp_path)
+        raise
+    await asyncio.to_thread(f.close)
+
+    hex_digest = digest.hexdigest()
+    filename = f"{hex_digest}.{extension}"
+    final_path = os.path.join(UPLOAD_DIR, filename)
+    if os.path.exists(final_path):
+        # Duplicate upload: keep the existing copy
+        await asyncio.to_thread(os.remove, temp_path)
+    else:
+        await asyncio.to_thread(os.replace, temp_path, final_path)
+
+    files = {"original": filename, **{name: filename for name in IMAGE_VARIANTS}}
+    try:
+        loop = asyncio.get_running_loop()
+        variants = await loop.run_in_executor(_get_image_pool(), make_variants, final_path, hex_digest)
+        files.update(variants)
+    except Exception as e:
+        print(f"⚠️ Could not create image variants for {filename}: {e}")
+    return files
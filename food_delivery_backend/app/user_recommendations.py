@@ -0,0 +1,246 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from . import database, models
+from .cooccurrence import CF_BLEND_WEIGHT, blend, cooccurrence
+from .recommender import tfidf_index
+
+# --- CONFIGURATION ---
+RECOMMEND_TOP_N = int(os.getenv("RECOMMEND_TOP_N", "10"))
+# Customers with an order in this window get a row from the batch job
+BATCH_ACTIVE_DAYS = int(os.getenv("BATCH_ACTIVE_DAYS", "90"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "2"))
+BATCH_CHUNK_USERS = int(os.getenv("BATCH_CHUNK_USERS", "500"))
+# In-app schedule for the batch job; 0 = only run it via `python -m app.user_recommendations`
+BATCH_INTERVAL_SECONDS = float(os.getenv("BATCH_INTERVAL_SECONDS", "0"))
+UPSERT_BATCH_ROWS = 1000
+
+
+# --- 1. SCORING (runs in worker processes) ---
+# The item x item matrices are sent once per worker via the pool initializer,
+# each task then only carries its slice of the user x item matrix.
+_worker_state: Dict[str, sp.csr_matrix] = {}
+
+
+def _init_worker(similarity: sp.csr_matrix, tfidf: sp.csr_matrix):
+    _worker_state["similarity"] = similarity
+    _worker_state["tfidf"] = tfidf
+
+
+def _normalise_rows(scores: np.ndarray) -> np.ndarray:
+    top = scores.max(axis=1, keepdims=True)
+    return np.divide(scores, top, out=np.zeros_like(scores), where=top > 0)
+
+
+def score_chunk(user_items: sp.csr_matrix, top_n: int, cf_weight: float) -> np.ndarray:
+    """
+    Blended top-n item columns for a block of users (-1 pads short rows).
+    Same mix as the live path: max-normalised co-occurrence and TF-IDF.
+    """
+    similarity, tfidf = _worker_state["similarity"], _worker_state["tfidf"]
+    cf = (user_items @ similarity).toarray().astype(np.float32)
+    # TF-IDF rows are L2-normalised: (U @ M) @ M.T is the summed cosine
+    content = ((user_items @ tfidf) @ tfidf.T).toarray().astype(np.float32)
+    scores = cf_weight * _normalise_rows(cf) + (1.0 - cf_weight) * _normalise_rows(content)
+
+    scores[user_items.nonzero()] = -np.inf  # Already ordered
+    scores[scores <= 0] = -np.inf           # No signal at all
+
+    k = min(top_n, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top[~np.isfinite(np.take_along_axis(scores, top, axis=1))] = -1
+    return top
+
+
+def item_similarity(order_rows: np.ndarray, item_cols: np.ndarray, n_items: int) -> sp.csr_matrix:
+    """Cosine item x item matrix from the order x item co-occurrences (zero diagonal)."""
+    x = sp.csr_matrix(
+        (np.ones(len(order_rows), dtype=np.float32), (order_rows, item_cols)),
+        shape=(int(order_rows.max()) + 1 if len(order_rows) else 0, n_items),
+    )
+    x.data[:] = 1
+    cooc = (x.T @ x).tocsr()
+    counts = cooc.diagonal()
+    inv = np.divide(1.0, np.sqrt(counts), out=np.zeros_like(counts, dtype=np.float32), where=counts > 0)
+    similarity = (sp.diags(inv) @ cooc @ sp.diags(inv)).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    return similarity.astype(np.float32)
+
+
+# --- 2. STORE ---
+class UserRecommendationStore:
+    """
+    Per-customer top-N lists in `user_recommendations`. A batch job fills
+    the table for every active customer; placing an order recomputes just
+    that customer; /orders/recommend is a primary-key lookup.
+    """
+
+    def __init__(self, top_n: int = RECOMMEND_TOP_N):
+        self.top_n = top_n
+        self._pending: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"batch_runs": 0, "batch_users": 0, "refreshes": 0, "failed": 0}
+
+    # --- Lookups ---
+    async def get(self, db, user_id: int) -> Optional[List[int]]:
+        result = await db.execute(
+            select(models.UserRecommendation.item_ids)
+            .filter(models.UserRecommendation.user_id == user_id)
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    def live(eaten_ids: Set[int], k: int) -> List[int]:
+        """In-memory blend, used for single-user refreshes and before the first batch."""
+        return blend(
+            cooccurrence.recommend_scored(eaten_ids, k=max(20, k), exclude=eaten_ids),
+            tfidf_index.recommend_scored(eaten_ids, k=max(20, k), exclude=eaten_ids),
+            k=k,
+        )
+
+    # --- Writes ---
+    async def _upsert(self, db, rows: List[dict]):
+        for start in range(0, len(rows), UPSERT_BATCH_ROWS):
+            stmt = pg_insert(models.UserRecommendation).values(rows[start:start + UPSERT_BATCH_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.UserRecommendation.user_id],
+                set_={"item_ids": stmt.excluded.item_ids, "computed_at": stmt.excluded.computed_at},
+            )
+            await db.execute(stmt)
+
+    async def refresh_user(self, user_id: int):
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                select(models.OrderItem.menu_item_id)
+                .join(models.Order)
+                .filter(models.Order.customer_id == user_id)
+                .distinct()
+            )
+            eaten_ids = {i for i in result.scalars().all() if i}
+            item_ids = self.live(eaten_ids, self.top_n)
+            await self._upsert(db, [{"user_id": user_id, "item_ids": item_ids, "computed_at": datetime.utcnow()}])
+            await db.commit()
+        self.stats["refreshes"] += 1
+
+    def schedule_refresh(self, user_id: int):
+        """Fire-and-forget after verify_payment commits."""
+        task = asyncio.create_task(self._refresh_safely(user_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _refresh_safely(self, user_id: int):
+        try:
+            await self.refresh_user(user_id)
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"⚠️ Recommendation refresh failed for user {user_id}: {e}")
+
+    # --- Batch Job ---
+    async def run_batch(self, workers: int = BATCH_WORKERS, chunk_users: int = BATCH_CHUNK_USERS):
+        if not tfidf_index.ready:
+            await tfidf_index.build()
+        if not tfidf_index.ready:
+            print("⚠️ Recommendation batch skipped: empty catalog")
+            return
+        # One consistent view of the index while the batch runs
+        column_of, tfidf = dict(tfidf_index.row_of), tfidf_index.matrix
+        item_ids = np.array(tfidf_index.item_ids, dtype=np.int64)
+
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                select(models.OrderItem.order_id, models.Order.customer_id, models.OrderItem.menu_item_id)
+                .join(models.Order)
+                .filter(models.OrderItem.menu_item_id.isnot(None))
+            )
+            rows = [r for r in result.all() if r[2] in column_of]
+            active = await db.execute(
+                select(models.Order.customer_id)
+                .filter(models.Order.created_at >= datetime.utcnow() - timedelta(days=BATCH_ACTIVE_DAYS))
+                .distinct()
+            )
+            active_users = {u for u in active.scalars().all() if u}
+
+        if not rows:
+            print("⚠️ Recommendation batch skipped: no orders yet")
+            return
+
+        _, order_rows = np.unique(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)), return_inverse=True)
+        customers = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+        item_cols = np.fromiter((column_of[r[2]] for r in rows), dtype=np.int64, count=len(rows))
+
+        keep = np.isin(customers, np.fromiter(active_users, dtype=np.int64, count=len(active_users)))
+        users, user_rows = np.unique(customers[keep], return_inverse=True)
+        if not len(users):
+            return
+        user_items = sp.csr_matrix(
+            (np.ones(len(user_rows), dtype=np.float32), (user_rows, item_cols[keep])),
+            shape=(len(users), len(item_ids)),
+        )
+        user_items.data[:] = 1
+
+        similarity = await asyncio.to_thread(item_similarity, order_rows, item_cols, len(item_ids))
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(similarity, tfidf)) as pool:
+            chunks = [
+                loop.run_in_executor(pool, score_chunk, user_items[start:start + chunk_users], self.top_n, CF_BLEND_WEIGHT)
+                for start in range(0, len(users), chunk_users)
+            ]
+            tops = await asyncio.gather(*chunks)
+
+        now = datetime.utcnow()
+        results = []
+        for top in tops:
+            for columns in top:
+                results.append([int(item_ids[c]) for c in columns if c >= 0])
+        rows_out = [
+            {"user_id": int(user_id), "item_ids": ids, "computed_at": now}
+            for user_id, ids in zip(users, results)
+        ]
+        async with database.SessionLocal() as db:
+            await self._upsert(db, rows_out)
+            await db.commit()
+
+        self.stats["batch_runs"] += 1
+        self.stats["batch_users"] = len(rows_out)
+        print(f"📦 Recommendations precomputed for {len(rows_out)} customers")
+
+    def start(self):
+        if self._task is None and BATCH_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _batch_loop(self):
+        while True:
+            await asyncio.sleep(BATCH_INTERVAL_SECONDS)
+            try:
+                await self.run_batch()
+            except Exception as e:
+                print(f"⚠️ Recommendation batch failed: {e}")
+
+
+# Global Instance
+user_recommendations = UserRecommendationStore()
+
+
+if __name__ == "__main__":
+    # Offline job, e.g. nightly from cron: python -m app.user_recommendations
+    asyncio.run(user_recommendations.run_batch())
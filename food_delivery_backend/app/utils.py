@@ -1,8 +1,21 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from twilio.rest import Client
 
 # --- 1. PASSWORD HASHING (Keep this!) ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with fewer than BCRYPT_ROUNDS rounds fail min_rounds, so
+# verify_and_update rehashes them on the next login after raising it
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
 
 def hash(password: str):
     return pwd_context.hash(password)
@@ -11,6 +24,46 @@ def verify(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# --- 1b. OFF-LOOP HASHING (for async handlers) ---
+# bcrypt releases the GIL, so a small thread pool keeps the event loop free.
+# The semaphore caps how many hashes run at once; the rest wait in line.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_semaphore: Optional[asyncio.Semaphore] = None
+hash_stats = {"queued": 0, "running": 0, "completed": 0, "total_wait_ms": 0.0, "total_run_ms": 0.0}
+
+async def _run_hashing(func, *args):
+    global _hash_semaphore
+    if _hash_semaphore is None:
+        _hash_semaphore = asyncio.Semaphore(HASH_WORKERS)
+
+    queued_at = time.perf_counter()
+    hash_stats["queued"] += 1
+    async with _hash_semaphore:
+        hash_stats["queued"] -= 1
+        hash_stats["running"] += 1
+        started_at = time.perf_counter()
+        hash_stats["total_wait_ms"] += (started_at - queued_at) * 1000
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_hash_pool, func, *args)
+        finally:
+            hash_stats["running"] -= 1
+            hash_stats["completed"] += 1
+            hash_stats["total_run_ms"] += (time.perf_counter() - started_at) * 1000
+
+async def hash_async(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+async def verify_and_update_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """
+    Returns (is_valid, new_hash). new_hash is set when the stored hash uses
+    an outdated cost factor and should be saved back to the user.
+    """
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 # --- 2. SMS NOTIFICATIONS (New Addition) ---
 
 
@@ -24,15 +77,21 @@ try:
 except:
     sms_client = None
 
+def normalize_phone(phone_number: str) -> str:
+    """Adds the +91 prefix when the number has no country code."""
+    clean_phone = phone_number.strip()
+    if not clean_phone.startswith("+"):
+        clean_phone = "+91" + clean_phone  # Adjust country code if needed
+    return clean_phone
+
 def send_sms(phone_number: str, message_body: str):
     """
     Sends an SMS to the given phone number.
     Handles +91 prefixing automatically.
+    Blocking! From request handlers use `notifications.notifier.enqueue_sms` instead.
     """
     # 1. Auto-Fix Phone Number
-    clean_phone = phone_number.strip()
-    if not clean_phone.startswith("+"):
-        clean_phone = "+91" + clean_phone  # Adjust country code if needed
+    clean_phone = normalize_phone(phone_number)
 
     try:
         # 2. Send via Twilio
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy.dialects import postgresql
+
+from app import models
+from app.principal_cache import Principal
+from app.routers import analytics
+from app.routers.analytics import _utc_bounds, hour_buckets
+
+
+def epoch(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_hour_buckets_follow_the_local_offset_across_dst():
+    new_york = ZoneInfo("America/New_York")
+    # 14:00 UTC is 09:00 EST in January and 10:00 EDT in July
+    epochs = np.array([epoch(2026, 1, 15, 14), epoch(2026, 7, 15, 14), epoch(2026, 7, 15, 14, 59)])
+    counts = hour_buckets(epochs, new_york)
+
+    assert counts.shape == (24,)
+    assert counts[9] == 1 and counts[10] == 2 and counts.sum() == 3
+
+
+def test_hour_buckets_of_no_orders_are_all_zero():
+    assert hour_buckets(np.array([], dtype=np.int64), ZoneInfo("UTC")).tolist() == [0] * 24
+
+
+def test_local_day_range_becomes_naive_utc_with_inclusive_end():
+    start, end = _utc_bounds(date(2026, 3, 1), date(2026, 3, 2), ZoneInfo("Asia/Kolkata"))
+
+    assert start == datetime(2026, 2, 28, 18, 30)
+    assert end == datetime(2026, 3, 2, 18, 30)
+    assert _utc_bounds(None, None, ZoneInfo("UTC")) == (None, None)
+
+
+class AnalyticsSession:
+    """Restaurant lookup, then whatever the mode queries next."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return self.results.pop(0)
+
+
+def restaurant_result():
+    restaurant = SimpleNamespace(id=3, name="Spice Hub")
+    return SimpleNamespace(scalars=lambda: SimpleNamespace(first=lambda: restaurant))
+
+
+def peak_hours(db, mode, tz="Asia/Kolkata"):
+    owner = Principal(id=1, role=models.UserRole.OWNER)
+    return asyncio.run(analytics.get_peak_hours(
+        start=date(2026, 3, 1), end=None, tz=tz, mode=mode, db=db, current_user=owner
+    ))
+
+
+def test_sql_mode_groups_in_postgres_by_local_hour():
+    db = AnalyticsSession(
+        restaurant_result(),
+        SimpleNamespace(all=lambda: [(13.0, 4), (20.0, 1)]),
+        SimpleNamespace(scalar=lambda: 750.5),
+    )
+    result = peak_hours(db, "sql")
+
+    assert result["peak_hours"][13] == 4 and result["peak_hours"][20] == 1
+    assert sum(result["peak_hours"].values()) == 5 and result["total_revenue"] == 750.5
+    sql = str(db.statements[1].compile(dialect=postgresql.dialect()))
+    assert "GROUP BY hour" in sql and "timezone" in sql
+    # The range filter stays on the raw column, so the index can serve it
+    assert "orders.created_at >=" in sql
+
+
+def test_memory_mode_matches_sql_mode():
+    rows = [(epoch(2026, 3, 1, 7, 45), 100.0), (epoch(2026, 3, 1, 8, 10), None), (epoch(2026, 3, 1, 14, 40), 50.0)]
+    db = AnalyticsSession(restaurant_result(), SimpleNamespace(all=lambda: rows))
+    result = peak_hours(db, "memory")
+
+    # Kolkata is UTC+05:30
+    assert {h: c for h, c in result["peak_hours"].items() if c} == {13: 2, 20: 1}
+    assert result["total_revenue"] == 150.0
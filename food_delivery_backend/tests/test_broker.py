@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import pytest
+
+from app import broker as broker_module
+from app.broker import InMemoryBroker, PostgresBroker, parse_event
+
+
+class FakeConnection:
+    def __init__(self, fail_execute=False):
+        self.listeners = []
+        self.closed = False
+        self.fail_execute = fail_execute
+        self.executed = []
+
+    async def add_listener(self, channel, callback):
+        self.listeners.append((channel, callback))
+
+    async def remove_listener(self, channel, callback):
+        self.listeners.remove((channel, callback))
+
+    async def execute(self, query, *args):
+        if self.closed or self.fail_execute:
+            raise ConnectionError("connection lost")
+        self.executed.append((query, args))
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+
+def make_broker(monkeypatch, connections):
+    broker = PostgresBroker("postgresql://test")
+    opened = []
+
+    async def connect():
+        conn = connections.pop(0) if connections else FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(broker, "_connect", connect)
+    return broker, opened
+
+
+@pytest.mark.parametrize("payload", [
+    "not json",
+    "[1, 2]",
+    '{"message": {}}',
+    '{"topics": "order:1", "message": {}}',
+    '{"topics": [1], "message": {}}',
+    '{"topics": ["order:1"], "message": "hi"}',
+])
+def test_malformed_payloads_are_rejected(payload):
+    with pytest.raises(ValueError):
+        parse_event(payload)
+
+
+def test_notifications_are_validated_and_delivered(monkeypatch):
+    async def scenario():
+        delivered = []
+
+        async def handler(topics, message):
+            delivered.append((topics, message))
+
+        broker, opened = make_broker(monkeypatch, [])
+        await broker.start(handler)
+        on_notify = opened[0].listeners[0][1]
+        on_notify(opened[0], 1, "tracking_events", '{"topics": ["order:1"]}')
+        on_notify(opened[0], 1, "tracking_events", json.dumps({"topics": ["order:1"], "message": {"lat": 1}}))
+        # The delivery task is referenced until it finishes
+        assert len(broker._deliveries) == 1
+        await asyncio.gather(*broker._deliveries)
+        await broker.stop()
+        return delivered, broker.stats
+
+    delivered, stats = asyncio.run(scenario())
+    assert delivered == [(["order:1"], {"lat": 1})]
+    assert stats["invalid"] == 1 and stats["received"] == 1
+
+
+def test_dead_listener_is_replaced(monkeypatch):
+    monkeypatch.setattr(broker_module, "BROKER_HEALTH_SECONDS", 0.01)
+
+    async def scenario():
+        async def handler(topics, message):
+            pass
+
+        broker, opened = make_broker(monkeypatch, [])
+        await broker.start(handler)
+        opened[0].closed = True  # server restarted
+        for _ in range(100):
+            if broker.stats["reconnects"]:
+                break
+            await asyncio.sleep(0.01)
+        listener = broker._listen_conn
+        await broker.stop()
+        return broker, opened, listener
+
+    broker, opened, listener = asyncio.run(scenario())
+    assert broker.stats["reconnects"] == 1
+    assert listener is opened[1] and listener.listeners == [] and listener.closed
+
+
+def test_startup_does_not_fail_when_postgres_is_down(monkeypatch):
+    async def scenario():
+        broker = PostgresBroker("postgresql://test")
+
+        async def connect():
+            raise OSError("connection refused")
+
+        monkeypatch.setattr(broker, "_connect", connect)
+        await broker.start(lambda topics, message: None)
+        running = broker._supervisor is not None and not broker._supervisor.done()
+        await broker.stop()
+        return running
+
+    assert asyncio.run(scenario())
+
+
+def test_publish_reconnects_after_a_broken_notify_connection(monkeypatch):
+    async def scenario():
+        broker, opened = make_broker(monkeypatch, [FakeConnection(fail_execute=True)])
+        with pytest.raises(ConnectionError):
+            await broker.publish("order:1", {"lat": 1})
+        await broker.publish(["order:1", "driver:7"], {"lat": 2})
+        return opened
+
+    opened = asyncio.run(scenario())
+    assert opened[0].closed
+    query, (channel, payload) = opened[1].executed[0]
+    assert json.loads(payload) == {"topics": ["order:1", "driver:7"], "message": {"lat": 2}}
+
+
+def test_in_memory_broker_delivers_to_its_handler():
+    async def scenario():
+        delivered = []
+
+        async def handler(topics, message):
+            delivered.append((topics, message))
+
+        broker = InMemoryBroker()
+        await broker.start(handler)
+        await broker.publish("order:1", {"event": "STATUS_UPDATE"})
+        return delivered
+
+    assert asyncio.run(scenario()) == [(["order:1"], {"event": "STATUS_UPDATE"})]
@@ -0,0 +1,41 @@
+import numpy as np
+
+from app.cooccurrence import CooccurrenceModel, blend
+
+
+def build(orders, neighbors=20):
+    model = CooccurrenceModel(neighbors=neighbors)
+    order_ids = np.array([o for o, items in enumerate(orders) for _ in items], dtype=np.int64)
+    item_ids = np.array([i for items in orders for i in items], dtype=np.int64)
+    model.load_counts(*model.count_pairs(order_ids, item_ids))
+    return model
+
+
+def test_cosine_neighbors_from_shared_orders():
+    model = build([[1, 2], [1, 2], [1, 3], [4]])
+
+    # sim(1,2) = 2 / sqrt(3 * 2), sim(1,3) = 1 / sqrt(3 * 1)
+    assert [other for other, _ in model.neighbor_lists[1]] == [2, 3]
+    assert model.neighbor_lists[4] == []
+    assert model.recommend_scored([2], k=5, exclude=[2]) == model.neighbor_lists[2]
+
+
+def test_add_order_matches_a_full_rebuild_for_ordered_items():
+    orders = [[1, 2], [1, 3], [2, 3], [1, 4]]
+    model = build(orders, neighbors=2)
+    model.add_order([1, 3, 3])
+
+    rebuilt = build(orders + [[1, 3]], neighbors=2)
+    for item in (1, 3):
+        assert model.neighbor_lists[item] == rebuilt.neighbor_lists[item]
+    # 2 and 4 list item 1: their entry for it is rescored in place
+    for item in (2, 4):
+        assert dict(model.neighbor_lists[item])[1] == dict(rebuilt.neighbor_lists[item])[1]
+
+
+def test_blend_normalises_each_source():
+    cf = [(1, 4.0), (2, 2.0)]
+    tfidf = [(2, 0.9), (3, 0.3)]
+
+    assert blend(cf, tfidf, k=3, cf_weight=0.5) == [2, 1, 3]
+    assert blend([], tfidf, k=1) == [2]
@@ -0,0 +1,99 @@
+import json
+import struct
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.routers import driver_stream
+from app.routers.driver_stream import BINARY_RECORD, parse_binary_frame, parse_json_frame
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.parametrize("text", [
+    '{"order_id": 1}',                 # not a list
+    '[1, 91.0, 0.0]',                  # latitude out of range
+    '[1, 0.0, 181.0]',                 # longitude out of range
+    '[1, NaN, 0.0]',                   # not finite
+    '[1, 0.0]',                        # too short
+    '[[1, 0.0, 0.0, 5, "3 mins"]]',    # distance not a string
+])
+def test_bad_json_frames_are_rejected(text):
+    with pytest.raises((ValueError, TypeError)):
+        parse_json_frame(text)
+
+
+def test_json_frame_single_and_batched():
+    assert parse_json_frame('[1, 12.5, 77.5]') == [(1, 12.5, 77.5, None, None)]
+    assert parse_json_frame('[[1, 12.5, 77.5, "2 km", "5 mins"], [2, 1.0, 2.0]]') == [
+        (1, 12.5, 77.5, "2 km", "5 mins"),
+        (2, 1.0, 2.0, None, None),
+    ]
+
+
+def test_binary_frame_checks_length_and_coordinates():
+    assert parse_binary_frame(BINARY_RECORD.pack(3, 12.5, 77.5)) == [(3, 12.5, 77.5, None, None)]
+    with pytest.raises(ValueError):
+        parse_binary_frame(BINARY_RECORD.pack(3, 12.5, 77.5)[:-1])
+    with pytest.raises(ValueError):
+        parse_binary_frame(struct.pack("<Idd", 3, float("inf"), 0.0))
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    pushed, recorded, checks = [], [], []
+
+    async def get_user_from_token(token, db):
+        if token != "good":
+            return None
+        return SimpleNamespace(id=7, role=models.UserRole.DRIVER, email="d@x.com", phone_number=None, is_active=True)
+
+    async def claim_delivery(user, order_id, db):
+        checks.append(order_id)
+        return order_id == 1
+
+    async def push(order_id, topics, message):
+        pushed.append((order_id, topics, message))
+
+    monkeypatch.setattr(driver_stream.database, "SessionLocal", FakeSession)
+    monkeypatch.setattr(driver_stream.auth, "get_user_from_token", get_user_from_token)
+    monkeypatch.setattr(driver_stream.auth, "claim_delivery", claim_delivery)
+    monkeypatch.setattr(driver_stream.location_buffer, "push", push)
+    monkeypatch.setattr(driver_stream.location_history, "append", lambda *point: recorded.append(point))
+
+    app = FastAPI()
+    app.include_router(driver_stream.router)
+    return SimpleNamespace(client=TestClient(app), pushed=pushed, recorded=recorded, checks=checks)
+
+
+def test_only_claimed_orders_are_forwarded_and_checked_once(stream):
+    with stream.client.websocket_connect("/ws/driver?token=good") as ws:
+        ws.send_text(json.dumps([[1, 12.5, 77.5, "2 km", "5 mins"], [2, 12.6, 77.6]]))
+        assert ws.receive_json() == {"event": "FORBIDDEN", "order_id": 2}
+        ws.send_text(json.dumps([1, 12.51, 77.51]))
+        ws.send_text("not json")
+        assert ws.receive_json()["event"] == "INVALID_FRAME"
+
+    assert stream.checks == [1, 2]
+    assert [order_id for order_id, _, _ in stream.pushed] == [1, 1]
+    assert stream.pushed[0][1] == ("order:1", "driver:7")
+    # Compact frames keep the last ETA text
+    assert stream.pushed[1][2]["time"] == "5 mins"
+    assert [point[:2] for point in stream.recorded] == [(1, 7), (1, 7)]
+
+
+def test_bad_token_is_refused(stream):
+    from starlette.websockets import WebSocketDisconnect
+
+    with pytest.raises(WebSocketDisconnect):
+        with stream.client.websocket_connect("/ws/driver?token=bad") as ws:
+            ws.receive_text()
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+from app import geo_index
+from app.geo_index import RestaurantGeoIndex, haversine_m
+
+
+def make_index(*points, cell_deg=0.05):
+    index = RestaurantGeoIndex(cell_deg)
+    for restaurant_id, (latitude, longitude) in enumerate(points, start=1):
+        index.upsert({"id": restaurant_id, "latitude": latitude, "longitude": longitude, "is_open": True})
+    return index
+
+
+def brute_force(index, latitude, longitude, radius_m):
+    hits = []
+    for restaurant_id, row in index.rows.items():
+        distance = haversine_m(latitude, longitude, row["latitude"], row["longitude"])
+        if distance <= radius_m:
+            hits.append((distance, restaurant_id))
+    return sorted(hits)
+
+
+def test_nearby_matches_brute_force_and_is_sorted():
+    index = make_index((12.97, 77.59), (12.98, 77.60), (13.10, 77.59), (12.90, 77.70), (19.07, 72.88))
+    hits = index.nearby(12.97, 77.59, 15_000)
+
+    assert hits == brute_force(index, 12.97, 77.59, 15_000)
+    assert [rid for _, rid in hits] == [1, 2, 4, 3]
+
+
+def test_closed_restaurants_are_listed_like_the_postgres_query():
+    index = make_index((12.97, 77.59))
+    index.upsert({"id": 1, "latitude": 12.97, "longitude": 77.59, "is_open": False})
+
+    assert [rid for _, rid in index.nearby(12.97, 77.59, 1000)] == [1]
+    assert index.rows[1]["is_open"] is False
+
+
+def test_upserts_during_a_rebuild_survive_the_swap(monkeypatch):
+    index = make_index((12.97, 77.59))
+    stored = [SimpleNamespace(id=1, name="Old", address="", is_open=True, image_url=None,
+                              latitude=12.97, longitude=77.59)]
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            # create_restaurant commits and upserts while the snapshot query is in flight
+            index.upsert({"id": 2, "latitude": 12.98, "longitude": 77.60, "is_open": True})
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: stored))
+
+    monkeypatch.setattr(geo_index.database, "SessionLocal", Session)
+    asyncio.run(index.rebuild())
+
+    assert sorted(index.rows) == [1, 2]
+    assert [rid for _, rid in index.nearby(12.97, 77.59, 5000)] == [1, 2]
+
+
+def test_query_near_pole_checks_every_restaurant():
+    index = make_index((89.99, 0.0), (89.99, 179.0), (0.0, 0.0))
+
+    assert index._candidates(89.9, 10.0, 50_000) == index.rows.keys()
+    assert index.nearby(89.9, 10.0, 50_000) == brute_force(index, 89.9, 10.0, 50_000)
+
+
+def test_query_across_antimeridian_finds_both_sides():
+    index = make_index((0.0, 179.99), (0.0, -179.99), (0.0, 170.0))
+    hits = index.nearby(0.0, 179.995, 5_000)
+
+    assert sorted(rid for _, rid in hits) == [1, 2]
+
+
+def test_huge_radius_falls_back_to_a_full_scan(monkeypatch):
+    monkeypatch.setattr(geo_index, "GEO_INDEX_MAX_CELLS", 400)
+    index = make_index((12.97, 77.59), (28.61, 77.21))
+
+    # 2000 km at 0.05 deg cells would be ~1.3M cells
+    assert index._candidates(20.0, 77.0, 2_000_000) == index.rows.keys()
+    assert index.nearby(20.0, 77.0, 2_000_000) == brute_force(index, 20.0, 77.0, 2_000_000)
+
+
+def test_small_radius_only_scans_nearby_cells():
+    index = make_index((12.97, 77.59), (28.61, 77.21))
+
+    assert sorted(index._candidates(12.97, 77.59, 1000)) == [1]
+
+
+def test_out_of_range_coordinates_are_clamped():
+    index = make_index((90.0, 0.0))
+
+    assert [rid for _, rid in index.nearby(123.0, 0.0, 100)] == [1]
+    assert index.nearby(0.0, 0.0, -5) == []
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import time
+
+from app import utils
+
+
+def test_hashing_runs_off_the_loop_and_is_capped(monkeypatch):
+    monkeypatch.setattr(utils, "HASH_WORKERS", 1)
+    monkeypatch.setattr(utils, "_hash_semaphore", None)
+    running, peak, threads = [0], [0], set()
+    lock = threading.Lock()
+
+    def slow_hash(password):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        threads.add(threading.current_thread().name)
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return f"hashed:{password}"
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        clock = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(utils._run_hashing(slow_hash, str(i)) for i in range(6)))
+        clock.cancel()
+        return results, ticks
+
+    before = dict(utils.hash_stats)
+    results, ticks = asyncio.run(scenario())
+
+    assert results == [f"hashed:{i}" for i in range(6)]
+    # The semaphore, not the pool size, sets the cap
+    assert peak[0] == 1
+    assert all(name.startswith("bcrypt") for name in threads)
+    # The event loop kept running while the hashes did
+    assert ticks > 10
+    assert utils.hash_stats["completed"] - before["completed"] == 6
+    assert utils.hash_stats["queued"] == before["queued"] and utils.hash_stats["running"] == before["running"]
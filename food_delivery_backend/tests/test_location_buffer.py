@@ -0,0 +1,81 @@
+import asyncio
+
+from app import location_buffer as location_buffer_module
+from app import snapshots
+from app.location_buffer import LocationBuffer
+
+
+def point(lat, lng, time="5 mins"):
+    return {"event": "DRIVER_UPDATE", "lat": lat, "lng": lng, "distance": "2 km", "time": time, "message": None}
+
+
+def capture(monkeypatch):
+    published = []
+
+    async def publish(topics, message):
+        published.append((topics, message))
+
+    monkeypatch.setattr(location_buffer_module.broker, "publish", publish)
+    return published
+
+
+def test_points_within_a_tick_are_merged_and_small_moves_suppressed(monkeypatch):
+    published = capture(monkeypatch)
+    buffer = LocationBuffer(tick_hz=2, min_move_m=5)
+
+    async def scenario():
+        await buffer.push(1, ("order:1",), point(12.9700, 77.5900))
+        await buffer.push(1, ("order:1",), point(12.9710, 77.5900))
+        await buffer.flush()
+        # ~1 m away, same ETA: not worth a frame
+        await buffer.push(1, ("order:1",), point(12.97101, 77.5900))
+        await buffer.flush()
+        # Same spot but the ETA changed
+        await buffer.push(1, ("order:1",), point(12.97101, 77.5900, time="4 mins"))
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert [message["lat"] for _, message in published] == [12.9710, 12.97101]
+    assert buffer.stats == {"received": 4, "merged": 1, "suppressed": 1, "published": 2, "expired": 0}
+
+
+def test_idle_orders_expire_but_active_ones_stay(monkeypatch):
+    capture(monkeypatch)
+    clock = [1000.0]
+    monkeypatch.setattr(location_buffer_module.time, "monotonic", lambda: clock[0])
+    buffer = LocationBuffer(tick_hz=2, state_ttl=60)
+
+    async def scenario():
+        await buffer.push(1, ("order:1",), point(12.97, 77.59))
+        await buffer.push(2, ("order:2",), point(13.00, 77.60))
+        await buffer.flush()
+        clock[0] += 45
+        # Order 2's driver is still sending (even if suppressed)
+        await buffer.push(2, ("order:2",), point(13.00, 77.60))
+        await buffer.flush()
+        clock[0] += 30
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert list(buffer._last_sent) == [2]
+    assert buffer.stats["expired"] == 1
+
+
+def test_final_status_from_any_worker_drops_the_order(monkeypatch):
+    capture(monkeypatch)
+    buffer = LocationBuffer(tick_hz=2)
+    monkeypatch.setattr(snapshots, "location_buffer", buffer)
+
+    async def fan_out(topics, message):
+        pass
+
+    monkeypatch.setattr(snapshots.manager, "publish", fan_out)
+
+    async def scenario():
+        await buffer.push(1, ("order:1",), point(12.97, 77.59))
+        await buffer.flush()
+        await buffer.push(1, ("order:1",), point(12.98, 77.59))
+        await snapshots.deliver_event(["order:1"], {"event": "STATUS_UPDATE", "order_id": 1, "status": "CANCELLED"})
+
+    asyncio.run(scenario())
+    assert buffer._last_sent == {} and buffer._pending == {}
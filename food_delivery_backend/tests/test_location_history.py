@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import location_history as history_module
+from app.location_history import LocationHistoryBuffer
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self._ids = ids
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._ids
+
+
+class FakeSession:
+    """SELECT of existing order ids only (the INSERT goes through the patched _write)."""
+
+    def __init__(self, existing):
+        self.existing = existing
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        return FakeResult(list(self.existing))
+
+
+@pytest.fixture
+def kolkata_tz():
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Kolkata"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def test_default_timestamp_is_utc_whatever_the_local_zone(kolkata_tz):
+    buffer = LocationHistoryBuffer(flush_points=100)
+    buffer.append(1, 7, 12.97, 77.59)
+
+    (_, _, recorded_at), = buffer.pending(1)
+    assert abs((recorded_at - datetime.utcnow()).total_seconds()) < 5
+
+
+def test_pending_returns_only_that_order_oldest_first():
+    buffer = LocationHistoryBuffer(flush_points=100)
+    buffer.append(1, 7, 1.0, 2.0, timestamp=200)
+    buffer.append(2, 8, 3.0, 4.0, timestamp=100)
+    buffer.append(1, 7, 5.0, 6.0, timestamp=100)
+
+    assert [(lng, lat) for lng, lat, _ in buffer.pending(1)] == [(6.0, 5.0), (2.0, 1.0)]
+
+
+def test_failed_flush_keeps_the_points(monkeypatch):
+    buffer = LocationHistoryBuffer(flush_points=100)
+    written = []
+
+    async def unreachable(rows):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(buffer, "_write", unreachable)
+    buffer.append(1, 7, 1.0, 2.0, timestamp=100)
+    buffer.append(2, 8, 3.0, 4.0, timestamp=101)
+    asyncio.run(buffer.flush())
+
+    assert len(buffer) == 2
+    assert buffer.stats["failed"] == 0
+
+    async def record(rows):
+        written.extend(rows)
+
+    monkeypatch.setattr(buffer, "_write", record)
+    buffer.append(3, 9, 5.0, 6.0, timestamp=102)
+    asyncio.run(buffer.flush())
+
+    assert [row["order_id"] for row in written] == [1, 2, 3]
+    assert len(buffer) == 0
+
+
+def test_missing_order_only_drops_its_own_points(monkeypatch):
+    buffer = LocationHistoryBuffer(flush_points=100)
+    written = []
+
+    async def insert(rows):
+        if any(row["order_id"] == 999 for row in rows):
+            raise IntegrityError("INSERT", {}, Exception("violates foreign key constraint"))
+        written.extend(rows)
+
+    monkeypatch.setattr(buffer, "_write", insert)
+    monkeypatch.setattr(history_module.database, "SessionLocal", lambda: FakeSession({1, 2}))
+    for order_id in (1, 999, 2):
+        buffer.append(order_id, 7, 1.0, 2.0, timestamp=100)
+    asyncio.run(buffer.flush())
+
+    assert [row["order_id"] for row in written] == [1, 2]
+    assert buffer.stats["failed"] == 1
+    assert len(buffer) == 0
+
+
+def test_requeue_is_capped_oldest_first(monkeypatch):
+    buffer = LocationHistoryBuffer(flush_points=100, max_buffered=3)
+
+    async def unreachable(rows):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(buffer, "_write", unreachable)
+    for order_id in range(1, 6):
+        buffer.append(order_id, 7, 1.0, 2.0, timestamp=order_id)
+    asyncio.run(buffer.flush())
+
+    assert list(buffer.order_ids) == [3, 4, 5]
+    assert buffer.stats["failed"] == 2
+
+
+def test_route_query_includes_unflushed_points_without_flushing():
+    from sqlalchemy.dialects import postgresql
+    from app.routers.orders import route_query
+
+    with_pending = str(route_query(5, 0.00005, [(77.59, 12.97, datetime(2026, 1, 1))]).compile(
+        dialect=postgresql.dialect()
+    ))
+    stored_only = str(route_query(5, 0.00005, []).compile(dialect=postgresql.dialect()))
+
+    assert "UNION ALL" in with_pending and "VALUES" in with_pending
+    assert "VALUES" not in stored_only
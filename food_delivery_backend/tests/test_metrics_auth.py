@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import auth, models
+from app.FoodDeliveryApp import app
+from app.principal_cache import Principal
+
+METRICS = ["/ws/metrics", "/metrics/hashing", "/metrics/response-cache"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_USER_IDS", {1})
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def login_as(user_id):
+    app.dependency_overrides[auth.get_current_user] = lambda: Principal(id=user_id, role=models.UserRole.OWNER)
+
+
+@pytest.mark.parametrize("path", METRICS)
+def test_metrics_need_a_token(client, path):
+    assert client.get(path).status_code == 401
+
+
+@pytest.mark.parametrize("path", METRICS)
+def test_metrics_are_admin_only(client, path):
+    login_as(2)
+    assert client.get(path).status_code == 403
+
+    login_as(1)
+    assert client.get(path).status_code == 200
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.notifications import Enqueued, MemoryTransport, NotificationDispatcher, SmsTransport
+from app.otp_store import MemoryOtpStore
+from app.routers import users
+
+
+class FlakyTransport(SmsTransport):
+    """Fails (or blows up in send_batch) a set number of times, then delivers."""
+
+    def __init__(self, failures=0, crashes=0, broken_numbers=()):
+        self.failures = failures
+        self.crashes = crashes
+        self.broken_numbers = set(broken_numbers)
+        self.sent = []
+
+    async def send_batch(self, messages):
+        if self.crashes:
+            self.crashes -= 1
+            raise RuntimeError("transport bug")
+        return await super().send_batch(messages)
+
+    async def send(self, message):
+        if message.to in self.broken_numbers:
+            raise OSError("unreachable")
+        if self.failures:
+            self.failures -= 1
+            raise OSError("temporary failure")
+        self.sent.append(message)
+
+
+async def drain(dispatcher, until, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not until():
+        assert asyncio.get_running_loop().time() < deadline, dispatcher.stats
+        await asyncio.sleep(0.005)
+
+
+def test_enqueue_reports_duplicates_and_full_queue_separately():
+    async def scenario():
+        dispatcher = NotificationDispatcher(MemoryTransport(), workers=1, max_queue=2)
+        dispatcher._queue = asyncio.Queue(maxsize=2)
+        dispatcher._tasks = [asyncio.create_task(asyncio.sleep(3600))]  # no consumer yet
+        results = [
+            dispatcher.enqueue_sms("+911", "hello"),
+            dispatcher.enqueue_sms("+911", "hello"),
+            dispatcher.enqueue_sms("+912", "hello"),
+            dispatcher.enqueue_sms("+913", "hello"),
+        ]
+        dispatcher._tasks[0].cancel()
+        return results, dispatcher.stats
+
+    results, stats = asyncio.run(scenario())
+    assert results == [Enqueued.QUEUED, Enqueued.DUPLICATE, Enqueued.QUEUED, Enqueued.QUEUE_FULL]
+    assert stats["deduplicated"] == 1 and stats["dropped"] == 1
+
+
+def test_failed_send_is_retried_without_blocking_other_messages():
+    async def scenario():
+        transport = FlakyTransport(broken_numbers={"+91slow"})
+        dispatcher = NotificationDispatcher(transport, workers=1, batch_size=1, base_backoff=0.05, max_attempts=3)
+        dispatcher.enqueue_sms("+91slow", "first")
+        dispatcher.enqueue_sms("+91fast", "second")
+        # The second message goes out while the first waits for its retry
+        await drain(dispatcher, lambda: transport.sent)
+        assert dispatcher._retries
+        await drain(dispatcher, lambda: dispatcher.stats["failed"] == 1)
+        await dispatcher.stop()
+        return transport, dispatcher.stats
+
+    transport, stats = asyncio.run(scenario())
+    assert [m.body for m in transport.sent] == ["second"]
+    assert stats["retried"] == 2 and stats["sent"] == 1
+
+
+def test_worker_survives_a_crashing_transport():
+    async def scenario():
+        transport = FlakyTransport(crashes=1)
+        dispatcher = NotificationDispatcher(transport, workers=1, base_backoff=0.01)
+        dispatcher.enqueue_sms("+911", "hello")
+        await drain(dispatcher, lambda: transport.sent)
+        alive = not dispatcher._tasks[0].done()
+        await dispatcher.stop()
+        return transport, alive
+
+    transport, alive = asyncio.run(scenario())
+    assert alive
+    # The crash counted as an attempt, the retry went out
+    assert transport.sent[0].attempts == 2
+
+
+def test_send_otp_only_fails_when_the_queue_is_full(monkeypatch):
+    store = MemoryOtpStore()
+    monkeypatch.setattr(users, "otp_store", store)
+
+    monkeypatch.setattr(users.notifier, "enqueue_sms", lambda to, body: Enqueued.DUPLICATE)
+    assert asyncio.run(users.send_otp("9876543210")) == {"message": "OTP sent via SMS!"}
+
+    monkeypatch.setattr(users.notifier, "enqueue_sms", lambda to, body: Enqueued.QUEUE_FULL)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(users.send_otp("9876543210"))
+    assert error.value.status_code == 503
+    # No undeliverable code is left behind
+    assert "+919876543210" not in store._entries
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from app.otp_store import DatabaseOtpStore, MemoryOtpStore, OtpCheck
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_correct_code_is_accepted():
+    store = MemoryOtpStore(max_attempts=3)
+    run(store.put("+911234567890", "123456"))
+    assert run(store.check("+911234567890", "123456")) == OtpCheck.OK
+
+
+def test_code_locks_after_max_wrong_attempts():
+    store = MemoryOtpStore(max_attempts=3)
+    run(store.put("+911234567890", "123456"))
+
+    results = [run(store.check("+911234567890", "000000")) for _ in range(3)]
+    assert results == [OtpCheck.INVALID] * 3
+    # Even the right code is refused once locked
+    assert run(store.check("+911234567890", "123456")) == OtpCheck.LOCKED
+
+
+def test_concurrent_guesses_cannot_exceed_the_limit():
+    store = MemoryOtpStore(max_attempts=5)
+
+    async def scenario():
+        await store.put("+911234567890", "123456")
+        return await asyncio.gather(*(store.check("+911234567890", f"{i:06d}") for i in range(50)))
+
+    results = run(scenario())
+    assert results.count(OtpCheck.INVALID) == 5
+    assert results.count(OtpCheck.LOCKED) == 45
+
+
+def test_new_code_resets_attempts():
+    store = MemoryOtpStore(max_attempts=1)
+    run(store.put("+911234567890", "111111"))
+    run(store.check("+911234567890", "000000"))
+    run(store.put("+911234567890", "222222"))
+    assert run(store.check("+911234567890", "222222")) == OtpCheck.OK
+
+
+def test_expired_and_discarded_codes_are_missing():
+    store = MemoryOtpStore(ttl_seconds=-1)
+    run(store.put("+911234567890", "123456"))
+    assert run(store.check("+911234567890", "123456")) == OtpCheck.MISSING
+
+    store = MemoryOtpStore()
+    run(store.put("+911234567890", "123456"))
+    run(store.discard("+911234567890"))
+    assert run(store.check("+911234567890", "123456")) == OtpCheck.MISSING
+
+
+def test_database_check_counts_and_limits_in_one_statement():
+    store = DatabaseOtpStore(max_attempts=5)
+    sql = str(store.check_statement("+911234567890", "123456", datetime.utcnow()).compile(
+        dialect=postgresql.dialect()
+    ))
+    # The limit is part of the UPDATE's WHERE, not a separate SELECT beforehand
+    assert sql.startswith("UPDATE signup_otps SET attempts=")
+    assert "signup_otps.attempts <" in sql
+    assert "RETURNING" in sql
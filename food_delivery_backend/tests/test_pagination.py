@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from app.catalog import DEFAULT_PAGE_LIMIT, page_limit
+from app.geo_index import make_cursor, page_after, parse_cursor
+
+
+def test_cursor_round_trips_exact_distance():
+    distance = 1234.5678901234567
+    assert parse_cursor(make_cursor(distance, 42)) == (distance, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "abc", "12.5", "12.5_", "_7", "nan_7", "inf_7", "12.5_x"])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        parse_cursor(cursor)
+
+
+def test_paging_through_ties_has_no_gaps_or_repeats():
+    # Several restaurants at exactly the same distance straddle page boundaries
+    hits = sorted([(100.0, i) for i in range(1, 6)] + [(250.0, 9), (250.0, 8), (math.pi, 3)])
+    seen, after = [], None
+    while True:
+        page, next_cursor = page_after(hits, 3, after)
+        seen.extend(page)
+        if next_cursor is None:
+            break
+        after = parse_cursor(next_cursor)
+
+    assert seen == hits
+
+
+def test_last_page_has_no_cursor():
+    hits = [(10.0, 1), (20.0, 2)]
+    assert page_after(hits, 2) == (hits, None)
+    assert page_after(hits, 5, after=(10.0, 1)) == ([(20.0, 2)], None)
+
+
+def test_full_list_when_neither_limit_nor_cursor_is_sent():
+    assert page_limit(None, None) is None
+
+
+def test_default_limit_once_paging_starts():
+    assert page_limit(None, 5) == DEFAULT_PAGE_LIMIT
+    assert page_limit(20, None) == 20
+    assert page_limit(20, 5) == 20
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.payments import FakeGateway, PaymentError, PaymentGateway, sign_payment
+
+
+def test_valid_signature_is_accepted():
+    gateway = FakeGateway(key_secret="secret")
+    signature = sign_payment("order_1", "pay_1", "secret")
+    gateway.verify_signature("order_1", "pay_1", signature)
+
+
+@pytest.mark.parametrize("order_id, payment_id, signature", [
+    ("order_1", "pay_2", sign_payment("order_1", "pay_1", "secret")),   # other payment
+    ("order_2", "pay_1", sign_payment("order_1", "pay_1", "secret")),   # other order
+    ("order_1", "pay_1", sign_payment("order_1", "pay_1", "wrong")),    # other key
+    ("order_1", "pay_1", ""),
+    ("order_1", "pay_1", None),
+])
+def test_invalid_signatures_are_rejected(order_id, payment_id, signature):
+    gateway = FakeGateway(key_secret="secret")
+    with pytest.raises(PaymentError):
+        gateway.verify_signature(order_id, payment_id, signature)
+
+
+def test_fake_gateway_keeps_amount_and_notes():
+    gateway = FakeGateway()
+    order = asyncio.run(gateway.create_order(amount=45000, notes={"customer_id": "7"}))
+    fetched = asyncio.run(gateway.fetch_order(order["id"]))
+    assert fetched["amount"] == 45000
+    assert fetched["notes"] == {"customer_id": "7"}
+
+    with pytest.raises(PaymentError):
+        asyncio.run(gateway.fetch_order("order_unknown"))
+
+
+def test_incomplete_gateway_cannot_be_instantiated():
+    class HalfGateway(PaymentGateway):
+        async def create_order(self, amount, currency="INR", receipt="order_receipt", notes=None):
+            return {}
+
+    with pytest.raises(TypeError):
+        HalfGateway("key", "secret")
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app import popularity as popularity_module
+from app.popularity import ALL_HOURS, GLOBAL, PopularityRanking
+
+
+def test_recent_orders_outrank_older_ones_with_decay():
+    ranking = PopularityRanking(half_life_days=1, top_k=5)
+    ranking.add_order(1, [(10, 3)], datetime(2026, 1, 1, 12))
+    ranking.add_order(1, [(20, 2)], datetime(2026, 1, 5, 12))
+
+    # 3 orders four half-lives ago weigh less than 2 today
+    assert ranking.top(1) == [20, 10]
+    assert ranking.top() == [20, 10]
+
+
+def test_hour_list_is_topped_up_from_the_whole_day():
+    ranking = PopularityRanking(half_life_days=0, top_k=5)
+    ranking.add_order(1, [(10, 1)], datetime(2026, 1, 1, 9))
+    ranking.add_order(1, [(20, 5)], datetime(2026, 1, 1, 20))
+
+    assert ranking.recommend(k=2, restaurant_id=1, hour=9) == [10, 20]
+    assert ranking.recommend(k=2, restaurant_id=1, hour=9, exclude=[10]) == [20]
+
+
+def test_upsert_adds_each_counter_once_per_order():
+    ranking = PopularityRanking(half_life_days=14)
+    stmt = ranking.upsert_statement(3, [(10, 2), (10, 1), (None, 4)], datetime(2026, 1, 1, 9))
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    rows = {
+        (params[f"restaurant_id_m{i}"], params[f"hour_m{i}"], params[f"menu_item_id_m{i}"]): params[f"score_m{i}"]
+        for i in range(4)
+    }
+    # Same item twice in one order must be one row, or ON CONFLICT hits it twice
+    assert rows == {(3, 9, 10): 3, (3, ALL_HOURS, 10): 3, (GLOBAL, 9, 10): 3, (GLOBAL, ALL_HOURS, 10): 3}
+    assert "ON CONFLICT (restaurant_id, hour, menu_item_id) DO UPDATE" in sql
+    assert "power" in sql and "greatest" in sql
+
+
+def test_upsert_skips_orders_without_menu_items():
+    assert PopularityRanking().upsert_statement(3, [(None, 1)], datetime(2026, 1, 1)) is None
+
+
+class CounterSession:
+    """First query: is the table empty? Then the counter rows (backfill is patched out)."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.backfilled = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        if statement.compile().string.rstrip().endswith("LIMIT :param_1"):
+            return SimpleNamespace(first=lambda: self.rows[0] if self.backfilled else None)
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+def test_build_backfills_an_empty_table_then_loads_counters(monkeypatch):
+    ranking = PopularityRanking(half_life_days=14, top_k=5)
+    session = CounterSession([(1, ALL_HOURS, 10, 4.0), (1, ALL_HOURS, 20, 9.0), (GLOBAL, 9, 10, 4.0)])
+
+    async def backfill(db, now):
+        db.backfilled = True
+
+    monkeypatch.setattr(popularity_module.database, "SessionLocal", lambda: session)
+    monkeypatch.setattr(ranking, "backfill", backfill)
+    asyncio.run(ranking.build())
+
+    assert session.backfilled
+    assert ranking.ready
+    assert ranking.top(1) == [20, 10]
+    assert ranking.top(None, 9) == [10]
+
+
+def test_backfill_spreads_history_over_all_keys_without_double_counting():
+    class HistorySession:
+        def __init__(self):
+            self.statements = []
+
+        async def execute(self, statement):
+            self.statements.append(statement)
+            # (restaurant_id, menu_item_id, hour, decayed quantity)
+            return SimpleNamespace(all=lambda: [(3, 10, 9, 2.5), (3, 10, 20, 1.0)])
+
+        async def commit(self):
+            pass
+
+    db = HistorySession()
+    asyncio.run(PopularityRanking(half_life_days=14).backfill(db, datetime(2026, 1, 1)))
+
+    insert = db.statements[-1].compile(dialect=postgresql.dialect())
+    rows = {}
+    for i in range(len(insert.params) // 5):
+        key = (insert.params[f"restaurant_id_m{i}"], insert.params[f"hour_m{i}"], insert.params[f"menu_item_id_m{i}"])
+        rows[key] = insert.params[f"score_m{i}"]
+    assert rows[(3, ALL_HOURS, 10)] == 3.5 and rows[(GLOBAL, ALL_HOURS, 10)] == 3.5
+    assert rows[(3, 9, 10)] == 2.5 and rows[(GLOBAL, 20, 10)] == 1.0
+    assert "ON CONFLICT DO NOTHING" in str(insert)
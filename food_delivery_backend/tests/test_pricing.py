@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.pricing import PricedCart, PricedLine, price_cart
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class FakeSession:
+    """Answers every execute() with the same menu rows and counts the queries."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return FakeResult(self.rows)
+
+
+def menu_row(item_id, price, is_available=True, restaurant_id=1):
+    return SimpleNamespace(id=item_id, price=price, is_available=is_available, restaurant_id=restaurant_id)
+
+
+def test_price_cart_uses_one_query_and_sums_lines():
+    db = FakeSession([menu_row(1, 100), menu_row(2, 250)])
+    cart = asyncio.run(price_cart(db, [
+        {"menu_item_id": 1, "quantity": 2},
+        {"menu_item_id": 2, "quantity": 1},
+    ]))
+
+    assert db.queries == 1
+    assert cart.total == 450
+    assert cart.problems(1) == []
+
+
+def test_price_cart_reports_unknown_and_unavailable_items():
+    db = FakeSession([menu_row(1, 100), menu_row(2, 250, is_available=False)])
+    cart = asyncio.run(price_cart(db, [
+        {"menu_item_id": 1, "quantity": 1},
+        {"menu_item_id": 2, "quantity": 1},
+        {"menu_item_id": 99, "quantity": 1},
+    ]))
+
+    # Unavailable lines never count towards the bill
+    assert cart.total == 100
+    assert cart.unavailable_ids == [2]
+    assert cart.unknown_ids == [99]
+    problems = " ".join(cart.problems(1))
+    assert "Unknown items" in problems
+    assert "no longer available" in problems
+
+
+def test_empty_cart_skips_the_query():
+    db = FakeSession([])
+    cart = asyncio.run(price_cart(db, []))
+    assert db.queries == 0
+    assert cart.problems(1) == ["Order total cannot be zero"]
+
+
+def test_problems_rejects_foreign_items_and_bad_quantities():
+    cart = PricedCart(lines=[
+        PricedLine(menu_item_id=1, quantity=1, unit_price=100, is_available=True, restaurant_id=1),
+        PricedLine(menu_item_id=2, quantity=1, unit_price=100, is_available=True, restaurant_id=2),
+        PricedLine(menu_item_id=3, quantity=-5, unit_price=100, is_available=True, restaurant_id=1),
+    ])
+    problems = " ".join(cart.problems(1))
+    assert "another restaurant: [2]" in problems
+    assert "Invalid quantity for items: [3]" in problems
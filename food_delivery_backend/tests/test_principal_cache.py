@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import auth, models
+from app import principal_cache as principal_cache_module
+from app.principal_cache import Principal, PrincipalCache
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(principal_cache_module.time, "monotonic", lambda: clock[0])
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    cache.put(Principal(id=1, role=models.UserRole.CUSTOMER))
+
+    clock[0] += 59
+    assert cache.get(1) is not None
+    clock[0] += 2
+    assert cache.get(1) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    for user_id in (1, 2):
+        cache.put(Principal(id=user_id, role=models.UserRole.CUSTOMER))
+    cache.get(1)
+    cache.put(Principal(id=3, role=models.UserRole.CUSTOMER))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+def test_orm_update_invalidates_the_cached_principal(monkeypatch):
+    cache = PrincipalCache()
+    monkeypatch.setattr(principal_cache_module, "principal_cache", cache)
+    engine = create_engine("sqlite://")
+    models.User.__table__.create(engine)
+
+    with Session(engine) as session:
+        user = models.User(email="a@x.com", hashed_password="x", role=models.UserRole.CUSTOMER)
+        session.add(user)
+        session.commit()
+        cache.put(Principal.from_user(user))
+
+        user.role = models.UserRole.OWNER
+        session.commit()
+        assert cache.get(user.id) is None
+    assert cache.stats["invalidations"] == 1
+
+
+class UserLookup:
+    def __init__(self, user):
+        self.user = user
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(first=lambda: self.user))
+
+
+def token_for(user_id):
+    return auth.create_access_token({"user_id": str(user_id), "role": "CUSTOMER"})
+
+
+def test_principal_is_cached_between_requests(monkeypatch):
+    monkeypatch.setattr(auth, "principal_cache", PrincipalCache())
+    db = UserLookup(SimpleNamespace(id=4, email="c@x.com", phone_number=None,
+                                    role=models.UserRole.CUSTOMER, is_active=True))
+
+    first = asyncio.run(auth.get_current_user(token_for(4), db))
+    second = asyncio.run(auth.get_current_user(token_for(4), db))
+
+    assert first == second == Principal(id=4, role=models.UserRole.CUSTOMER, email="c@x.com")
+    assert db.queries == 1
+
+
+def test_deactivated_users_are_refused_from_the_db_and_the_cache(monkeypatch):
+    cache = PrincipalCache()
+    monkeypatch.setattr(auth, "principal_cache", cache)
+    db = UserLookup(SimpleNamespace(id=5, email="d@x.com", phone_number=None,
+                                    role=models.UserRole.CUSTOMER, is_active=False))
+
+    for _ in range(2):  # DB lookup, then the cached principal
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(auth.get_current_user(token_for(5), db))
+        assert error.value.status_code == 403
+    assert db.queries == 1
+    assert asyncio.run(auth.get_user_from_token(token_for(5), db)) is None
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+from app.payments import FakeGateway, order_matches
+from app.pricing import PricedCart, PricedLine
+from app.quote_store import CartQuote, QuoteStore
+from app.routers import orders
+
+
+def make_quote(customer_id=7, total=300, created_at=None):
+    return CartQuote(
+        customer_id=customer_id,
+        restaurant_id=1,
+        lines=((1, 3, 100),),
+        total=total,
+        created_at=time.monotonic() if created_at is None else created_at,
+    )
+
+
+def test_quote_is_used_once():
+    store = QuoteStore()
+    store.put("order_1", make_quote())
+
+    assert store.pop("order_1") is not None
+    # A replayed /verify finds nothing and has to go through the checked fallback
+    assert store.pop("order_1") is None
+    assert store.get("order_1") is None
+
+
+def test_expired_quote_is_not_returned():
+    store = QuoteStore(ttl_seconds=60)
+    store.put("old", make_quote(created_at=time.monotonic() - 120))
+    assert store.get("old") is None
+    assert len(store) == 0
+
+
+def test_oldest_quote_is_evicted_at_capacity():
+    store = QuoteStore(max_entries=2)
+    for order_id in ("a", "b", "c"):
+        store.put(order_id, make_quote())
+    assert store.get("a") is None
+    assert store.get("b") is not None and store.get("c") is not None
+
+
+def test_quote_from_cart_keeps_only_available_lines():
+    cart = PricedCart(lines=[
+        PricedLine(menu_item_id=1, quantity=2, unit_price=150, is_available=True, restaurant_id=1),
+        PricedLine(menu_item_id=2, quantity=1, unit_price=999, is_available=False, restaurant_id=1),
+    ])
+    order = type("OrderData", (), {
+        "restaurant_id": 1, "delivery_address": "Street 1",
+        "delivery_latitude": 12.9, "delivery_longitude": 77.6,
+    })()
+    quote = CartQuote.from_cart(cart, customer_id=7, order_data=order)
+    assert quote.lines == ((1, 2, 150),)
+    assert quote.total == 300
+
+
+def test_gateway_order_must_match_amount_and_customer():
+    gateway_order = {"id": "order_1", "amount": 30000, "notes": {"customer_id": "7"}}
+
+    assert order_matches(gateway_order, 30000, 7)
+    # Client re-priced a different (cheaper / pricier) cart than what was paid
+    assert not order_matches(gateway_order, 29900, 7)
+    # Someone else's payment
+    assert not order_matches(gateway_order, 30000, 8)
+    # Orders created without notes can't be claimed through the fallback
+    assert not order_matches({"id": "order_2", "amount": 30000}, 30000, 7)
+
+
+class RequoteSession:
+    """Menu rows for price_cart; records added orders, commit can fail with IntegrityError."""
+
+    def __init__(self, rows, duplicate=False):
+        self.rows = rows
+        self.duplicate = duplicate
+        self.added = []
+
+    async def execute(self, statement):
+        return SimpleNamespace(all=lambda: self.rows)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        if self.duplicate:
+            raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+
+    async def rollback(self):
+        pass
+
+
+def requote(monkeypatch, db, paid_amount, customer_id=7, paid_by=7):
+    fake = FakeGateway()
+    monkeypatch.setattr(orders, "gateway", fake)
+    gateway_order = asyncio.run(fake.create_order(paid_amount, notes={"customer_id": str(paid_by)}))
+    order_data = {"restaurant_id": 1, "items": [{"menu_item_id": 1, "quantity": 2}]}
+    call = orders._requote(db, gateway_order["id"], "pay_1", order_data, customer_id)
+    return fake, call
+
+
+def menu_row(price):
+    return SimpleNamespace(id=1, price=price, is_available=True, restaurant_id=1)
+
+
+def test_requote_accepts_a_cart_matching_the_paid_amount(monkeypatch):
+    db = RequoteSession([menu_row(150)])
+    fake, call = requote(monkeypatch, db, 30000)
+
+    quote = asyncio.run(call)
+    assert quote.total == 300 and quote.lines == ((1, 2, 150),)
+    assert fake.refunds == [] and db.added == []
+
+
+def test_requote_refunds_when_the_price_changed_after_payment(monkeypatch):
+    db = RequoteSession([menu_row(175)])
+    fake, call = requote(monkeypatch, db, 30000)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(call)
+    assert error.value.status_code == 400
+    assert [(r["payment_id"], r["amount"]) for r in fake.refunds] == [("pay_1", 30000)]
+    # The payment id is used up, so it can't be verified again after the refund
+    (claimed,) = db.added
+    assert claimed.stripe_payment_id == "pay_1" and claimed.status == models.OrderStatus.CANCELLED
+
+
+def test_requote_does_not_refund_someone_elses_payment(monkeypatch):
+    db = RequoteSession([menu_row(175)])
+    fake, call = requote(monkeypatch, db, 30000, customer_id=7, paid_by=8)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(call)
+    assert error.value.status_code == 403
+    assert fake.refunds == [] and db.added == []
+
+
+def test_requote_does_not_refund_a_payment_another_request_saved(monkeypatch):
+    db = RequoteSession([menu_row(175)], duplicate=True)
+    fake, call = requote(monkeypatch, db, 30000)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(call)
+    assert error.value.status_code == 409
+    assert fake.refunds == []
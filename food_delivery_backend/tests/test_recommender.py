@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+
+from app.recommender import CURRENT_FILE, TfidfIndex
+
+ITEMS = ["spicy paneer tikka", "cheese pizza", "paneer pizza", "mango lassi"]
+
+
+def fitted(directory):
+    index = TfidfIndex(str(directory))
+    index.fit([10, 20, 30, 40], ITEMS)
+    return index
+
+
+def test_saved_index_loads_memory_mapped_and_answers_the_same(tmp_path):
+    index = fitted(tmp_path)
+    index.save()
+
+    loaded = TfidfIndex(str(tmp_path))
+    loaded._set(*loaded.read_files())
+
+    # Read-only view of the mapped file, not a private copy
+    assert not loaded.matrix.data.flags.writeable and not loaded.matrix.data.flags.owndata
+    assert loaded.recommend([30], k=3) == index.recommend([30], k=3)
+    # The rebuilt vectorizer transforms new items with the saved vocabulary & IDF
+    loaded.add_items([50], ["paneer wrap"])
+    index.add_items([50], ["paneer wrap"])
+    assert loaded.recommend([50], k=2) == index.recommend([50], k=2)
+
+
+def test_save_swaps_the_pointer_and_prunes_old_snapshots(tmp_path):
+    index = fitted(tmp_path)
+    for _ in range(4):
+        index.save()
+
+    snapshots = [name for name in os.listdir(tmp_path) if name.startswith("snapshot-")]
+    with open(tmp_path / CURRENT_FILE) as f:
+        current = f.read()
+    assert len(snapshots) == 2 and current in snapshots
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_missing_or_mismatched_snapshot_means_refit(tmp_path):
+    assert TfidfIndex(str(tmp_path)).read_files() is None
+
+    index = fitted(tmp_path)
+    index.save()
+    with open(tmp_path / CURRENT_FILE) as f:
+        snapshot = tmp_path / f.read()
+    np.save(snapshot / "item_ids.npy", np.array([10, 20], dtype=np.int64))
+
+    assert TfidfIndex(str(tmp_path)).read_files() is None
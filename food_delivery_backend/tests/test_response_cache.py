@@ -0,0 +1,75 @@
+import gzip
+from types import SimpleNamespace
+
+from app import catalog
+from app import response_cache as response_cache_module
+from app.response_cache import ResponseCache
+
+
+def request(**headers):
+    return SimpleNamespace(headers={name.replace("_", "-"): value for name, value in headers.items()})
+
+
+def test_both_encodings_share_a_weak_etag_and_vary():
+    etag = catalog.make_etag("menu:1", 3, None, "all")
+    entry = ResponseCache().put("menu:1|3|None|None", b"[" + b"1," * 2000 + b"1]", catalog.cache_headers(etag))
+
+    plain = entry.to_response(request())
+    zipped = entry.to_response(request(accept_encoding="gzip, br"))
+
+    assert etag == 'W/"menu:1-v3-all"'
+    assert plain.headers["etag"] == zipped.headers["etag"] == etag
+    assert plain.headers["vary"] == zipped.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in plain.headers
+    assert gzip.decompress(zipped.body) == plain.body
+
+
+def test_revalidation_uses_weak_comparison():
+    etag = catalog.make_etag("restaurants", 7, None, "all")
+
+    # A proxy may have weakened or kept the tag; either matches
+    for sent in (etag, '"restaurants-v7-all"', 'W/"other", W/"restaurants-v7-all"', "*"):
+        response = catalog.not_modified(request(if_none_match=sent), etag)
+        assert response.status_code == 304
+        assert response.headers["vary"] == "Accept-Encoding"
+    assert catalog.not_modified(request(if_none_match='W/"restaurants-v6-all"'), etag) is None
+    assert catalog.not_modified(request(), etag) is None
+
+
+def test_small_bodies_are_not_gzipped():
+    entry = ResponseCache().put("k", b"[]")
+
+    response = entry.to_response(request(accept_encoding="gzip"))
+    assert entry.gzipped is None and response.body == b"[]"
+    assert "content-encoding" not in response.headers
+
+
+def test_cache_is_bounded_by_bytes_and_evicts_least_recent():
+    cache = ResponseCache(max_bytes=250)
+    for key in ("a", "b"):
+        cache.put(key, b"x" * 100)
+    cache.get("a")
+    cache.put("c", b"x" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.current_bytes == 200 and cache.stats["evictions"] == 1
+    # Never stored when it can't fit at all
+    cache.put("huge", b"x" * 1000)
+    assert cache.get("huge") is None
+
+
+def test_entries_expire_and_invalidate_by_prefix(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(response_cache_module.time, "monotonic", lambda: clock[0])
+    cache = ResponseCache(ttl_seconds=10)
+    cache.put("menu:1|1", b"[]")
+    cache.put("menu:12|1", b"[]")
+    cache.put("restaurants|1", b"[]")
+
+    cache.invalidate("menu:1|")
+    assert cache.get("menu:1|1") is None and cache.get("menu:12|1") is not None
+
+    clock[0] = 11
+    assert cache.get("restaurants|1") is None
+    assert len(cache) == 1 and cache.current_bytes == 2
@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app import models, schemas
+
+
+def test_coordinates_are_selected_as_plain_floats():
+    sql = str(select(models.Restaurant).compile(dialect=postgresql.dialect()))
+
+    assert "ST_Y(restaurants.location)" in sql and "ST_X(restaurants.location)" in sql
+
+
+def test_serialization_never_touches_the_geometry():
+    class Row(SimpleNamespace):
+        @property
+        def location(self):
+            raise AssertionError("WKB was decoded")
+
+    row = Row(id=1, name="Spice Hub", address="MG Road", is_open=True, image_url=None, latitude=12.97, longitude=77.59)
+    out = schemas.RestaurantOut.model_validate(row)
+
+    assert (out.latitude, out.longitude) == (12.97, 77.59)
@@ -0,0 +1,45 @@
+import asyncio
+
+from app import snapshots as snapshots_module
+from app.snapshots import SnapshotStore, send_snapshot
+
+
+def test_snapshot_merges_status_and_driver_position():
+    store = SnapshotStore()
+    store.record({"event": "STATUS_UPDATE", "order_id": 1, "status": "PREPARING"})
+    store.record({"event": "DRIVER_UPDATE", "order_id": "1", "lat": 12.9, "lng": 77.5, "distance": "2 km", "time": "5 mins"})
+    store.record({"event": "STATUS_UPDATE", "order_id": 1, "status": "OUT_FOR_DELIVERY"})
+    store.record({"event": "SUBSCRIBED", "order_id": 1})  # not state
+
+    snapshot = store.get(1)
+    assert snapshot["event"] == "SNAPSHOT" and snapshot["status"] == "OUT_FOR_DELIVERY"
+    assert (snapshot["lat"], snapshot["lng"], snapshot["time"]) == (12.9, 77.5, "5 mins")
+
+
+def test_finished_orders_are_dropped_and_the_stalest_evicted():
+    store = SnapshotStore(max_orders=2)
+    for order_id in (1, 2, 3):
+        store.record({"event": "STATUS_UPDATE", "order_id": order_id, "status": "PENDING"})
+    store.record({"event": "STATUS_UPDATE", "order_id": 3, "status": "DELIVERED"})
+
+    assert store.get(1) is None and store.get(3) is None
+    assert len(store) == 1 and store.get(2) is not None
+
+
+def test_snapshot_is_only_sent_for_known_order_topics(monkeypatch):
+    store = SnapshotStore()
+    store.record({"event": "STATUS_UPDATE", "order_id": 5, "status": "PENDING"})
+    sent = []
+
+    async def send_to(websocket, message):
+        sent.append(message)
+
+    monkeypatch.setattr(snapshots_module, "snapshots", store)
+    monkeypatch.setattr(snapshots_module.manager, "send_to", send_to)
+
+    async def scenario():
+        for topic in ("order:5", "order:6", "restaurant:5", "order:x"):
+            await send_snapshot(object(), topic)
+
+    asyncio.run(scenario())
+    assert [message["order_id"] for message in sent] == [5]
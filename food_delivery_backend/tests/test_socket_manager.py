@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import pytest
+
+from app.socket_manager import ConnectionManager
+
+
+class SlowSocket:
+    """Accepts, then blocks every send until released."""
+
+    def __init__(self, blocked=True):
+        self.sent = []
+        self.closed_with = None
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def update(order_id, lat, event="DRIVER_UPDATE"):
+    return {"event": event, "order_id": order_id, "lat": lat}
+
+
+async def connected(manager, *sockets):
+    for socket in sockets:
+        await manager.connect(socket)
+        manager.subscribe(socket, "order:1")
+    await asyncio.sleep(0)
+
+
+def queued(manager, socket):
+    return [json.loads(text) for _, text in manager.connections[socket].queue]
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    async def scenario():
+        manager = ConnectionManager(max_queue=2, policy="drop_oldest")
+        socket = SlowSocket()
+        await connected(manager, socket)
+        for lat in (1, 2, 3, 4):
+            await manager.publish("order:1", update(1, lat))
+            await asyncio.sleep(0)
+        # The first one is already stuck in send_text
+        return manager, [m["lat"] for m in queued(manager, socket)]
+
+    manager, lats = asyncio.run(scenario())
+    assert lats == [3, 4]
+    assert manager.stats["dropped"] == 1
+
+
+def test_coalesce_replaces_the_stale_update_for_the_same_order():
+    async def scenario():
+        manager = ConnectionManager(max_queue=2, policy="coalesce")
+        socket = SlowSocket()
+        await connected(manager, socket)
+        await manager.publish("order:1", update(1, 0))
+        await asyncio.sleep(0)  # picked up by the writer
+        await manager.publish("order:1", update(1, 1, event="STATUS_UPDATE"))
+        await manager.publish("order:1", update(1, 2))
+        await manager.publish("order:1", update(1, 3))
+        return manager, queued(manager, socket)
+
+    manager, messages = asyncio.run(scenario())
+    # The status change survives; only the superseded position went
+    assert [(m["event"], m["lat"]) for m in messages] == [("STATUS_UPDATE", 1), ("DRIVER_UPDATE", 3)]
+    assert manager.stats["coalesced"] == 1 and manager.stats["dropped"] == 0
+
+
+def test_disconnect_policy_evicts_only_the_slow_socket():
+    async def scenario():
+        manager = ConnectionManager(max_queue=1, policy="disconnect")
+        slow, fast = SlowSocket(), SlowSocket(blocked=False)
+        await connected(manager, slow, fast)
+        for lat in (1, 2, 3):
+            await manager.publish("order:1", update(1, lat))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        return manager, slow, fast
+
+    manager, slow, fast = asyncio.run(scenario())
+    assert slow not in manager.connections and slow.closed_with == 1013
+    assert "order:1" in manager.topics and manager.topics["order:1"] == {fast}
+    assert [m["lat"] for m in fast.sent] == [1, 2, 3]
+    assert manager.stats["evicted"] == 1
+
+
+def test_publish_reaches_each_subscriber_once_across_topics():
+    async def scenario():
+        manager = ConnectionManager(max_queue=8)
+        socket = SlowSocket(blocked=False)
+        await connected(manager, socket)
+        manager.subscribe(socket, "restaurant:3")
+        await manager.publish(["order:1", "restaurant:3"], {"event": "STATUS_UPDATE", "order_id": 1})
+        await manager.publish("order:2", {"event": "STATUS_UPDATE", "order_id": 2})
+        await asyncio.sleep(0.01)
+        return socket
+
+    socket = asyncio.run(scenario())
+    assert socket.sent == [{"event": "STATUS_UPDATE", "order_id": 1}]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ConnectionManager(policy="block")
@@ -0,0 +1,45 @@
+import asyncio
+
+from PIL import Image
+
+from app.uploads import IMAGE_VARIANTS, UploadLimitMiddleware, make_variants
+
+
+def test_thumb_and_medium_variants_are_resized(tmp_path):
+    source = tmp_path / "photo.png"
+    Image.new("RGB", (4000, 3000), "red").save(source)
+
+    files = make_variants(str(source), "abc", str(tmp_path))
+
+    assert files == {"thumb": "abc_thumb.jpg", "medium": "abc_medium.jpg"}
+    for name, filename in files.items():
+        with Image.open(tmp_path / filename) as variant:
+            assert max(variant.size) == IMAGE_VARIANTS[name]
+
+
+def run_middleware(headers):
+    sent, reached = [], []
+
+    async def app(scope, receive, send):
+        reached.append(True)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": headers}
+    asyncio.run(UploadLimitMiddleware(app, max_bytes=100)(scope, receive, send))
+    status = next((m["status"] for m in sent if m["type"] == "http.response.start"), None)
+    return status, bool(reached)
+
+
+def test_oversized_and_chunked_multipart_uploads_are_refused_from_headers():
+    multipart = (b"content-type", b"multipart/form-data; boundary=x")
+
+    assert run_middleware([multipart, (b"content-length", b"101")]) == (413, False)
+    assert run_middleware([multipart]) == (411, False)
+    assert run_middleware([multipart, (b"content-length", b"100")]) == (None, True)
+    # Only multipart bodies are limited
+    assert run_middleware([(b"content-type", b"application/json")]) == (None, True)
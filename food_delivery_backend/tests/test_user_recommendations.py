@@ -0,0 +1,33 @@
+import numpy as np
+import scipy.sparse as sp
+
+from app import user_recommendations as module
+from app.user_recommendations import item_similarity, score_chunk
+
+
+def test_item_similarity_is_cosine_with_an_empty_diagonal():
+    # Orders: {0, 1}, {0, 1}, {0, 2}
+    similarity = item_similarity(np.array([0, 0, 1, 1, 2, 2]), np.array([0, 1, 0, 1, 0, 2]), 3).toarray()
+
+    assert np.allclose(np.diag(similarity), 0)
+    assert np.isclose(similarity[0, 1], 2 / np.sqrt(3 * 2))
+    assert np.isclose(similarity[1, 2], 0)
+    assert np.allclose(similarity, similarity.T)
+
+
+def test_score_chunk_skips_eaten_items_and_pads_rows_without_signal(monkeypatch):
+    similarity = sp.csr_matrix(np.array([
+        [0, 0.9, 0.1, 0],
+        [0.9, 0, 0, 0],
+        [0.1, 0, 0, 0],
+        [0, 0, 0, 0],
+    ], dtype=np.float32))
+    tfidf = sp.csr_matrix(np.eye(4, dtype=np.float32))
+    monkeypatch.setattr(module, "_worker_state", {"similarity": similarity, "tfidf": tfidf})
+
+    # User 0 ate item 0, user 1 ate item 3 (no neighbours at all)
+    users = sp.csr_matrix(np.array([[1, 0, 0, 0], [0, 0, 0, 1]], dtype=np.float32))
+    top = score_chunk(users, top_n=3, cf_weight=1.0)
+
+    assert top[0].tolist() == [1, 2, -1]
+    assert top[1].tolist() == [-1, -1, -1]